@@ -1 +1,48 @@
 PAGE_SIZE = 6
+RECIPE_ORDERINGS = {
+    'popular': ('-popularity', '-pub_date', '-id'),
+    'trending': ('-trending', '-pub_date', '-id'),
+}
+EXPORT_CHUNK_SIZE = 2000
+RECIPES_BULK_LIMIT = 1000
+BULK_CREATE_BATCH_SIZE = 500
+PDF_SPOOL_MAX_SIZE = 1024 * 1024
+FILE_CHUNK_SIZE = 64 * 1024
+INGREDIENT_INDEX_TTL = 300
+RECIPE_IDS_TTL = 300
+RECIPE_IDS_MISSING_TTL = 60
+RECIPE_IDS_MISSING_LIMIT = 10000
+PANTRY_INDEX_TTL = 300
+INDEX_VERSION_CHECK_INTERVAL = 1
+PANTRY_MAX_MISSING = 2
+PANTRY_MAX_MISSING_LIMIT = 5
+PANTRY_MAX_INGREDIENTS = 100
+PANTRY_RESULTS_LIMIT = 1000
+SHORT_LINK_MAX_AGE = 60 * 60
+CLICKS_FLUSH_SIZE = 100
+CLICKS_FLUSH_INTERVAL = 10
+TRIGRAM_SIMILARITY_THRESHOLD = 0.5
+TRIGRAM_RESULTS_LIMIT = 10
+VERSION_KEY_MAX_LENGTH = 64
+TAGS_VERSION = 'tags'
+INGREDIENTS_VERSION = 'ingredients'
+RECIPES_VERSION = 'recipes'
+USERS_VERSION = 'users'
+RECIPE_COUNTERS_VERSION = 'recipe_counters'
+USER_COUNTERS_VERSION = 'user_counters'
+SIMILAR_VERSION = 'similar'
+RECIPE_IDS_VERSION = 'recipe_ids'
+PANTRY_VERSION = 'pantry'
+RECIPE_SHOWN_COUNTERS = ('favorites_count', 'shopping_carts_count')
+RECIPE_AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name',
+                        'avatar')
+USER_STATE_VERSION = 'user:{}'
+RESPONSE_CACHE_TIMEOUT = 300
+RESPONSE_CACHE_LOCK_TIMEOUT = 10
+RESPONSE_CACHE_POLL_INTERVAL = 0.05
+IMAGE_MAX_SIZE = 5 * 1024 * 1024
+IMAGE_MAX_DIMENSION = 8192
+IMAGE_SIZE_ERROR_MESSAGE = 'Размер изображения не должен превышать 5 МБ.'
+IMAGE_DIMENSION_ERROR_MESSAGE = (
+    'Ширина и высота изображения не должны превышать 8192 пикселя.'
+)
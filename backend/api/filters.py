@@ -1,6 +1,7 @@
 from django_filters import rest_framework as filters
 
-from recipes.models import Recipe, Ingredient
+from api.constants import RECIPE_ORDERINGS
+from recipes.models import Recipe, Ingredient, Tag
 
 
 class IngredientFilter(filters.FilterSet):
@@ -13,11 +14,25 @@ class IngredientFilter(filters.FilterSet):
 
 
 class RecipeFilter(filters.FilterSet):
-    """Фильтр для рецептов по тегам, автору, избранному и списку покупок."""
-    tags = filters.AllValuesMultipleFilter(
-        field_name='tags__slug',
+    """
+    Фильтр для рецептов по тегам, автору, избранному, списку покупок
+    и полнотекстовый поиск, сортировка по популярности.
+
+    Теги проверяются по маске tags_mask рецепта: tags - рецепты с любым
+    из тегов, tags_all - со всеми.
+    """
+    tags = filters.ModelMultipleChoiceFilter(
+        queryset=Tag.objects.all(),
+        to_field_name='slug',
+        method='filter_tags',
         label='Теги',
     )
+    tags_all = filters.ModelMultipleChoiceFilter(
+        queryset=Tag.objects.all(),
+        to_field_name='slug',
+        method='filter_tags_all',
+        label='Все теги',
+    )
     author = filters.NumberFilter(
         field_name='author__id',
         label='Автор',
@@ -30,21 +45,56 @@ class RecipeFilter(filters.FilterSet):
         method='filter_is_in_shopping_cart',
         label='В списке покупок',
     )
+    search = filters.CharFilter(
+        method='filter_search',
+        label='Поиск',
+    )
+    ordering = filters.ChoiceFilter(
+        choices=(
+            ('popular', 'Популярные'),
+            ('trending', 'Популярные в последние дни'),
+        ),
+        method='filter_ordering',
+        label='Сортировка',
+    )
 
     class Meta:
         model = Recipe
-        fields = ['tags', 'author', 'is_favorited', 'is_in_shopping_cart']
+        fields = [
+            'tags', 'tags_all', 'author', 'is_favorited',
+            'is_in_shopping_cart', 'search', 'ordering'
+        ]
+
+    def filter_tags(self, queryset, name, value):
+        """Фильтрация по любому из тегов."""
+        if not value:
+            return queryset
+        return queryset.with_tags(value)
+
+    def filter_tags_all(self, queryset, name, value):
+        """Фильтрация по всем тегам сразу."""
+        if not value:
+            return queryset
+        return queryset.with_tags(value, match_all=True)
 
     def filter_is_favorited(self, queryset, name, value):
         """Фильтрация по избранному."""
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(favorites__user=user)
+            return queryset.filter(is_favorited=True)
         return queryset
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
         """Фильтрация по списку покупок."""
         user = self.request.user
         if user.is_authenticated and value:
-            return queryset.filter(shopping_carts__user=user)
+            return queryset.filter(is_in_shopping_cart=True)
         return queryset
+
+    def filter_search(self, queryset, name, value):
+        """Полнотекстовый поиск по названию и описанию."""
+        return queryset.search(value)
+
+    def filter_ordering(self, queryset, name, value):
+        """Сортировка по оценкам популярности рецепта."""
+        return queryset.order_by(*RECIPE_ORDERINGS[value])
@@ -0,0 +1,349 @@
+import bisect
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.db.models import Count
+
+from api.constants import (INDEX_VERSION_CHECK_INTERVAL,
+                           INGREDIENT_INDEX_TTL, INGREDIENTS_VERSION,
+                           PANTRY_INDEX_TTL, PANTRY_RESULTS_LIMIT,
+                           PANTRY_VERSION, RECIPE_IDS_MISSING_LIMIT,
+                           RECIPE_IDS_MISSING_TTL, RECIPE_IDS_TTL,
+                           RECIPE_IDS_VERSION, TRIGRAM_RESULTS_LIMIT,
+                           TRIGRAM_SIMILARITY_THRESHOLD)
+from api.versions import get_versions
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.similarity import load_pairs
+
+
+def normalize(text):
+    """Приводим строку к виду для сравнения без учёта регистра."""
+    return text.strip().casefold()
+
+
+def trigrams(text, partial=False):
+    """
+    Набор триграмм строки с дополнением пробелами, как в pg_trgm.
+
+    Для недописанного запроса (partial) конец строки не дополняется.
+    """
+    padded = f'  {text}' if partial else f'  {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class InMemoryIndex:
+    """
+    Базовый класс для индексов в памяти процесса.
+
+    Снимок индекса строится лениво при первом обращении методом build
+    и перестраивается по истечении ttl, после invalidate или после
+    изменения версии version_key, которую увеличивают записи в любом
+    процессе. Версия сверяется с БД не чаще раза в
+    INDEX_VERSION_CHECK_INTERVAL секунд.
+    """
+    version_key = None
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._built_at = 0
+        self._version = None
+        self._checked_at = 0
+
+    def invalidate(self):
+        """Помечаем индекс устаревшим."""
+        self._snapshot = None
+
+    def build(self):
+        """Строим снимок индекса по текущему содержимому БД."""
+        raise NotImplementedError
+
+    def get_version(self):
+        """Версия данных индекса в БД."""
+        if self.version_key is None:
+            return None
+        self._checked_at = time.monotonic()
+        return get_versions([self.version_key])[self.version_key][0]
+
+    def is_stale(self, snapshot):
+        """Снимок устарел по времени или по версии."""
+        now = time.monotonic()
+        if snapshot is None or now - self._built_at > self.ttl:
+            return True
+        if (self.version_key is None
+                or now - self._checked_at < INDEX_VERSION_CHECK_INTERVAL):
+            return False
+        return self.get_version() != self._version
+
+    def get_snapshot(self):
+        """Возвращаем актуальный снимок индекса."""
+        snapshot = self._snapshot
+        if self.is_stale(snapshot):
+            with self._lock:
+                if self._snapshot is snapshot or self._snapshot is None:
+                    # Версия читается до построения: изменения во время
+                    # построения приведут к следующему.
+                    self._version = self.get_version()
+                    self._snapshot = self.build()
+                    self._built_at = time.monotonic()
+                snapshot = self._snapshot
+        return snapshot
+
+
+class IngredientPrefixIndex(InMemoryIndex):
+    """
+    Индекс ингредиентов в памяти процесса для автодополнения.
+
+    Названия хранятся в отсортированном списке, поэтому поиск по префиксу
+    сводится к двоичному поиску. Результаты ранжируются по количеству
+    рецептов с ингредиентом. Если по префиксу ничего не найдено,
+    используется нечёткий поиск по триграммам.
+
+    Индекс помечается устаревшим при изменении ингредиентов в этом
+    процессе, другие процессы перестраивают его по INGREDIENTS_VERSION.
+    Ранжирование по числу рецептов обновляется по истечении
+    INGREDIENT_INDEX_TTL.
+    """
+    version_key = INGREDIENTS_VERSION
+
+    def __init__(self, ttl=INGREDIENT_INDEX_TTL):
+        super().__init__(ttl)
+
+    def build(self):
+        """Строим индекс по текущему содержимому БД."""
+        ingredients = Ingredient.objects.annotate(
+            recipes_count=Count('ingredient_recipes')
+        ).values_list('id', 'name', 'measurement_unit', 'recipes_count')
+        entries = sorted(
+            (normalize(name), -recipes_count, name, pk, unit)
+            for pk, name, unit, recipes_count in ingredients
+        )
+        keys = [entry[0] for entry in entries]
+        rows = [
+            {'id': pk, 'name': name, 'measurement_unit': unit}
+            for _, _, name, pk, unit in entries
+        ]
+        ranks = [entry[1] for entry in entries]
+        sizes = [len(key) for key in keys]
+        postings = defaultdict(list)
+        for position, key in enumerate(keys):
+            for trigram in trigrams(key):
+                postings[trigram].append(position)
+        return keys, rows, ranks, sizes, dict(postings)
+
+    def search(self, query):
+        """Ингредиенты, название которых начинается с query."""
+        keys, rows, ranks, sizes, postings = self.get_snapshot()
+        prefix = normalize(query)
+        start = bisect.bisect_left(keys, prefix)
+        end = bisect.bisect_left(keys, prefix + '\U0010ffff', start)
+        if start < end:
+            positions = sorted(
+                range(start, end),
+                key=lambda position: (ranks[position], rows[position]['name'])
+            )
+            return [rows[position] for position in positions]
+        return self.fuzzy_search(prefix, rows, ranks, sizes, postings)
+
+    def fuzzy_search(self, text, rows, ranks, sizes, postings):
+        """Нечёткий поиск по триграммам для запросов с опечатками."""
+        query_trigrams = trigrams(text, partial=True)
+        shared = Counter()
+        for trigram in query_trigrams:
+            shared.update(postings.get(trigram, ()))
+        scored = []
+        for position, common in shared.items():
+            similarity = common / len(query_trigrams)
+            if similarity >= TRIGRAM_SIMILARITY_THRESHOLD:
+                scored.append(
+                    (-similarity, ranks[position], sizes[position], position)
+                )
+        scored.sort()
+        return [
+            rows[position]
+            for *_, position in scored[:TRIGRAM_RESULTS_LIMIT]
+        ]
+
+
+class RecipeIdSet(InMemoryIndex):
+    """
+    Множество id существующих рецептов для проверки коротких ссылок
+    без обращения к БД.
+
+    Рецепты, созданные или удалённые в этом процессе, сразу попадают
+    в множество или удаляются из него. Рецепт, созданный в другом
+    процессе, проверяется по БД при первом обращении и добавляется в
+    множество; удаление в другом процессе увеличивает
+    RECIPE_IDS_VERSION, и множество перестраивается.
+
+    Отсутствие рецепта, проверенное по БД, запоминается на
+    RECIPE_IDS_MISSING_TTL секунд, чтобы перебор несуществующих ссылок
+    не обращался к БД при каждом запросе. Таких id хранится не более
+    RECIPE_IDS_MISSING_LIMIT, при переполнении они забываются.
+    """
+
+    version_key = RECIPE_IDS_VERSION
+
+    def __init__(self, ttl=RECIPE_IDS_TTL):
+        super().__init__(ttl)
+
+    def build(self):
+        return set(Recipe.objects.values_list('id', flat=True)), {}
+
+    def add(self, pk):
+        """Добавляем id в построенное множество."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            ids, missing = snapshot
+            ids.add(pk)
+            missing.pop(pk, None)
+
+    def discard(self, pk):
+        """Удаляем id из построенного множества."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            snapshot[0].discard(pk)
+
+    def exists(self, pk):
+        """Проверяем, что рецепт существует."""
+        ids, missing = self.get_snapshot()
+        if pk in ids:
+            return True
+        now = time.monotonic()
+        if missing.get(pk, 0) > now:
+            return False
+        if Recipe.objects.filter(pk=pk).exists():
+            self.add(pk)
+            return True
+        if len(missing) >= RECIPE_IDS_MISSING_LIMIT:
+            missing.clear()
+        missing[pk] = now + RECIPE_IDS_MISSING_TTL
+        return False
+
+
+class PantryIndex(InMemoryIndex):
+    """
+    Обратный индекс ингредиент -> рецепты для подбора рецептов по
+    продуктам, которые есть у пользователя.
+
+    Для каждого ингредиента хранится отсортированный массив номеров
+    рецептов (как столбцы матрицы CSC), для каждого рецепта - число его
+    ингредиентов. Число совпадений считается сложением по массивам
+    ингредиентов запроса, без обращения к БД.
+
+    Рецепты, изменённые или удалённые в этом процессе, отмечаются
+    методом mark. При следующем запросе их ингредиенты читаются из БД
+    одним запросом и заменяют данные снимка. Изменение состава
+    ингредиентов в другом процессе увеличивает PANTRY_VERSION, и индекс
+    перестраивается. Удалённые там рецепты до перестроения отсеиваются
+    при чтении рецептов из БД.
+    """
+    version_key = PANTRY_VERSION
+
+    def __init__(self, ttl=PANTRY_INDEX_TTL):
+        super().__init__(ttl)
+
+    def build(self):
+        pairs = load_pairs(
+            RecipeIngredient.objects.all(), ('ingredient_id', 'recipe_id')
+        )
+        recipe_ids, rows = np.unique(pairs[:, 1], return_inverse=True)
+        rows = rows.ravel()
+        order = np.argsort(pairs[:, 0], kind='stable')
+        ingredient_ids, starts = np.unique(
+            pairs[order, 0], return_index=True
+        )
+        return (
+            recipe_ids,
+            np.bincount(rows, minlength=len(recipe_ids)).astype(np.int32),
+            ingredient_ids,
+            np.append(starts, len(order)),
+            rows[order].astype(np.int32),
+            {},
+            set(),
+        )
+
+    def mark(self, pks):
+        """Отмечаем рецепты, ингредиенты которых изменились."""
+        snapshot = self._snapshot
+        if snapshot is not None:
+            snapshot[-1].update(pks)
+
+    def resolve(self, overrides, pending):
+        """Читаем ингредиенты отмеченных рецептов из БД."""
+        pks = set(pending)
+        if not pks:
+            return
+        pending.difference_update(pks)
+        # Удалённый рецепт остаётся с пустым набором и не подбирается.
+        found = {pk: set() for pk in pks}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=pks
+        ).values_list('recipe_id', 'ingredient_id'):
+            found[recipe_id].add(ingredient_id)
+        overrides.update(
+            (pk, frozenset(ingredients)) for pk, ingredients in found.items()
+        )
+
+    def match(self, pantry, max_missing, limit=PANTRY_RESULTS_LIMIT):
+        """
+        Рецепты, в которых есть хотя бы один ингредиент из pantry и не
+        хватает не более max_missing ингредиентов.
+
+        Возвращаем до limit пар (id рецепта, число недостающих), сначала
+        рецепты с меньшим числом недостающих, затем с большим числом
+        совпавших, затем новые.
+        """
+        (recipe_ids, totals, ingredient_ids, indptr, indices,
+         overrides, pending) = self.get_snapshot()
+        self.resolve(overrides, pending)
+        pantry = np.unique(np.fromiter(pantry, dtype=np.int64))
+        columns = np.searchsorted(ingredient_ids, pantry)
+        found = columns < len(ingredient_ids)
+        columns = columns[found][
+            ingredient_ids[columns[found]] == pantry[found]
+        ]
+        covered = np.zeros(len(recipe_ids), dtype=np.int32)
+        for column in columns:
+            covered[indices[indptr[column]:indptr[column + 1]]] += 1
+        rows = np.flatnonzero(covered)
+        missing = totals[rows] - covered[rows]
+        best = missing <= max_missing
+        rows, missing = rows[best], missing[best]
+        ids, covered = recipe_ids[rows], covered[rows]
+        if overrides:
+            changed = np.fromiter(overrides, dtype=np.int64)
+            kept = ~np.isin(ids, changed)
+            ids, covered, missing = ids[kept], covered[kept], missing[kept]
+            pantry_set = set(pantry.tolist())
+            extra = [
+                (pk, len(ingredients & pantry_set),
+                 len(ingredients - pantry_set))
+                for pk, ingredients in overrides.items()
+                if ingredients & pantry_set
+                and len(ingredients - pantry_set) <= max_missing
+            ]
+            if extra:
+                extra_ids, extra_covered, extra_missing = zip(*extra)
+                ids = np.append(ids, extra_ids)
+                covered = np.append(covered, extra_covered)
+                missing = np.append(missing, extra_missing)
+        # Порядок одним ключом: id меньше 2 ** 40, совпадений меньше 2 ** 8.
+        keys = (
+            missing.astype(np.int64) * 2 ** 48
+            - covered.astype(np.int64) * 2 ** 40 - ids
+        )
+        if len(keys) > limit:
+            top = np.argpartition(keys, limit - 1)[:limit]
+            order = top[np.argsort(keys[top])]
+        else:
+            order = np.argsort(keys)
+        return list(zip(ids[order].tolist(), missing[order].tolist()))
+
+
+ingredient_index = IngredientPrefixIndex()
+recipe_ids = RecipeIdSet()
+pantry_index = PantryIndex()
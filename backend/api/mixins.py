@@ -0,0 +1,194 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag, urlencode
+from rest_framework import status
+from rest_framework.response import Response
+
+from api.constants import (RESPONSE_CACHE_LOCK_TIMEOUT,
+                           RESPONSE_CACHE_POLL_INTERVAL,
+                           RESPONSE_CACHE_TIMEOUT)
+from api.versions import get_versions, user_state_key
+
+
+class ConditionalResponse(Exception):
+    """Готовый ответ на условный запрос (304 или 412)."""
+
+    def __init__(self, response):
+        super().__init__()
+        self.response = response
+
+
+class ConditionalGetMixin:
+    """
+    Поддержка условных GET-запросов (ETag / Last-Modified).
+
+    Валидаторы вычисляются по версиям наборов данных из version_keys
+    (и версии состояния пользователя, если user_state=True) до
+    сериализации, поэтому при совпадении ответ 304 отдаётся без
+    обращения к самим данным.
+    """
+    version_keys = ()
+    user_state = False
+    conditional_actions = ('list', 'retrieve')
+
+    def get_data_versions(self, request):
+        """Версии наборов данных, от которых зависит ответ."""
+        if getattr(self, 'data_versions', None) is None:
+            keys = list(self.version_keys)
+            if self.user_state and request.user.is_authenticated:
+                keys.append(user_state_key(request.user.id))
+            self.data_versions = get_versions(keys)
+        return self.data_versions
+
+    def get_validators(self, request):
+        """
+        ETag и время последнего изменения для текущего запроса.
+
+        Путь со строкой запроса и аргументы URL входят в ETag, чтобы
+        разные объекты, страницы и фильтры не получали один и тот же.
+        """
+        user_id = request.user.id if request.user.is_authenticated else None
+        versions = self.get_data_versions(request)
+        keys = list(versions)
+        source = ':'.join(
+            [
+                self.action, request.accepted_renderer.format, str(user_id),
+                request.get_full_path(),
+                urlencode(sorted(self.kwargs.items())),
+            ]
+            + [f'{key}={versions[key][0]}' for key in keys]
+        )
+        etag = quote_etag(hashlib.md5(source.encode()).hexdigest())
+        modified = [date for _, date in versions.values() if date]
+        last_modified = int(max(modified).timestamp()) if modified else None
+        return etag, last_modified
+
+    def set_validators(self, response):
+        etag, last_modified = self.conditional_validators
+        response['ETag'] = etag
+        if last_modified is not None:
+            response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ['Authorization'])
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        self.conditional_validators = None
+        if (request.method not in ('GET', 'HEAD')
+                or self.action not in self.conditional_actions):
+            return
+        self.conditional_validators = self.get_validators(request)
+        etag, last_modified = self.conditional_validators
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is not None:
+            raise ConditionalResponse(response)
+
+    def handle_exception(self, exc):
+        if isinstance(exc, ConditionalResponse):
+            return exc.response
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if (getattr(self, 'conditional_validators', None)
+                and response.status_code in (200, 304)):
+            self.set_validators(response)
+        return response
+
+
+class AnonymousCacheMixin:
+    """
+    Кэширование list и retrieve для анонимных пользователей.
+
+    Ответ анонимному пользователю одинаков для всех, поэтому данные
+    ответа кэшируются по пути и нормализованной строке запроса. В ключ
+    входят версии наборов данных (см. ConditionalGetMixin), так что любое
+    изменение данных делает старые записи недостижимыми без перебора
+    ключей. Одновременные промахи по одному ключу объединяются: ответ
+    строит только запрос, захвативший блокировку, остальные ждут его.
+
+    Версии из counter_version_keys в ключ не входят: счётчики меняются
+    при каждом действии пользователей, поэтому при их изменении запись
+    обновляется методом refresh_counters, а не строится заново.
+    """
+    cache_timeout = RESPONSE_CACHE_TIMEOUT
+    counter_version_keys = ()
+
+    def refresh_counters(self, data):
+        """Подставляем в данные ответа актуальные значения счётчиков."""
+        raise NotImplementedError
+
+    def get_response_cache_key(self, request):
+        params = sorted(
+            (key, value)
+            for key in request.query_params
+            for value in request.query_params.getlist(key)
+        )
+        versions = self.get_data_versions(request)
+        source = '|'.join([
+            request.build_absolute_uri(request.path),
+            urlencode(params),
+            request.accepted_renderer.format,
+            ','.join(
+                f'{key}={versions[key][0]}' for key in sorted(versions)
+                if key not in self.counter_version_keys
+            ),
+        ])
+        digest = hashlib.md5(source.encode()).hexdigest()
+        return f'response:{self.basename}:{self.action}:{digest}'
+
+    def wait_for_cache(self, key):
+        """Ждём, пока другой запрос положит ответ в кэш."""
+        deadline = time.monotonic() + RESPONSE_CACHE_LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(RESPONSE_CACHE_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry
+            if cache.get(f'{key}:lock') is None:
+                break
+        return None
+
+    def cached_response(self, handler, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return handler(request, *args, **kwargs)
+        key = self.get_response_cache_key(request)
+        versions = self.get_data_versions(request)
+        counters = {
+            name: versions[name][0]
+            for name in self.counter_version_keys if name in versions
+        }
+        entry = cache.get(key)
+        if entry is None:
+            lock_key = f'{key}:lock'
+            if not cache.add(lock_key, True, RESPONSE_CACHE_LOCK_TIMEOUT):
+                entry = self.wait_for_cache(key)
+            if entry is None:
+                try:
+                    response = handler(request, *args, **kwargs)
+                    if response.status_code == status.HTTP_200_OK:
+                        cache.set(
+                            key, (counters, response.data), self.cache_timeout
+                        )
+                    return response
+                finally:
+                    cache.delete(lock_key)
+        cached_counters, data = entry
+        if cached_counters != counters:
+            data = self.refresh_counters(data)
+            cache.set(key, (counters, data), self.cache_timeout)
+        return Response(data)
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            super().retrieve, request, *args, **kwargs
+        )
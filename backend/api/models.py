@@ -0,0 +1,33 @@
+from django.db import models
+from django.utils import timezone
+
+from api.constants import VERSION_KEY_MAX_LENGTH
+
+
+class DataVersion(models.Model):
+    """
+    Версия набора данных.
+
+    Увеличивается при каждом изменении данных и используется
+    для валидаторов кэша (ETag, Last-Modified).
+    """
+    key = models.CharField(
+        max_length=VERSION_KEY_MAX_LENGTH,
+        unique=True,
+        verbose_name='Ключ'
+    )
+    version = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Версия'
+    )
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Дата изменения'
+    )
+
+    class Meta:
+        verbose_name = 'Версия данных'
+        verbose_name_plural = 'Версии данных'
+
+    def __str__(self):
+        return f'{self.key}: {self.version}'
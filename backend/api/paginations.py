@@ -1,10 +1,175 @@
-from rest_framework.pagination import PageNumberPagination
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (Cursor, CursorPagination,
+                                       PageNumberPagination)
+from rest_framework.response import Response
 
 from api.constants import PAGE_SIZE
 
 
+class CustomCursorPagination(CursorPagination):
+    """
+    Курсорная пагинация без подсчёта общего количества объектов.
+
+    Порядок берётся из атрибута cursor_ordering вьюсета.
+    """
+    page_size_query_param = 'limit'
+    page_size = PAGE_SIZE
+    ordering = ('-pk',)
+
+    def get_ordering(self, request, queryset, view):
+        ordering = getattr(view, 'cursor_ordering', self.ordering)
+        if isinstance(ordering, str):
+            return (ordering,)
+        return tuple(ordering)
+
+
+class KeysetCursorPagination(CustomCursorPagination):
+    """
+    Курсорная пагинация по составному ключу из всех полей сортировки.
+
+    Курсор хранит значения полей ключа последнего объекта страницы,
+    следующая страница выбирается условием (a < x) OR (a = x AND b < y)
+    ... без OFFSET. Поэтому много объектов с одинаковым значением
+    первого поля не теряются и не повторяются. Поля сортируются по
+    убыванию, лента листается только вперёд.
+    """
+    separator = '|'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        ordering = self.get_ordering(request, queryset, view)
+        self.fields = [
+            queryset.model._meta.get_field(name.lstrip('-'))
+            for name in ordering
+        ]
+        cursor = self.decode_cursor(request)
+        if cursor is not None and cursor.position:
+            values = cursor.position.split(self.separator)
+            if len(values) != len(self.fields):
+                raise NotFound(self.invalid_cursor_message)
+            try:
+                values = [
+                    field.to_python(value)
+                    for field, value in zip(self.fields, values)
+                ]
+            except ValidationError:
+                raise NotFound(self.invalid_cursor_message)
+            condition = Q()
+            equal = Q()
+            for field, value in zip(self.fields, values):
+                condition |= equal & Q(**{f'{field.name}__lt': value})
+                equal &= Q(**{field.name: value})
+            queryset = queryset.filter(condition)
+        page = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        self.next_key = (
+            page[self.page_size - 1] if len(page) > self.page_size else None
+        )
+        return page[:self.page_size]
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=self.separator.join(
+                field.value_to_string(self.next_key) for field in self.fields
+            )
+        ))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
+
+
 class CustomPageNumberPagination(PageNumberPagination):
-    """Кастомная пагинация с параметрами 'limit' и 'page.'"""
+    """
+    Кастомная пагинация с параметрами 'limit' и 'page.'
+
+    Если в запросе передан параметр 'cursor' (для первой страницы -
+    пустой), используется курсорная пагинация: класс берётся из
+    атрибута cursor_pagination_class вьюсета.
+    """
+    page_size_query_param = 'limit'
+    page_query_param = 'page'
+    page_size = PAGE_SIZE
+    cursor_query_param = 'cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param in request.query_params:
+            self.cursor_paginator = getattr(
+                view, 'cursor_pagination_class', CustomCursorPagination
+            )()
+            return self.cursor_paginator.paginate_queryset(
+                queryset, request, view
+            )
+        self.cursor_paginator = None
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.cursor_paginator is not None:
+            return self.cursor_paginator.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class ListPagination(PageNumberPagination):
+    """Пагинация готового списка с параметрами 'limit' и 'page'."""
     page_size_query_param = 'limit'
     page_query_param = 'page'
     page_size = PAGE_SIZE
+
+
+class FeedPagination(CursorPagination):
+    """
+    Курсорная пагинация ленты подписок по ключу (дата публикации, id).
+
+    Курсор хранит ключ последнего рецепта страницы, поэтому следующая
+    страница выбирается по индексу без OFFSET. Лента листается только
+    вперёд.
+    """
+    page_size_query_param = 'limit'
+    page_size = PAGE_SIZE
+
+    def paginate_timeline(self, request, timeline):
+        """
+        id рецептов страницы.
+
+        timeline(before, limit) возвращает пары (дата, id) по убыванию,
+        идущие после ключа before.
+        """
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        cursor = self.decode_cursor(request)
+        before = None
+        if cursor is not None and cursor.position:
+            try:
+                date, pk = cursor.position.split('|')
+                before = (datetime.fromisoformat(date), int(pk))
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+        rows = timeline(before, self.page_size + 1)
+        self.next_key = (
+            rows[self.page_size - 1] if len(rows) > self.page_size else None
+        )
+        return [pk for _, pk in rows[:self.page_size]]
+
+    def get_next_link(self):
+        if self.next_key is None:
+            return None
+        date, pk = self.next_key
+        return self.encode_cursor(Cursor(
+            offset=0, reverse=False, position=f'{date.isoformat()}|{pk}'
+        ))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': None,
+            'results': data,
+        })
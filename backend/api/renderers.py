@@ -0,0 +1,154 @@
+import csv
+import json
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework import renderers
+
+from api.constants import FILE_CHUNK_SIZE, PDF_SPOOL_MAX_SIZE
+
+
+class Echo:
+    """Псевдобуфер, который возвращает записанную строку."""
+
+    def write(self, value):
+        return value
+
+
+class ShoppingCartRenderer(renderers.BaseRenderer):
+    """
+    Базовый рендерер для выгрузки списка покупок.
+
+    Файл отдаётся по частям через метод stream, который принимает
+    итератор по агрегированным ингредиентам. Метод render используется
+    только для ответов с ошибками.
+    """
+    charset = 'utf-8'
+    extension = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode('utf-8')
+
+    def stream(self, ingredients):
+        """Генератор частей файла."""
+        raise NotImplementedError
+
+
+class ShoppingCartTXTRenderer(ShoppingCartRenderer):
+    """Список покупок в виде текстового файла."""
+    media_type = 'text/plain'
+    format = 'txt'
+    extension = 'txt'
+
+    def stream(self, ingredients):
+        yield 'Список покупок:\n\n'.encode('utf-8')
+        for ingredient in ingredients:
+            yield (
+                f"{ingredient['ingredient__name']} "
+                f"({ingredient['ingredient__measurement_unit']}) - "
+                f"{ingredient['total_amount']}\n"
+            ).encode('utf-8')
+
+
+class ShoppingCartCSVRenderer(ShoppingCartRenderer):
+    """Список покупок в формате CSV."""
+    media_type = 'text/csv'
+    format = 'csv'
+    extension = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(
+            ['Ингредиент', 'Единица измерения', 'Количество']
+        ).encode('utf-8')
+        for ingredient in ingredients:
+            yield writer.writerow([
+                ingredient['ingredient__name'],
+                ingredient['ingredient__measurement_unit'],
+                ingredient['total_amount'],
+            ]).encode('utf-8')
+
+
+class ShoppingCartJSONRenderer(ShoppingCartRenderer):
+    """Список покупок в формате JSON."""
+    media_type = 'application/json'
+    format = 'json'
+    extension = 'json'
+
+    def stream(self, ingredients):
+        separator = '['
+        for ingredient in ingredients:
+            item = json.dumps({
+                'name': ingredient['ingredient__name'],
+                'measurement_unit': ingredient['ingredient__measurement_unit'],
+                'amount': ingredient['total_amount'],
+            }, ensure_ascii=False)
+            yield f'{separator}{item}'.encode('utf-8')
+            separator = ','
+        yield ('[]' if separator == '[' else ']').encode('utf-8')
+
+
+class ShoppingCartPDFRenderer(ShoppingCartRenderer):
+    """
+    Список покупок в формате PDF.
+
+    PDF нельзя собрать по частям, поэтому документ пишется во временный
+    файл, который держится в памяти только до PDF_SPOOL_MAX_SIZE.
+    """
+    media_type = 'application/pdf'
+    format = 'pdf'
+    extension = 'pdf'
+    charset = None
+
+    font_name = 'ShoppingCartFont'
+    font_size = 12
+    margin = 50
+
+    def get_font(self):
+        """Регистрирует шрифт с кириллицей, если он доступен."""
+        font_path = settings.SHOPPING_CART_PDF_FONT
+        if not font_path or not os.path.exists(font_path):
+            return 'Helvetica'
+        if self.font_name not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont(self.font_name, font_path))
+        return self.font_name
+
+    def stream(self, ingredients):
+        with SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE) as file:
+            font = self.get_font()
+            _, height = A4
+            pdf = canvas.Canvas(file, pagesize=A4)
+            pdf.setTitle('Список покупок')
+            line_height = self.font_size * 1.5
+            pdf.setFont(font, self.font_size + 4)
+            y = height - self.margin
+            pdf.drawString(self.margin, y, 'Список покупок:')
+            y -= line_height * 2
+            pdf.setFont(font, self.font_size)
+            for ingredient in ingredients:
+                if y < self.margin:
+                    pdf.showPage()
+                    pdf.setFont(font, self.font_size)
+                    y = height - self.margin
+                pdf.drawString(self.margin, y, (
+                    f"{ingredient['ingredient__name']} "
+                    f"({ingredient['ingredient__measurement_unit']}) - "
+                    f"{ingredient['total_amount']}"
+                ))
+                y -= line_height
+            pdf.save()
+            file.seek(0)
+            yield from iter(lambda: file.read(FILE_CHUNK_SIZE), b'')
+
+
+SHOPPING_CART_RENDERERS = [
+    ShoppingCartTXTRenderer,
+    ShoppingCartCSVRenderer,
+    ShoppingCartJSONRenderer,
+    ShoppingCartPDFRenderer,
+]
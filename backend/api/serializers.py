@@ -1,45 +1,152 @@
 import base64
+import binascii
+import json
+import re
+
+from collections import Counter
 
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
+from django.db import connection, transaction
+from PIL import Image
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
+from rest_framework.utils import html
 from rest_framework.validators import UniqueTogetherValidator
 from djoser.serializers import (
     UserSerializer,
     UserCreateSerializer as BaseUserCreateSerializer
 )
 
-from recipes.models import Tag, Ingredient, Recipe, RecipeIngredient
+from foodgram.middleware import measure
+from foodgram.storage import variant_names
+from api.constants import (BULK_CREATE_BATCH_SIZE,
+                           IMAGE_DIMENSION_ERROR_MESSAGE,
+                           IMAGE_MAX_DIMENSION, IMAGE_MAX_SIZE,
+                           IMAGE_SIZE_ERROR_MESSAGE, PANTRY_MAX_INGREDIENTS,
+                           PANTRY_MAX_MISSING, PANTRY_MAX_MISSING_LIMIT,
+                           PANTRY_VERSION, RECIPES_BULK_LIMIT,
+                           RECIPES_VERSION, USER_COUNTERS_VERSION)
+from api.indexes import pantry_index
+from api.versions import bump_versions
+from recipes.models import (Tag, Ingredient, Recipe, RecipeIngredient,
+                            FeedEntry, PendingSimilarity)
+from recipes.signals import change_counter
 from users.models import Subscription
 
 User = get_user_model()
 
+IMAGE_HEADER_REGEX = re.compile(r'data:image/([\w.+-]+)')
+
 
 class Base64ImageField(serializers.ImageField):
-    """Для обработки Base64."""
+    """
+    Для обработки Base64 и файлов из multipart-запросов.
+
+    Размер и разрешение проверяются по заголовку изображения, без
+    декодирования пикселей. Строка Base64 отклоняется по длине ещё
+    до декодирования.
+    """
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            try:
+                format, imgstr = data.split(';base64,')
+            except ValueError:
+                self.fail('invalid_image')
+            if len(imgstr) * 3 // 4 > IMAGE_MAX_SIZE:
+                raise serializers.ValidationError(IMAGE_SIZE_ERROR_MESSAGE)
+            header = IMAGE_HEADER_REGEX.fullmatch(format)
+            if header is None:
+                self.fail('invalid_image')
+            ext = header.group(1)
+            try:
+                content = base64.b64decode(imgstr, validate=True)
+            except binascii.Error:
+                self.fail('invalid_image')
+            data = ContentFile(content, name='temp.' + ext)
+        if hasattr(data, 'size') and hasattr(data, 'seek'):
+            self.validate_image_file(data)
         return super().to_internal_value(data)
 
+    def validate_image_file(self, file):
+        """Проверка размера файла и разрешения изображения."""
+        if file.size > IMAGE_MAX_SIZE:
+            raise serializers.ValidationError(IMAGE_SIZE_ERROR_MESSAGE)
+        try:
+            with Image.open(file) as image:
+                width, height = image.size
+        except Exception:
+            self.fail('invalid_image')
+        finally:
+            file.seek(0)
+        if max(width, height) > IMAGE_MAX_DIMENSION:
+            raise serializers.ValidationError(
+                IMAGE_DIMENSION_ERROR_MESSAGE
+            )
+
+
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения."""
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_url(self, storage, name):
+        url = storage.url(name)
+        request = self.context.get('request')
+        if request:
+            return request.build_absolute_uri(url)
+        return url
+
+    def to_representation(self, value):
+        if not value:
+            return None
+        representation = {}
+        for variant, names in variant_names(value.name).items():
+            if isinstance(names, str):
+                representation[variant] = self.get_url(value.storage, names)
+            else:
+                representation[variant] = {
+                    extension: self.get_url(value.storage, name)
+                    for extension, name in names.items()
+                }
+        return representation
+
+
+class MeasuredSerializerMixin:
+    """
+    Время построения данных ответа попадает в метрики запроса как этап
+    serialize (см. foodgram.middleware). Замеряется только внешний
+    сериализатор: вложенные входят в его время.
+    """
+
+    def to_representation(self, instance):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        if parent is not None:
+            return super().to_representation(instance)
+        with measure('serialize'):
+            return super().to_representation(instance)
+
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для модели тега (Tag)."""
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ('id', 'name', 'slug')
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(MeasuredSerializerMixin,
+                           serializers.ModelSerializer):
     """Сериализатор для модели ингредиента (Ingredient)."""
     class Meta:
         model = Ingredient
         fields = '__all__'
 
 
-class UserCreateSerializer(BaseUserCreateSerializer):
+class UserCreateSerializer(MeasuredSerializerMixin, BaseUserCreateSerializer):
     """Сериализатор для регистрации нового пользователя."""
 
     class Meta:
@@ -49,7 +156,7 @@ class UserCreateSerializer(BaseUserCreateSerializer):
         ]
 
 
-class AvatarSerializer(serializers.ModelSerializer):
+class AvatarSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для обновления и удаления аватара."""
     avatar = Base64ImageField(required=True)
 
@@ -58,20 +165,24 @@ class AvatarSerializer(serializers.ModelSerializer):
         fields = ['avatar']
 
 
-class CustomUserSerializer(UserSerializer):
+class CustomUserSerializer(MeasuredSerializerMixin, UserSerializer):
     """Сериализатор для кастомной модели пользователя."""
     is_subscribed = serializers.SerializerMethodField()
     avatar = serializers.SerializerMethodField()
+    avatar_variants = ImageVariantsField(source='avatar')
 
     class Meta:
         model = User
         fields = [
             'email', 'id', 'username', 'first_name',
-            'last_name', 'is_subscribed', 'avatar'
+            'last_name', 'is_subscribed', 'avatar', 'avatar_variants',
+            'recipes_count', 'followers_count', 'following_count'
         ]
 
     def get_is_subscribed(self, obj):
         """Подписан ли текущий пользователь на запрашиваемого автора."""
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return request.user.following.filter(author=obj).exists()
@@ -88,15 +199,18 @@ class CustomUserSerializer(UserSerializer):
         return None
 
 
-class ShortRecipeSerializer(serializers.ModelSerializer):
+class ShortRecipeSerializer(MeasuredSerializerMixin,
+                            serializers.ModelSerializer):
     """Сериализатор для упрощенного вывода рецепта."""
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
-class SubscribeSerializer(serializers.ModelSerializer):
+class SubscribeSerializer(MeasuredSerializerMixin,
+                          serializers.ModelSerializer):
     """Сериализатор для подписки и отписки."""
 
     class Meta:
@@ -122,10 +236,10 @@ class SubscribeSerializer(serializers.ModelSerializer):
             instance.author, context=self.context).data
 
 
-class SubscriptionSerializer(serializers.ModelSerializer):
+class SubscriptionSerializer(MeasuredSerializerMixin,
+                             serializers.ModelSerializer):
     """Сериализатор для подписок."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
     is_subscribed = serializers.BooleanField(default=True, read_only=True)
 
     class Meta:
@@ -137,16 +251,15 @@ class SubscriptionSerializer(serializers.ModelSerializer):
 
     def get_recipes(self, obj):
         """Список рецептов пользователя."""
-        recipes_limit = self.context.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if recipes_limit and recipes_limit.isdigit():
-            recipes = recipes[:int(recipes_limit)]
+        if hasattr(obj, 'limited_recipes'):
+            recipes = obj.limited_recipes
+        else:
+            recipes_limit = self.context.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if recipes_limit and recipes_limit.isdigit():
+                recipes = recipes[:int(recipes_limit)]
         return ShortRecipeSerializer(recipes, many=True).data
 
-    def get_recipes_count(self, obj):
-        """Количество рецептов пользователя."""
-        return obj.recipes.count()
-
 
 class IngredientInRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для ингредиента в рецепте."""
@@ -161,7 +274,8 @@ class IngredientInRecipeSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'measurement_unit', 'amount']
 
 
-class RecipeGetSerializer(serializers.ModelSerializer):
+class RecipeGetSerializer(MeasuredSerializerMixin,
+                          serializers.ModelSerializer):
     """Сериализатор для модели рецепта(только GET-запросы)."""
     tags = TagSerializer(many=True, read_only=True)
     author = CustomUserSerializer(read_only=True)
@@ -171,16 +285,20 @@ class RecipeGetSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = Base64ImageField()
+    image_variants = ImageVariantsField(source='image')
 
     class Meta:
         model = Recipe
         fields = [
             'id', 'tags', 'author', 'ingredients', 'is_favorited',
-            'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time'
+            'is_in_shopping_cart', 'name', 'image', 'image_variants', 'text',
+            'cooking_time', 'favorites_count', 'shopping_carts_count'
         ]
 
     def get_is_favorited(self, obj):
         """Находится ли рецепт в списке избранного."""
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.favorites.filter(user=user).exists()
@@ -188,35 +306,284 @@ class RecipeGetSerializer(serializers.ModelSerializer):
 
     def get_is_in_shopping_cart(self, obj):
         """находится ли рецепт в списке покупок."""
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context['request'].user
         if user.is_authenticated:
             return obj.shopping_carts.filter(user=user).exists()
         return False
 
 
+def collect_ids(values):
+    """Целочисленные id из списка, некорректные значения пропускаем."""
+    ids = set()
+    for value in values:
+        if isinstance(value, bool):
+            continue
+        try:
+            ids.add(int(value))
+        except (TypeError, ValueError):
+            continue
+    return ids
+
+
+def raw_relations(item):
+    """
+    Сырые списки тегов и ингредиентов рецепта: из JSON или из
+    multipart-формы (tags повторяющимся полем, ingredients[0]id).
+    """
+    tags = item.get('tags')
+    ingredients = item.get('ingredients')
+    if html.is_html_input(item):
+        tags = item.getlist('tags') or html.parse_html_list(
+            item, prefix='tags', default=[]
+        )
+        if not isinstance(ingredients, list):
+            ingredients = html.parse_html_list(
+                item, prefix='ingredients', default=[]
+            )
+    return (
+        tags if isinstance(tags, list) else [],
+        ingredients if isinstance(ingredients, list) else [],
+    )
+
+
+def preload_recipe_relations(items):
+    """
+    Загружаем теги и ингредиенты, упомянутые в сырых данных рецептов,
+    по одному запросу на модель.
+    """
+    relations = [
+        raw_relations(item) for item in items if isinstance(item, dict)
+    ]
+    tag_ids = collect_ids(
+        tag for tags, _ in relations for tag in tags
+    )
+    ingredient_ids = collect_ids(
+        ingredient.get('id') for _, ingredients in relations
+        for ingredient in ingredients
+        if isinstance(ingredient, dict)
+    )
+    return {
+        Tag: Tag.objects.in_bulk(tag_ids),
+        Ingredient: Ingredient.objects.in_bulk(ingredient_ids),
+    }
+
+
+class PantrySerializer(serializers.Serializer):
+    """Параметры подбора рецептов по продуктам пользователя."""
+    ingredients = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=PANTRY_MAX_INGREDIENTS
+    )
+    max_missing = serializers.IntegerField(
+        min_value=0,
+        max_value=PANTRY_MAX_MISSING_LIMIT,
+        default=PANTRY_MAX_MISSING
+    )
+
+
+class BatchedManyRelatedField(serializers.ManyRelatedField):
+    """Список связей, который проверяется одним запросом IN."""
+    default_error_messages = {
+        'does_not_exist': (
+            'Недопустимые первичные ключи {pk_values} - '
+            'объекты не существуют.'
+        ),
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        objects = self.child_relation.get_objects(data)
+        missing = []
+        for value in data:
+            if isinstance(value, bool) or not collect_ids([value]):
+                self.child_relation.fail(
+                    'incorrect_type', data_type=type(value).__name__
+                )
+            if int(value) not in objects:
+                missing.append(str(value))
+        if missing:
+            self.fail('does_not_exist', pk_values=', '.join(missing))
+        return [objects[int(value)] for value in data]
+
+
+class BatchedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Связь по первичному ключу, которая ищет объект среди загруженных
+    заранее в context['preloaded_objects']. Со many=True все id
+    проверяются одним запросом.
+    """
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BatchedManyRelatedField(**list_kwargs)
+
+    def get_preloaded(self):
+        """Заранее загруженные объекты модели поля или None."""
+        return self.context.get('preloaded_objects', {}).get(
+            self.get_queryset().model
+        )
+
+    def get_objects(self, values):
+        """
+        Объекты по списку id: из загруженных, а недостающие - одним
+        запросом.
+        """
+        preloaded = self.get_preloaded()
+        if preloaded is None:
+            return self.get_queryset().in_bulk(collect_ids(values))
+        missing = collect_ids(values) - preloaded.keys()
+        if missing:
+            preloaded.update(self.get_queryset().in_bulk(missing))
+        return preloaded
+
+    def to_internal_value(self, data):
+        preloaded = self.get_preloaded()
+        if preloaded is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return preloaded[int(data)]
+        except KeyError:
+            obj = super().to_internal_value(data)
+            preloaded[obj.pk] = obj
+            return obj
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
 class AddIngredientInRecipeSerializer(serializers.ModelSerializer):
     """Сериализатор для ингредиента при добавлении в рецепт."""
-    id = serializers.PrimaryKeyRelatedField(queryset=Ingredient.objects.all())
+    id = BatchedPrimaryKeyRelatedField(queryset=Ingredient.objects.all())
 
     class Meta:
         model = RecipeIngredient
         fields = ['id', 'amount']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeListSerializer(serializers.ListSerializer):
+    """
+    Пакетное создание рецептов.
+
+    Все упомянутые теги и ингредиенты загружаются двумя запросами до
+    валидации, а рецепты, их теги и ингредиенты вставляются
+    многострочными INSERT.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > RECIPES_BULK_LIMIT:
+            raise serializers.ValidationError({
+                'non_field_errors': [
+                    f'За один запрос можно создать не более '
+                    f'{RECIPES_BULK_LIMIT} рецептов.'
+                ]
+            })
+        if isinstance(data, list):
+            self.context['preloaded_objects'] = preload_recipe_relations(
+                data
+            )
+        return super().to_internal_value(data)
+
+    def create(self, validated_data):
+        recipes = []
+        for data in validated_data:
+            data = data.copy()
+            data.pop('tags')
+            data.pop('ingredients')
+            recipes.append(Recipe(**data))
+        if connection.features.can_return_rows_from_bulk_insert:
+            Recipe.objects.bulk_create(
+                recipes, batch_size=BULK_CREATE_BATCH_SIZE
+            )
+            # bulk_create не отправляет сигналы post_save.
+            authors = Counter(recipe.author_id for recipe in recipes)
+            for author_id, count in authors.items():
+                change_counter(User, author_id, 'recipes_count', count)
+            FeedEntry.objects.fan_out(recipes)
+            pks = [recipe.pk for recipe in recipes]
+            transaction.on_commit(lambda: pantry_index.mark(pks))
+        else:
+            for recipe in recipes:
+                recipe.save()
+        Recipe.tags.through.objects.bulk_create(
+            [
+                Recipe.tags.through(recipe=recipe, tag=tag)
+                for recipe, data in zip(recipes, validated_data)
+                for tag in data['tags']
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE
+        )
+        # bulk_create связей не отправляет m2m_changed.
+        Recipe.objects.filter(
+            pk__in=[recipe.pk for recipe in recipes]
+        ).update_tags_mask()
+        PendingSimilarity.objects.mark([recipe.pk for recipe in recipes])
+        RecipeIngredient.objects.bulk_create(
+            [
+                RecipeIngredient(
+                    recipe=recipe,
+                    ingredient=ingredient['id'],
+                    amount=ingredient['amount']
+                )
+                for recipe, data in zip(recipes, validated_data)
+                for ingredient in data['ingredients']
+            ],
+            batch_size=BULK_CREATE_BATCH_SIZE
+        )
+        bump_versions(RECIPES_VERSION, USER_COUNTERS_VERSION, PANTRY_VERSION)
+        return recipes
+
+
+class RecipeSerializer(MeasuredSerializerMixin, serializers.ModelSerializer):
     """Сериализатор для создания и обновления рецепта."""
     ingredients = AddIngredientInRecipeSerializer(many=True)
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BatchedPrimaryKeyRelatedField(
         queryset=Tag.objects.all(), many=True
     )
     image = Base64ImageField()
 
     class Meta:
         model = Recipe
+        list_serializer_class = RecipeListSerializer
         fields = [
             'ingredients', 'tags', 'image', 'name', 'text', 'cooking_time'
         ]
 
+    def to_internal_value(self, data):
+        """
+        Теги и ингредиенты загружаются заранее одним запросом на модель.
+
+        В multipart-запросе список ингредиентов можно передать строкой
+        JSON, а теги - повторяющимся полем tags.
+        """
+        if html.is_html_input(data) and isinstance(
+            data.get('ingredients'), str
+        ):
+            try:
+                ingredients = json.loads(data['ingredients'])
+            except ValueError:
+                raise serializers.ValidationError({
+                    'ingredients': 'Некорректный JSON.'
+                })
+            data = {
+                **data.dict(),
+                'tags': data.getlist('tags'),
+                'ingredients': ingredients,
+            }
+        if not isinstance(self.parent, RecipeListSerializer):
+            self.context['preloaded_objects'] = preload_recipe_relations(
+                [data]
+            )
+        return super().to_internal_value(data)
+
     def validate(self, data):
         """Общая валидация для создания и обновления рецепта."""
         if self.context['request'].method in ('POST', 'PUT', 'PATCH'):
@@ -231,32 +598,36 @@ class RecipeSerializer(serializers.ModelSerializer):
         return data
 
     def validate_ingredients(self, ingredients):
-        """Проверка ингредиентов на уникальность и количество."""
-        if ingredients:
-            id_ingredients = []
-            for ingredient in ingredients:
-                if ingredient['amount'] < 1:
-                    raise serializers.ValidationError(
-                        'Минимальное количество ингредиента - 1!'
-                    )
-                if ingredient['id'] in id_ingredients:
-                    raise serializers.ValidationError(
-                        'Ингредиенты не должны повторяться!'
-                    )
-                id_ingredients.append(ingredient['id'])
-            return ingredients
+        """Проверка ингредиентов на уникальность и наличие."""
+        if not ingredients:
+            raise serializers.ValidationError(
+                'Нужно указать хотя бы один ингредиент!'
+            )
+        counts = Counter(ingredient['id'].pk for ingredient in ingredients)
+        duplicates = sorted(pk for pk, count in counts.items() if count > 1)
+        if duplicates:
+            raise serializers.ValidationError(
+                'Ингредиенты не должны повторяться: '
+                + ', '.join(map(str, duplicates))
+            )
+        return ingredients
 
     def validate_tags(self, tags):
         """Проверка тегов на уникальность и наличие."""
-        if tags:
-            if len(tags) != len(set(tags)):
-                raise serializers.ValidationError(
-                    'Теги не должны повторяться!'
-                )
-            return tags
+        if not tags:
+            raise serializers.ValidationError(
+                'Нужно указать хотя бы один тег!'
+            )
+        if len(tags) != len(set(tags)):
+            raise serializers.ValidationError(
+                'Теги не должны повторяться!'
+            )
+        return tags
 
     def add_ingredients(self, recipe, ingredients):
         """Функция добавления ингредиентов в рецепт."""
+        if not ingredients:
+            return
         list_ingredients = [
             RecipeIngredient(
                 recipe=recipe,
@@ -273,8 +644,48 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         recipe.tags.set(tags)
         self.add_ingredients(recipe, ingredients)
+        bump_versions(PANTRY_VERSION)
         return recipe
 
+    def sync_ingredients(self, recipe, ingredients):
+        """
+        Приводим ингредиенты рецепта к новому списку.
+
+        Удаляются, добавляются и обновляются только изменившиеся строки.
+        Если состав ингредиентов изменился, рецепт отмечается для
+        пересчёта похожих.
+        """
+        current = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in recipe.recipe_ingredients.all()
+        }
+        amounts = {
+            ingredient['id'].pk: ingredient['amount']
+            for ingredient in ingredients
+        }
+        removed = current.keys() - amounts.keys()
+        if removed:
+            RecipeIngredient.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, recipe_ingredient in current.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                changed.append(recipe_ingredient)
+        if changed:
+            RecipeIngredient.objects.bulk_update(changed, ['amount'])
+        added = [
+            ingredient for ingredient in ingredients
+            if ingredient['id'].pk not in current
+        ]
+        self.add_ingredients(recipe, added)
+        if removed or added:
+            PendingSimilarity.objects.mark([recipe.pk])
+            bump_versions(PANTRY_VERSION)
+
+    @transaction.atomic
     def update(self, instance, validated_data):
         """Функция для обновления рецепта."""
         ingredients = validated_data.pop('ingredients')
@@ -283,12 +694,18 @@ class RecipeSerializer(serializers.ModelSerializer):
         super().update(instance, validated_data)
 
         instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.add_ingredients(instance, ingredients)
-        instance.save()
+        self.sync_ingredients(instance, ingredients)
 
         return instance
 
     def to_representation(self, instance):
-        """Переопределяем представление данных."""
+        """
+        Переопределяем представление данных.
+
+        Рецепт перечитывается со связанными данными, чтобы не загружать
+        каждый ингредиент отдельным запросом.
+        """
+        instance = Recipe.objects.for_representation(
+            self.context['request'].user
+        ).get(pk=instance.pk)
         return RecipeGetSerializer(instance, context=self.context).data
@@ -0,0 +1,149 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save)
+from django.dispatch import receiver
+
+from api.constants import (INGREDIENTS_VERSION, RECIPE_AUTHOR_FIELDS,
+                           RECIPE_COUNTERS_VERSION, RECIPE_IDS_VERSION,
+                           RECIPES_VERSION, TAGS_VERSION,
+                           USER_COUNTERS_VERSION, USERS_VERSION)
+from api.indexes import ingredient_index, pantry_index, recipe_ids
+from api.versions import bump_versions, user_state_key
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def invalidate_ingredient_index(sender, **kwargs):
+    """Сбрасываем индекс автодополнения при изменении ингредиентов."""
+    ingredient_index.invalidate()
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def bump_tags_version(sender, **kwargs):
+    """Теги входят и в список тегов, и в рецепты."""
+    bump_versions(TAGS_VERSION, RECIPES_VERSION)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def bump_ingredients_version(sender, **kwargs):
+    """Ингредиенты входят и в список ингредиентов, и в рецепты."""
+    bump_versions(INGREDIENTS_VERSION, RECIPES_VERSION)
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_id(sender, instance, created, **kwargs):
+    """Новый рецепт сразу доступен по короткой ссылке."""
+    if created:
+        transaction.on_commit(lambda: recipe_ids.add(instance.pk))
+
+
+@receiver(post_delete, sender=Recipe)
+def discard_recipe_id(sender, instance, **kwargs):
+    """
+    Удалённый рецепт больше не открывается по короткой ссылке, другие
+    процессы перестраивают множество по версии.
+    """
+    pk = instance.pk
+    transaction.on_commit(lambda: recipe_ids.discard(pk))
+    bump_versions(RECIPE_IDS_VERSION)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def mark_pantry_recipe(sender, instance, **kwargs):
+    """Ингредиенты рецепта перечитываются при подборе по продуктам."""
+    pk = instance.pk
+    transaction.on_commit(lambda: pantry_index.mark([pk]))
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def bump_recipes_version(sender, created=True, **kwargs):
+    """Рецепты и, при создании или удалении, счётчик рецептов автора."""
+    if created:
+        bump_versions(RECIPES_VERSION, USER_COUNTERS_VERSION)
+    else:
+        bump_versions(RECIPES_VERSION)
+
+
+@receiver([post_save, post_delete], sender=RecipeIngredient)
+def bump_recipe_ingredients_version(sender, **kwargs):
+    """Ингредиенты рецепта."""
+    bump_versions(RECIPES_VERSION)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def bump_recipe_tags_version(sender, action, **kwargs):
+    """Теги рецепта."""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        bump_versions(RECIPES_VERSION)
+
+
+def author_fields(instance):
+    """Загруженные поля автора, которые видны в рецептах."""
+    values = {}
+    for field in RECIPE_AUTHOR_FIELDS:
+        if field in instance.__dict__:
+            value = instance.__dict__[field]
+            values[field] = getattr(value, 'name', value) or None
+    return values
+
+
+@receiver(post_init, sender=User)
+def remember_author_fields(sender, instance, **kwargs):
+    """Запоминаем поля автора, прочитанные из БД."""
+    instance._author_fields = author_fields(instance)
+
+
+@receiver(post_save, sender=User)
+def bump_users_version(sender, instance, created, update_fields=None,
+                       **kwargs):
+    """
+    Пользователи и, если изменились видимые поля автора, рецепты.
+
+    Новые пользователи и пользователи без рецептов в рецептах не
+    появляются. Число рецептов в объекте может устареть, поэтому при
+    нуле оно перечитывается.
+    """
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    current = author_fields(instance)
+    loaded = instance._author_fields
+    changed = not created and any(
+        field not in loaded or loaded[field] != value
+        for field, value in current.items()
+        if update_fields is None or field in update_fields
+    )
+    instance._author_fields = current
+    if changed and (
+        instance.__dict__.get('recipes_count')
+        or sender.objects.filter(pk=instance.pk, recipes_count__gt=0).exists()
+    ):
+        bump_versions(USERS_VERSION, RECIPES_VERSION)
+    else:
+        bump_versions(USERS_VERSION)
+
+
+@receiver(post_delete, sender=User)
+def bump_deleted_users_version(sender, **kwargs):
+    """Рецепты удалённого автора увеличивают версию рецептов сами."""
+    bump_versions(USERS_VERSION)
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def bump_user_recipes_version(sender, instance, **kwargs):
+    """
+    Флаги видны только самому пользователю, остальным - счётчики
+    рецепта, поэтому данные рецептов не устаревают.
+    """
+    bump_versions(RECIPE_COUNTERS_VERSION, user_state_key(instance.user_id))
+
+
+@receiver([post_save, post_delete], sender=Subscription)
+def bump_subscriptions_version(sender, instance, **kwargs):
+    """Флаг подписки пользователя и счётчики подписок."""
+    bump_versions(USER_COUNTERS_VERSION, user_state_key(instance.user_id))
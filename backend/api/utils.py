@@ -1,5 +1,16 @@
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.db import DatabaseError
+from django.db.models import (Case, F, PositiveIntegerField, Prefetch, Value,
+                              When, prefetch_related_objects)
 from hashids import Hashids
 
+from api.constants import CLICKS_FLUSH_INTERVAL, CLICKS_FLUSH_SIZE
+from recipes.models import Recipe
+
 hashids = Hashids(min_length=6)
 
 
@@ -7,3 +18,86 @@ def generate_short_link(request, recipe_id):
     """Генерация короткой ссылки для рецепта."""
     short_link = hashids.encode(recipe_id)
     return request.build_absolute_uri(f'/s/{short_link}/')
+
+
+def prefetch_author_recipes(authors, recipes_limit=None):
+    """
+    Подгружает рецепты авторов в атрибут limited_recipes.
+
+    Если передан recipes_limit, для каждого автора берутся только
+    первые рецепты, но всё равно одним запросом на всю страницу.
+    """
+    recipes = Recipe.objects.all()
+    if recipes_limit and recipes_limit.isdigit():
+        recipes = Recipe.objects.filter(
+            author__in=authors
+        ).first_per_author(int(recipes_limit))
+    prefetch_related_objects(
+        authors,
+        Prefetch('recipes', queryset=recipes, to_attr='limited_recipes')
+    )
+    return authors
+
+
+class ClickBuffer:
+    """
+    Буфер переходов по коротким ссылкам.
+
+    Переходы копятся в памяти процесса и записываются в БД одним UPDATE,
+    когда их набирается CLICKS_FLUSH_SIZE или с прошлой записи проходит
+    CLICKS_FLUSH_INTERVAL секунд. Остаток записывается при завершении
+    процесса.
+    """
+
+    def __init__(self, size=CLICKS_FLUSH_SIZE,
+                 interval=CLICKS_FLUSH_INTERVAL):
+        self.size = size
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._clicks = Counter()
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+        atexit.register(self.flush)
+
+    def add(self, pk):
+        """Учитываем переход и при необходимости сбрасываем буфер."""
+        with self._lock:
+            self._clicks[pk] += 1
+            self._pending += 1
+            if (self._pending < self.size and time.monotonic()
+                    - self._flushed_at < self.interval):
+                return
+            clicks = self._take()
+        self.write(clicks)
+
+    def flush(self):
+        """Записываем накопленные переходы."""
+        with self._lock:
+            clicks = self._take()
+        self.write(clicks)
+
+    def _take(self):
+        clicks, self._clicks = self._clicks, Counter()
+        self._pending = 0
+        self._flushed_at = time.monotonic()
+        return clicks
+
+    def write(self, clicks):
+        """Увеличиваем счётчики рецептов одним запросом."""
+        if not clicks:
+            return
+        try:
+            Recipe.objects.filter(pk__in=clicks).update(
+                short_link_clicks=F('short_link_clicks') + Case(
+                    *(When(pk=pk, then=Value(count))
+                      for pk, count in clicks.items()),
+                    output_field=PositiveIntegerField()
+                )
+            )
+        except DatabaseError:
+            with self._lock:
+                self._clicks.update(clicks)
+                self._pending += sum(clicks.values())
+
+
+click_buffer = ClickBuffer()
@@ -0,0 +1,86 @@
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from api.constants import USER_STATE_VERSION
+from api.models import DataVersion
+
+
+def user_state_key(user_id):
+    """Ключ версии избранного, списка покупок и подписок пользователя."""
+    return USER_STATE_VERSION.format(user_id)
+
+
+_deferred = threading.local()
+
+
+def bump_versions(*keys):
+    """
+    Увеличиваем версии наборов данных после фиксации транзакции.
+
+    Строки версий общие для всех запросов: UPDATE внутри транзакции
+    держал бы блокировку строки до её конца, и все записи сайта
+    выстраивались бы в очередь за одной строкой.
+    """
+    deferred = getattr(_deferred, 'keys', None)
+    if deferred is not None:
+        deferred.update(keys)
+        return
+    transaction.on_commit(lambda: write_versions(keys))
+
+
+def write_versions(keys):
+    """Увеличиваем версии, создавая недостающие строки."""
+    now = timezone.now()
+    updated = DataVersion.objects.filter(key__in=keys).update(
+        version=F('version') + 1,
+        updated_at=now
+    )
+    if updated < len(set(keys)):
+        existing = set(DataVersion.objects.filter(
+            key__in=keys
+        ).values_list('key', flat=True))
+        missing = set(keys) - existing
+        # Версию, созданную параллельным запросом, тоже увеличиваем.
+        DataVersion.objects.bulk_create(
+            [DataVersion(key=key, version=0, updated_at=now)
+             for key in missing],
+            ignore_conflicts=True
+        )
+        DataVersion.objects.filter(key__in=missing).update(
+            version=F('version') + 1,
+            updated_at=now
+        )
+
+
+@contextmanager
+def defer_versions():
+    """
+    Откладываем увеличение версий до конца блока.
+
+    Сигналы на каждую строку при каскадном удалении увеличивают версии
+    одним запросом на весь блок. При исключении версии не меняются.
+    """
+    if getattr(_deferred, 'keys', None) is not None:
+        yield
+        return
+    _deferred.keys = keys = set()
+    try:
+        yield
+    finally:
+        _deferred.keys = None
+    if keys:
+        bump_versions(*keys)
+
+
+def get_versions(keys):
+    """Версии и даты изменения наборов данных одним запросом."""
+    versions = {key: (0, None) for key in keys}
+    for key, version, updated_at in DataVersion.objects.filter(
+        key__in=keys
+    ).values_list('key', 'version', 'updated_at'):
+        versions[key] = (version, updated_at)
+    return versions
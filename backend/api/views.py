@@ -1,20 +1,37 @@
 from django.contrib.auth import get_user_model
 from django.shortcuts import get_object_or_404, redirect
+from django.db import transaction
 from django.db.models import Sum
-from django.http import HttpResponse
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import patch_cache_control
 from rest_framework import viewsets, views
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from rest_framework import status
 from django_filters.rest_framework import DjangoFilterBackend
-from hashids import Hashids
 
 from recipes.models import (Tag, Ingredient, RecipeIngredient,
-                            Recipe, Favorite, ShoppingCart)
-from api.utils import generate_short_link
+                            Recipe, Favorite, FeedEntry, ShoppingCart,
+                            SimilarRecipe)
+from recipes.constants import SIMILAR_TOP_K
+from users.constants import USER_COUNTER_FIELDS
+from recipes.signals import deleting_recipes
+from api.constants import (EXPORT_CHUNK_SIZE, INGREDIENTS_VERSION,
+                           RECIPE_COUNTERS_VERSION, RECIPE_ORDERINGS,
+                           RECIPE_SHOWN_COUNTERS, RECIPES_VERSION,
+                           SHORT_LINK_MAX_AGE, SIMILAR_VERSION, TAGS_VERSION,
+                           USER_COUNTERS_VERSION, USERS_VERSION)
+from api.indexes import ingredient_index, pantry_index, recipe_ids
+from api.mixins import AnonymousCacheMixin, ConditionalGetMixin
+from api.renderers import SHOPPING_CART_RENDERERS
+from api.versions import defer_versions
+from api.utils import (click_buffer, generate_short_link, hashids,
+                       prefetch_author_recipes)
 from api.permissions import IsAuthorOrAdminOrReadOnly
-from api.paginations import CustomPageNumberPagination
+from api.paginations import (CustomCursorPagination,
+                             CustomPageNumberPagination, FeedPagination,
+                             KeysetCursorPagination, ListPagination)
 from api.filters import RecipeFilter, IngredientFilter
 from .serializers import (TagSerializer,
                           IngredientSerializer,
@@ -22,6 +39,8 @@ from .serializers import (TagSerializer,
                           UserCreateSerializer,
                           AvatarSerializer,
                           SubscribeSerializer,
+                          SubscriptionSerializer,
+                          PantrySerializer,
                           RecipeGetSerializer,
                           RecipeSerializer,
                           ShortRecipeSerializer)
@@ -29,26 +48,58 @@ from .serializers import (TagSerializer,
 User = get_user_model()
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для тегов."""
+    version_keys = (TAGS_VERSION,)
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
 
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientViewSet(ConditionalGetMixin, viewsets.ReadOnlyModelViewSet):
     """Вьюсет для ингредиентов."""
+    version_keys = (INGREDIENTS_VERSION,)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_class = IngredientFilter
 
-
-class UserViewSet(viewsets.ModelViewSet):
+    @property
+    def conditional_actions(self):
+        """
+        Подсказки по name упорядочены по числу рецептов, которое не
+        входит в версии, поэтому отдаются без ETag.
+        """
+        if self.request.query_params.get('name'):
+            return ()
+        return ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        """Поиск по началу названия обслуживается индексом в памяти."""
+        name = request.query_params.get('name')
+        if name:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
+
+class UserViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """Вьюсет для упарвления пользователями."""
+    version_keys = (USERS_VERSION, USER_COUNTERS_VERSION)
+    user_state = True
+    conditional_actions = ('list', 'retrieve', 'me')
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     pagination_class = CustomPageNumberPagination
 
+    @property
+    def cursor_ordering(self):
+        """Подписки, как и раньше, упорядочены по id автора."""
+        if self.action == 'subscriptions':
+            return ('pk',)
+        return ('username',)
+
+    def get_queryset(self):
+        return User.objects.with_is_subscribed(self.request.user)
+
     def get_permissions(self):
         if self.action == 'create':
             return [AllowAny()]
@@ -121,18 +172,24 @@ class UserViewSet(viewsets.ModelViewSet):
     def subscriptions(self, request):
         """Подписки текущего пользователя."""
         recipes_limit = request.query_params.get('recipes_limit')
-        subscriptions = request.user.following.all()
-        page = self.paginate_queryset(subscriptions)
+        authors = User.objects.filter(
+            followers__user=request.user
+        ).order_by('pk')
+        page = self.paginate_queryset(authors)
         context = {'request': request, 'recipes_limit': recipes_limit}
 
         if page is None:
-            serializer = SubscribeSerializer(
-                subscriptions, many=True, context=context
+            authors = prefetch_author_recipes(list(authors), recipes_limit)
+            serializer = SubscriptionSerializer(
+                authors, many=True, context=context
             )
             return Response(serializer.data)
 
         else:
-            serializer = SubscribeSerializer(page, many=True, context=context)
+            page = prefetch_author_recipes(page, recipes_limit)
+            serializer = SubscriptionSerializer(
+                page, many=True, context=context
+            )
             return self.get_paginated_response(serializer.data)
 
     @action(
@@ -141,6 +198,7 @@ class UserViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated],
         url_path='subscribe'
     )
+    @transaction.atomic
     def subscribe(self, request, pk=None):
         """Подписка и отписка на пользователя."""
         user = request.user
@@ -165,8 +223,11 @@ class UserViewSet(viewsets.ModelViewSet):
             return Response(status=status.HTTP_400_BAD_REQUEST)
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(AnonymousCacheMixin, ConditionalGetMixin,
+                    viewsets.ModelViewSet):
     """Вьюсет для рецептов."""
+    user_state = True
+    conditional_actions = ('list', 'retrieve', 'feed', 'similar', 'pantry')
     queryset = Recipe.objects.all()
     serializer_class = RecipeGetSerializer
     permission_classes = [IsAuthorOrAdminOrReadOnly]
@@ -174,15 +235,219 @@ class RecipeViewSet(viewsets.ModelViewSet):
     filter_backends = [DjangoFilterBackend]
     filterset_class = RecipeFilter
 
+    @property
+    def cursor_ordering(self):
+        """Курсорная пагинация учитывает сортировку из запроса."""
+        return RECIPE_ORDERINGS.get(
+            self.request.query_params.get('ordering'), ('-pub_date', '-id')
+        )
+
+    @property
+    def cursor_pagination_class(self):
+        """
+        Сортировки по оценкам популярности содержат много одинаковых
+        значений и листаются по составному ключу.
+        """
+        if self.request.query_params.get('ordering') in RECIPE_ORDERINGS:
+            return KeysetCursorPagination
+        return CustomCursorPagination
+
+    @property
+    def version_keys(self):
+        """Списки похожих рецептов меняет только compute_similar_recipes."""
+        keys = (
+            RECIPES_VERSION, TAGS_VERSION, INGREDIENTS_VERSION,
+            USERS_VERSION, RECIPE_COUNTERS_VERSION, USER_COUNTERS_VERSION
+        )
+        if self.action == 'similar':
+            return keys + (SIMILAR_VERSION,)
+        return keys
+
+    @property
+    def counter_version_keys(self):
+        """Порядок по оценкам популярности зависит от счётчиков."""
+        if self.request.query_params.get('ordering') in RECIPE_ORDERINGS:
+            return ()
+        return (RECIPE_COUNTERS_VERSION, USER_COUNTERS_VERSION)
+
+    def refresh_counters(self, data):
+        """Счётчики рецептов и их авторов двумя запросами."""
+        if isinstance(data, dict):
+            recipes = data['results'] if 'results' in data else [data]
+        else:
+            recipes = data
+        recipe_counters = {
+            pk: counters for pk, *counters in Recipe.objects.filter(
+                pk__in=[recipe['id'] for recipe in recipes]
+            ).values_list('id', *RECIPE_SHOWN_COUNTERS)
+        }
+        user_counters = {
+            pk: counters for pk, *counters in User.objects.filter(
+                pk__in=[recipe['author']['id'] for recipe in recipes]
+            ).values_list('id', *USER_COUNTER_FIELDS)
+        }
+        for recipe in recipes:
+            recipe.update(zip(
+                RECIPE_SHOWN_COUNTERS,
+                recipe_counters.get(recipe['id'], ())
+            ))
+            recipe['author'].update(zip(
+                USER_COUNTER_FIELDS,
+                user_counters.get(recipe['author']['id'], ())
+            ))
+        return data
+
+    def get_queryset(self):
+        return Recipe.objects.for_representation(self.request.user)
+
+    @transaction.atomic
     def perform_create(self, serializer):
         return serializer.save(author=self.request.user)
 
+    @transaction.atomic
+    def perform_update(self, serializer):
+        serializer.save()
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        """
+        Удаляем рецепт.
+
+        Каскадное удаление отправляет сигналы на каждую строку, поэтому
+        версии увеличиваются один раз в конце, а счётчики удаляемого
+        рецепта не обновляются.
+        """
+        with defer_versions(), deleting_recipes([instance.pk]):
+            instance.delete()
+
     def get_serializer_class(self):
         """Выбираем сериализатор в зависимости от запроса."""
-        if self.action == ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve'):
             return RecipeGetSerializer
         return RecipeSerializer
 
+    @action(
+        detail=False,
+        methods=['post'],
+        permission_classes=[IsAuthenticated],
+        url_path='bulk'
+    )
+    @transaction.atomic
+    def bulk_create(self, request):
+        """
+        Создание списка рецептов одним запросом.
+
+        Рецепты создаются только если все они прошли валидацию; ошибки
+        возвращаются списком в порядке рецептов.
+        """
+        serializer = RecipeSerializer(
+            data=request.data, many=True, context=self.get_serializer_context()
+        )
+        serializer.is_valid(raise_exception=True)
+        recipes = serializer.save(author=request.user)
+        return Response(
+            ShortRecipeSerializer(
+                recipes, many=True, context=self.get_serializer_context()
+            ).data,
+            status=status.HTTP_201_CREATED
+        )
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path='feed'
+    )
+    def feed(self, request):
+        """
+        Лента подписок: рецепты авторов, на которых подписан
+        пользователь, новые первыми.
+        """
+        paginator = FeedPagination()
+        ids = paginator.paginate_timeline(
+            request,
+            lambda before, limit: FeedEntry.objects.timeline(
+                request.user, before, limit
+            )
+        )
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = RecipeGetSerializer(
+            [recipes[pk] for pk in ids if pk in recipes],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        url_path='pantry'
+    )
+    def pantry(self, request):
+        """
+        Что приготовить из имеющихся продуктов: рецепты, для которых
+        не хватает не более max_missing ингредиентов, сначала те, где
+        не хватает меньше.
+
+        Рецепты подбираются по индексу в памяти, у каждого указаны id
+        недостающих ингредиентов.
+        """
+        params = PantrySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        pantry = set(params.validated_data['ingredients'])
+        paginator = ListPagination()
+        page = paginator.paginate_queryset(
+            pantry_index.match(pantry, params.validated_data['max_missing']),
+            request,
+            view=self
+        )
+        recipes = self.get_queryset().in_bulk([pk for pk, _ in page])
+        data = RecipeGetSerializer(
+            [recipes[pk] for pk, _ in page if pk in recipes],
+            many=True,
+            context=self.get_serializer_context()
+        ).data
+        for item in data:
+            item['missing_ingredients'] = [
+                ingredient['id'] for ingredient in item['ingredients']
+                if ingredient['id'] not in pantry
+            ]
+        return paginator.get_paginated_response(data)
+
+    @action(
+        detail=True,
+        methods=['get'],
+        url_path='similar'
+    )
+    def similar(self, request, pk=None):
+        """
+        Похожие рецепты по ингредиентам и тегам, самые похожие первыми.
+
+        Списки заранее рассчитываются командой compute_similar_recipes.
+        """
+        try:
+            pk = int(pk)
+        except ValueError:
+            raise Http404
+        try:
+            limit = int(request.query_params.get('limit', SIMILAR_TOP_K))
+        except ValueError:
+            limit = SIMILAR_TOP_K
+        limit = min(max(limit, 0), SIMILAR_TOP_K)
+        ids = list(SimilarRecipe.objects.filter(recipe_id=pk).order_by(
+            '-score', 'similar_id'
+        ).values_list('similar_id', flat=True)[:limit])
+        if not ids and not recipe_ids.exists(pk):
+            raise Http404
+        recipes = self.get_queryset().in_bulk(ids)
+        serializer = RecipeGetSerializer(
+            [recipes[similar_id] for similar_id in ids
+             if similar_id in recipes],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -201,6 +466,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """Добавление и удаление рецепта из списка покупок."""
         return self.general_function(request, pk, ShoppingCart)
 
+    @transaction.atomic
     def general_function(self, request, pk, model):
         """Общий метод для избранного и списка покупок."""
         user = request.user
@@ -227,33 +493,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=['get'],
         permission_classes=[IsAuthenticated],
+        renderer_classes=SHOPPING_CART_RENDERERS,
         url_path='download_shopping_cart'
     )
     def download_shopping_cart(self, request):
-        """Скачивание списка покупок."""
-        user = request.user
+        """
+        Скачивание списка покупок.
+
+        Формат выбирается параметром format (txt, csv, json, pdf).
+        Суммирование выполняется в БД, а файл отдаётся по частям.
+        """
+        renderer = request.accepted_renderer
         ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_carts__user=user
+            recipe__shopping_carts__user=request.user
         ).values(
             'ingredient__name', 'ingredient__measurement_unit'
         ).annotate(
             total_amount=Sum('amount')
-        )
-        shopping_cart = 'Список покупок:\n\n'
-
-        for ingredient in ingredients:
-            shopping_cart += (
-                f"{ingredient['ingredient__name']} "
-                f"({ingredient['ingredient__measurement_unit']}) - "
-                f"{ingredient['total_amount']}\n"
-            )
-
-        response = HttpResponse(
-            shopping_cart,
-            content_type='text/plain; charset=utf-8'
+        ).order_by('ingredient__name')
+
+        content_type = renderer.media_type
+        if renderer.charset:
+            content_type = f'{content_type}; charset={renderer.charset}'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients.iterator(EXPORT_CHUNK_SIZE)),
+            content_type=content_type
         )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_cart.txt"'
+            f'attachment; filename="shopping_cart.{renderer.extension}"'
         )
         return response
 
@@ -264,18 +531,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_short_link(self, request, pk=None):
         """Получаем короткую ссылку на рецепт."""
-        recipe = get_object_or_404(Recipe, pk=pk)
-        short_link = generate_short_link(request, recipe.pk)
+        if not pk.isdigit() or not recipe_ids.exists(int(pk)):
+            raise Http404
+        short_link = generate_short_link(request, int(pk))
         return Response({'short-link': short_link}, status=status.HTTP_200_OK)
 
 
-hashids = Hashids(min_length=6)
-
-
 class ShortLinkView(views.APIView):
-    """Редирект пользователя с короткой ссылки рецепта на полную."""
+    """
+    Редирект пользователя с короткой ссылки рецепта на полную.
+
+    Существование рецепта проверяется по множеству id в памяти, а
+    переходы считаются в буфере, поэтому редирект обычно не обращается
+    к БД. Ответ можно кэшировать на SHORT_LINK_MAX_AGE.
+    """
+    authentication_classes = []
+    permission_classes = [AllowAny]
 
     def get(self, request, hash_result):
-        recipe_id = hashids.decode(hash_result)[0]
-        recipe = get_object_or_404(Recipe, pk=recipe_id)
-        return redirect(f'/recipes/{recipe.pk}/')
+        decoded = hashids.decode(hash_result)
+        if not decoded or not recipe_ids.exists(decoded[0]):
+            raise Http404
+        recipe_id = decoded[0]
+        click_buffer.add(recipe_id)
+        response = redirect(f'/recipes/{recipe_id}/')
+        patch_cache_control(response, public=True, max_age=SHORT_LINK_MAX_AGE)
+        return response
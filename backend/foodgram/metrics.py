@@ -0,0 +1,57 @@
+import os
+
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Histogram, generate_latest,
+                               multiprocess)
+
+LABELS = ('view', 'method')
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144, 233)
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Полное время обработки запроса',
+    LABELS + ('status',)
+)
+DB_DURATION = Histogram(
+    'foodgram_request_db_duration_seconds',
+    'Время запросов к БД за один запрос',
+    LABELS
+)
+SERIALIZE_DURATION = Histogram(
+    'foodgram_request_serialize_duration_seconds',
+    'Время сериализации объектов без запросов к БД',
+    LABELS
+)
+RENDER_DURATION = Histogram(
+    'foodgram_request_render_duration_seconds',
+    'Время сериализации ответа рендерером',
+    LABELS
+)
+QUERY_COUNT = Histogram(
+    'foodgram_request_db_queries',
+    'Количество запросов к БД за один запрос',
+    LABELS,
+    buckets=QUERY_COUNT_BUCKETS
+)
+
+
+def get_registry():
+    """
+    Реестр метрик для выдачи.
+
+    Под gunicorn с несколькими воркерами каждый процесс пишет метрики в
+    файлы в PROMETHEUS_MULTIPROC_DIR, и они собираются при каждом запросе.
+    """
+    if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """Метрики в текстовом формате Prometheus."""
+    return HttpResponse(
+        generate_latest(get_registry()), content_type=CONTENT_TYPE_LATEST
+    )
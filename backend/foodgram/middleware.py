@@ -0,0 +1,181 @@
+import heapq
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import connection
+
+from foodgram.metrics import (DB_DURATION, QUERY_COUNT, RENDER_DURATION,
+                              REQUEST_DURATION, SERIALIZE_DURATION)
+
+logger = logging.getLogger('foodgram.requests')
+_current = threading.local()
+
+
+def view_label(request):
+    """
+    Имя view для метрик: класс и действие вьюсета, например
+    RecipeViewSet.list.
+    """
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name or 'unknown'
+    method = request.method.lower()
+    actions = getattr(match.func, 'actions', None) or {}
+    return f'{view_class.__name__}.{actions.get(method, method)}'
+
+
+class QueryRecorder:
+    """Обёртка выполнения SQL, которая считает запросы и их время."""
+
+    def __init__(self, top=0):
+        self.top = top
+        self.count = 0
+        self.duration = 0.0
+        self.slowest = []
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - start
+            self.count += 1
+            self.duration += duration
+            if self.top:
+                item = (duration, self.count, sql)
+                if len(self.slowest) < self.top:
+                    heapq.heappush(self.slowest, item)
+                else:
+                    heapq.heappushpop(self.slowest, item)
+
+    def top_queries(self):
+        """Самые долгие запросы по убыванию времени."""
+        return sorted(self.slowest, reverse=True)
+
+
+class StageTimer:
+    """
+    Время этапов обработки запроса без времени запросов к БД.
+
+    Вложенные замеры одного этапа не суммируются: учитывается только
+    внешний.
+    """
+
+    def __init__(self, recorder):
+        self.recorder = recorder
+        self.durations = {}
+        self.started = {}
+
+    def start(self, stage):
+        """Начинаем замер; False, если этап уже замеряется."""
+        if stage in self.started:
+            return False
+        self.started[stage] = (time.perf_counter(), self.recorder.duration)
+        return True
+
+    def stop(self, stage):
+        """Заканчиваем замер и добавляем время к этапу."""
+        start, db_start = self.started.pop(stage)
+        elapsed = time.perf_counter() - start
+        db = self.recorder.duration - db_start
+        self.durations[stage] = (
+            self.durations.get(stage, 0.0) + max(elapsed - db, 0.0)
+        )
+
+    @contextmanager
+    def measure(self, stage):
+        if not self.start(stage):
+            yield
+            return
+        try:
+            yield
+        finally:
+            self.stop(stage)
+
+
+@contextmanager
+def measure(stage):
+    """Засекаем этап текущего запроса, если запрос обрабатывается."""
+    timer = getattr(_current, 'timer', None)
+    if timer is None:
+        yield
+        return
+    with timer.measure(stage):
+        yield
+
+
+class RequestMetricsMiddleware:
+    """
+    Метрики каждого запроса: количество и время запросов к БД, время
+    сериализации объектов (этап serialize, см. measure), рендеринга
+    ответа и полное время.
+
+    Значения отдаются в заголовке Server-Timing и в гистограммах
+    Prometheus с метками view и method. Запросы дольше
+    SLOW_REQUEST_THRESHOLD секунд пишутся в журнал вместе с самыми
+    долгими SQL-запросами.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder(settings.SLOW_REQUEST_TOP_QUERIES)
+        _current.timer = timer = StageTimer(recorder)
+        start = time.perf_counter()
+        try:
+            with connection.execute_wrapper(recorder):
+                response = self.get_response(request)
+        finally:
+            _current.timer = None
+        total = time.perf_counter() - start
+        serialize = timer.durations.get('serialize', 0.0)
+        render = timer.durations.get('render', 0.0)
+        app = max(total - recorder.duration - serialize - render, 0.0)
+
+        view = view_label(request)
+        labels = {'view': view, 'method': request.method}
+        REQUEST_DURATION.labels(
+            status=response.status_code, **labels
+        ).observe(total)
+        DB_DURATION.labels(**labels).observe(recorder.duration)
+        SERIALIZE_DURATION.labels(**labels).observe(serialize)
+        RENDER_DURATION.labels(**labels).observe(render)
+        QUERY_COUNT.labels(**labels).observe(recorder.count)
+
+        if settings.SERVER_TIMING:
+            response['Server-Timing'] = ', '.join((
+                f'db;dur={recorder.duration * 1000:.1f};'
+                f'desc="{recorder.count} queries"',
+                f'app;dur={app * 1000:.1f}',
+                f'serialize;dur={serialize * 1000:.1f}',
+                f'render;dur={render * 1000:.1f}',
+                f'total;dur={total * 1000:.1f}',
+            ))
+        if total >= settings.SLOW_REQUEST_THRESHOLD:
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, '
+                'запросов к БД: %d за %.0f мс%s',
+                request.method, request.get_full_path(), view,
+                total * 1000, recorder.count, recorder.duration * 1000,
+                ''.join(
+                    f'\n  {duration * 1000:.1f} мс: {sql}'
+                    for duration, _, sql in recorder.top_queries()
+                )
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        """Засекаем рендеринг ответов DRF, который идёт после view."""
+        timer = getattr(_current, 'timer', None)
+        if timer is not None and timer.start('render'):
+            response.add_post_render_callback(
+                lambda rendered: timer.stop('render')
+            )
+        return response
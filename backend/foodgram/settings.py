@@ -23,7 +23,10 @@ SECRET_KEY = os.getenv('SECRET_KEY', 'default_secret_key')
 
 DEBUG = os.getenv('DEBUG') == 'True'
 
-ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',')
+# Prometheus забирает /metrics напрямую из сети docker по имени сервиса.
+METRICS_HOST = os.getenv('METRICS_HOST', 'backend')
+
+ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', '').split(',') + [METRICS_HOST]
 
 
 # Application definition
@@ -45,6 +48,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -98,6 +102,20 @@ DATABASES = {
 #     }
 # }
 
+# Cache
+# Бэкенд задаётся переменными окружения, например:
+# django.core.cache.backends.filebased.FileBasedCache и /var/tmp/foodgram
+# или django_redis.cache.RedisCache и redis://redis:6379/1
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
 # Authorization
 
 AUTH_USER_MODEL = 'users.User'
@@ -168,6 +186,37 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = 'foodgram.storage.ContentAddressedStorage'
+
+# Загружаемые файлы крупнее этого размера пишутся во временный файл на диске
+
+FILE_UPLOAD_MAX_MEMORY_SIZE = 256 * 1024
+
+# Шрифт с поддержкой кириллицы для выгрузки списка покупок в PDF
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
+# Метрики запросов: заголовок Server-Timing, /metrics для Prometheus
+# и журнал медленных запросов
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', str(DEBUG)) == 'True'
+SLOW_REQUEST_THRESHOLD = float(os.getenv('SLOW_REQUEST_THRESHOLD', 0.5))
+SLOW_REQUEST_TOP_QUERIES = 5
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'foodgram': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
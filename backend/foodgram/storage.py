@@ -0,0 +1,214 @@
+import hashlib
+import io
+import os
+import posixpath
+import time
+
+from django.apps import apps
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import FileField
+from PIL import Image, ImageOps
+
+IMAGE_VARIANTS = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1280,
+}
+IMAGE_VARIANT_FORMATS = {
+    'webp': 'WEBP',
+    'jpeg': 'JPEG',
+}
+PLACEHOLDER_VARIANT = 'placeholder'
+PLACEHOLDER_SIZE = 16
+VARIANTS_DIRECTORY = 'variants'
+VARIANT_QUALITY = 80
+HASH_CHUNK_SIZE = 64 * 1024
+DELETE_GRACE_PERIOD = 60 * 60
+
+
+def variant_name(name, variant, extension):
+    """Имя файла варианта изображения."""
+    root = posixpath.splitext(name)[0]
+    return posixpath.join(VARIANTS_DIRECTORY, f'{root}-{variant}.{extension}')
+
+
+def variant_names(name):
+    """Имена всех вариантов изображения."""
+    names = {
+        variant: {
+            extension: variant_name(name, variant, extension)
+            for extension in IMAGE_VARIANT_FORMATS
+        }
+        for variant in IMAGE_VARIANTS
+    }
+    names[PLACEHOLDER_VARIANT] = variant_name(
+        name, PLACEHOLDER_VARIANT, 'jpeg'
+    )
+    return names
+
+
+def flat_variant_names(name):
+    """Имена файлов всех вариантов изображения одним списком."""
+    names = []
+    for variant in variant_names(name).values():
+        if isinstance(variant, dict):
+            names.extend(variant.values())
+        else:
+            names.append(variant)
+    return names
+
+
+def encode_image(image, image_format):
+    """Кодируем изображение в байты."""
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, 'white')
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+        else:
+            background.paste(image.convert('RGB'))
+        image = background
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, quality=VARIANT_QUALITY)
+    return buffer.getvalue()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Файловое хранилище с именами файлов по хешу содержимого.
+
+    Одинаковые файлы хранятся один раз, поэтому содержимое по любому
+    имени никогда не меняется и может кэшироваться бессрочно. Для
+    изображений при сохранении создаются уменьшенные копии в WebP и JPEG
+    и маленькая заглушка для размытого предпросмотра.
+
+    Файл может использоваться несколькими объектами, поэтому он
+    удаляется вместе с вариантами, только когда на него не ссылается ни
+    одна строка. Повторное сохранение того же содержимого обновляет время
+    изменения файла, и файлы моложе delete_grace_period не удаляются:
+    иначе файл, загруженный параллельным запросом, который ещё не
+    записал строку, пропал бы.
+
+    nginx отдаёт файлы с Cache-Control immutable на год, поэтому
+    удаление убирает файл только с сервера: у клиентов и промежуточных
+    кэшей, уже получивших его, копия остаётся.
+    """
+    delete_grace_period = DELETE_GRACE_PERIOD
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks(HASH_CHUNK_SIZE):
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = posixpath.split(name.replace('\\', '/'))
+        extension = posixpath.splitext(filename)[1].lower()
+        hexdigest = digest.hexdigest()
+        name = posixpath.join(directory, hexdigest[:2], hexdigest + extension)
+        if not self.exists(name):
+            name = self._save(name, content)
+            self.create_variants(name)
+        else:
+            os.utime(self.path(name))
+        return name
+
+    def delete(self, name):
+        """Удаляем файл, если он больше не используется."""
+        if not name or not self.exists(name):
+            return
+        if self.is_recent(name) or self.is_referenced(name):
+            return
+        self.delete_with_variants(name)
+
+    def delete_with_variants(self, name):
+        """Удаляем файл и все его варианты без проверки ссылок."""
+        for path in [name] + flat_variant_names(name):
+            self.delete_file(path)
+
+    def delete_file(self, name):
+        """Удаляем один файл без проверки ссылок."""
+        super().delete(name)
+
+    def is_recent(self, name):
+        """Файл сохранялся недавно."""
+        age = time.time() - os.path.getmtime(self.path(name))
+        return age < self.delete_grace_period
+
+    def file_fields(self):
+        """Файловые поля моделей, которые хранят файлы в этом хранилище."""
+        return [
+            (model, field)
+            for model in apps.get_models()
+            for field in model._meta.concrete_fields
+            if isinstance(field, FileField)
+            and isinstance(field.storage, ContentAddressedStorage)
+        ]
+
+    def is_referenced(self, name):
+        """
+        На файл или на то же содержимое с другим расширением (у них общие
+        варианты) ссылается хотя бы одна строка.
+        """
+        root = posixpath.splitext(name)[0]
+        return any(
+            model._default_manager.filter(
+                **{f'{field.name}__startswith': f'{root}.'}
+            ).exists()
+            for model, field in self.file_fields()
+        )
+
+    def referenced_names(self):
+        """Имена всех файлов, на которые ссылаются строки."""
+        names = set()
+        for model, field in self.file_fields():
+            names.update(
+                model._default_manager.exclude(**{field.name: ''}).exclude(
+                    **{f'{field.name}__isnull': True}
+                ).values_list(field.name, flat=True)
+            )
+        return names
+
+    def create_variants(self, name, force=False):
+        """
+        Создаём варианты изображения.
+
+        Возвращаем False, если файл не является изображением.
+        """
+        names = variant_names(name)
+        if not force and self.exists(names[PLACEHOLDER_VARIANT]):
+            return True
+        try:
+            with self.open(name) as file, Image.open(file) as image:
+                largest = max(IMAGE_VARIANTS.values())
+                image.draft('RGB', (largest, largest))
+                image = ImageOps.exif_transpose(image)
+                for variant, size in IMAGE_VARIANTS.items():
+                    resized = image.copy()
+                    resized.thumbnail((size, size))
+                    for extension, image_format in (
+                        IMAGE_VARIANT_FORMATS.items()
+                    ):
+                        self.save_variant(
+                            names[variant][extension],
+                            encode_image(resized, image_format)
+                        )
+                placeholder = image.copy()
+                placeholder.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+                self.save_variant(
+                    names[PLACEHOLDER_VARIANT],
+                    encode_image(placeholder, 'JPEG')
+                )
+        except (OSError, Image.DecompressionBombError):
+            return False
+        return True
+
+    def save_variant(self, name, content):
+        """Сохраняем вариант под заранее известным именем."""
+        if self.exists(name):
+            super().delete(name)
+        self._save(name, ContentFile(content))
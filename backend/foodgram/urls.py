@@ -19,11 +19,13 @@ from django.conf import settings
 from django.conf.urls.static import static
 
 from api.views import ShortLinkView
+from foodgram.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('api.urls')),
     path('s/<str:hash_result>/', ShortLinkView.as_view(), name='short-link'),
+    path('metrics', metrics_view, name='metrics'),
 
 ]
 
@@ -1,5 +1,8 @@
 from django.contrib import admin
 
+from api.constants import PANTRY_VERSION
+from api.versions import bump_versions
+
 from recipes.models import (
     Tag,
     Ingredient,
@@ -7,6 +10,7 @@ from recipes.models import (
     RecipeIngredient,
     Favorite,
     ShoppingCart,
+    PendingSimilarity,
 )
 
 
@@ -36,16 +40,21 @@ class IngredientAdmin(admin.ModelAdmin):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     """Класс для представления модели Recipe в админ-зоне."""
-    list_display = ('name', 'author', 'favorite_count')
+    list_display = ('name', 'author', 'favorites_count', 'short_link_clicks')
     search_fields = ('name', 'author__username',)
     list_filter = ('tags',)
     filter_horizontal = ('tags', 'ingredients')
     inlines = [RecipeIngredientInline]
 
-    @admin.display(description='В избранном')
-    def favorite_count(self, obj):
-        """Подсчитываем количество добавлений рецепта в избранное."""
-        return Favorite.objects.filter(recipe=obj).count()
+    def save_related(self, request, form, formsets, change):
+        """
+        Рецепт с изменёнными ингредиентами отмечаем для пересчёта похожих
+        и подбора по продуктам.
+        """
+        super().save_related(request, form, formsets, change)
+        if any(formset.has_changed() for formset in formsets):
+            PendingSimilarity.objects.mark([form.instance.pk])
+            bump_versions(PANTRY_VERSION)
 
 
 @admin.register(Favorite)
@@ -1,3 +1,5 @@
+from datetime import datetime, timezone
+
 TAG_MAX_LENGTH = 32
 INGREDIENT_MAX_LENGTH = 128
 UNIT_LENGTH = 64
@@ -7,3 +9,25 @@ SLUG_REGEX = r'^[-a-zA-Z0-9_]+$'
 SLUG_ERROR_MESSAGE = (
     'Слаг может содержать только буквы, цифры, дефисы и подчеркивания.'
 )
+TAG_MASK_BITS = 63
+TAG_LIMIT_ERROR_MESSAGE = 'Можно создать не более 63 тегов.'
+SEARCH_CONFIG = 'russian'
+SEARCH_FTS_TABLE = 'recipes_recipe_fts'
+SEARCH_NAME_WEIGHT = 10.0
+SEARCH_TEXT_WEIGHT = 1.0
+IMPORT_BATCH_SIZE = 1000
+SEED_BATCH_SIZE = 10000
+FEED_FANOUT_LIMIT = 1000
+FEED_BATCH_SIZE = 1000
+SIMILAR_TOP_K = 10
+SIMILAR_TAG_WEIGHT = 0.3
+SIMILAR_MAX_FEATURE_SHARE = 0.2
+SIMILAR_BLOCK_SIZE = 1000
+PENDING_SIMILARITY_BATCH_SIZE = 1000
+TRENDING_HALF_LIFE = 3 * 24 * 60 * 60
+TRENDING_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+TRENDING_BATCH_SIZE = 1000
+RECIPE_COUNTER_FIELDS = (
+    'search_vector', 'favorites_count', 'shopping_carts_count',
+    'short_link_clicks', 'tags_mask', 'popularity', 'trending'
+)
@@ -0,0 +1,136 @@
+"""Общие функции пакетной загрузки для команд управления."""
+import csv
+import io
+from itertools import islice
+
+from django.db import connection
+
+COPY_NULL = r'\N'
+
+
+def batched(iterable, size):
+    """Разбиваем итератор на списки по size элементов."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def copy_rows(cursor, table, columns, rows):
+    """Загружаем строки в таблицу PostgreSQL через COPY ... FROM STDIN."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([COPY_NULL if value is None else value
+                         for value in row])
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN '
+        f"WITH (FORMAT csv, NULL '{COPY_NULL}')",
+        buffer
+    )
+
+
+def model_columns(model, values):
+    """
+    Столбцы таблицы и значения по умолчанию для полей, которых нет
+    в values.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field.attname in values or not field.primary_key
+    ]
+    columns = [field.column for field in fields]
+    defaults = [
+        field.get_db_prep_save(field.get_default(), connection)
+        for field in fields
+    ]
+    return fields, columns, defaults
+
+
+def restore_auto_now(model, objects, batch, batch_size):
+    """
+    bulk_create подставляет текущее время в поля auto_now и
+    auto_now_add; возвращаем переданные значения, если известны id.
+    """
+    fields = [
+        field for field in model._meta.concrete_fields
+        if field.attname in batch[0]
+        and (getattr(field, 'auto_now', False)
+             or getattr(field, 'auto_now_add', False))
+    ]
+    if not fields or model._meta.pk.attname not in batch[0]:
+        return
+    for obj, values in zip(objects, batch):
+        for field in fields:
+            setattr(obj, field.attname, values[field.attname])
+    model.objects.bulk_update(
+        objects, [field.name for field in fields], batch_size=batch_size
+    )
+
+
+def bulk_load(model, rows, batch_size, ignore_conflicts=False,
+              progress=None):
+    """
+    Загружаем словари значений полей в таблицу модели.
+
+    На PostgreSQL строки идут через COPY, при ignore_conflicts - через
+    временную таблицу и INSERT ... ON CONFLICT DO NOTHING. На других
+    СУБД используется bulk_create. Сигналы не отправляются.
+    Возвращаем количество добавленных строк.
+    """
+    table = model._meta.db_table
+    inserted = 0
+    processed = 0
+    fields = None
+    with connection.cursor() as cursor:
+        for batch in batched(rows, batch_size):
+            if connection.vendor != 'postgresql':
+                before = model.objects.count() if ignore_conflicts else 0
+                objects = [model(**values) for values in batch]
+                model.objects.bulk_create(
+                    objects,
+                    batch_size=batch_size,
+                    ignore_conflicts=ignore_conflicts
+                )
+                restore_auto_now(model, objects, batch, batch_size)
+                inserted += (
+                    model.objects.count() - before if ignore_conflicts
+                    else len(batch)
+                )
+            else:
+                if fields is None:
+                    fields, columns, defaults = model_columns(model, batch[0])
+                target = f'{table}_load' if ignore_conflicts else table
+                if ignore_conflicts and processed == 0:
+                    cursor.execute(
+                        f'CREATE TEMPORARY TABLE {target} '
+                        f'(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP'
+                    )
+                    if model._meta.pk.column not in columns:
+                        cursor.execute(
+                            f'ALTER TABLE {target} '
+                            f'DROP COLUMN {model._meta.pk.column}'
+                        )
+                copy_rows(cursor, target, columns, (
+                    [
+                        field.get_db_prep_save(values[field.attname],
+                                               connection)
+                        if field.attname in values else default
+                        for field, default in zip(fields, defaults)
+                    ]
+                    for values in batch
+                ))
+                if ignore_conflicts:
+                    cursor.execute(
+                        f'INSERT INTO {table} ({", ".join(columns)}) '
+                        f'SELECT {", ".join(columns)} FROM {target} '
+                        'ON CONFLICT DO NOTHING'
+                    )
+                    inserted += cursor.rowcount
+                    cursor.execute(f'TRUNCATE {target}')
+                else:
+                    inserted += len(batch)
+            processed += len(batch)
+            if progress:
+                progress(processed)
+    return inserted
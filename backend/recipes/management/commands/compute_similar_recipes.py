@@ -0,0 +1,147 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from api.constants import SIMILAR_VERSION
+from api.versions import bump_versions
+from recipes.constants import (SEED_BATCH_SIZE, SIMILAR_BLOCK_SIZE,
+                               SIMILAR_TOP_K)
+from recipes.management.commands._bulk import bulk_load
+from recipes.models import PendingSimilarity, Recipe, SimilarRecipe
+from recipes.similarity import RecipeVectors
+
+
+class Command(BaseCommand):
+    """Команда для расчёта похожих рецептов."""
+
+    help = (
+        'Вычисляет похожие рецепты по ингредиентам и тегам. С --incremental '
+        'пересчитывает только рецепты, изменённые после прошлого запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Пересчитать только изменённые рецепты',
+        )
+        parser.add_argument(
+            '--top-k',
+            type=int,
+            default=SIMILAR_TOP_K,
+            help='Сколько похожих рецептов хранить для каждого',
+        )
+        parser.add_argument(
+            '--block-size',
+            type=int,
+            default=SIMILAR_BLOCK_SIZE,
+            help='Сколько рецептов обрабатывать за одно умножение матриц',
+        )
+
+    def rows(self, neighbours):
+        for recipe_id, similar_id, score in neighbours:
+            yield {
+                'recipe_id': recipe_id,
+                'similar_id': similar_id,
+                'score': score,
+            }
+
+    def compute_all(self, vectors, top_k, block_size):
+        """Полный пересчёт: все списки заменяются новыми."""
+        SimilarRecipe.objects.all().delete()
+        return bulk_load(
+            SimilarRecipe,
+            self.rows(vectors.neighbours(top_k=top_k, block_size=block_size)),
+            SEED_BATCH_SIZE
+        )
+
+    def compute_pending(self, vectors, recipe_ids, top_k, block_size):
+        """
+        Пересчёт изменённых рецептов.
+
+        Списки изменённых рецептов строятся заново, сами они убираются из
+        чужих списков и добавляются в списки своих новых соседей, если
+        проходят в их top_k. Остальные списки обновятся при полном
+        пересчёте.
+        """
+        SimilarRecipe.objects.filter(
+            Q(recipe__in=recipe_ids) | Q(similar__in=recipe_ids)
+        ).delete()
+        neighbours = list(vectors.neighbours(
+            vectors.rows(recipe_ids), top_k, block_size
+        ))
+        lists = {}
+        for recipe_id, similar_id, score in SimilarRecipe.objects.filter(
+            recipe__in={similar_id for _, similar_id, _ in neighbours}
+        ).values_list('recipe_id', 'similar_id', 'score'):
+            lists.setdefault(recipe_id, []).append((score, similar_id))
+        stored = {
+            recipe_id: {similar_id for _, similar_id in entries}
+            for recipe_id, entries in lists.items()
+        }
+        for recipe_id, similar_id, score in neighbours:
+            if similar_id in recipe_ids:
+                continue
+            entries = lists.setdefault(similar_id, [])
+            entries.append((score, recipe_id))
+            if len(entries) > top_k:
+                entries.remove(min(entries))
+        removed = [
+            Q(recipe_id=recipe_id, similar_id=similar_id)
+            for recipe_id, entries in lists.items()
+            for similar_id in stored.get(recipe_id, set()) - {
+                kept for _, kept in entries
+            }
+        ]
+        added = [
+            (recipe_id, similar_id, score)
+            for recipe_id, entries in lists.items()
+            for score, similar_id in entries
+            if similar_id in recipe_ids
+        ]
+        if removed:
+            SimilarRecipe.objects.filter(reduce(or_, removed)).delete()
+        SimilarRecipe.objects.bulk_create(
+            [
+                SimilarRecipe(
+                    recipe_id=recipe_id, similar_id=similar_id, score=score
+                )
+                for recipe_id, similar_id, score in neighbours + added
+            ],
+            batch_size=SEED_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+        return len(neighbours) + len(added)
+
+    def handle(self, *args, **options):
+        # Отметки забираются до загрузки векторов: правки, сделанные
+        # после этого, отметят рецепты заново.
+        recipe_ids = PendingSimilarity.objects.claim()
+        if options['incremental'] and not recipe_ids:
+            self.stdout.write('Изменённых рецептов нет.')
+            return
+        try:
+            vectors = RecipeVectors.load()
+            with transaction.atomic():
+                if options['incremental']:
+                    written = self.compute_pending(
+                        vectors, recipe_ids, options['top_k'],
+                        options['block_size']
+                    )
+                else:
+                    written = self.compute_all(
+                        vectors, options['top_k'], options['block_size']
+                    )
+                bump_versions(SIMILAR_VERSION)
+        except BaseException:
+            # Возвращаем отметки рецептов, которые ещё не удалены.
+            PendingSimilarity.objects.mark(Recipe.objects.filter(
+                pk__in=recipe_ids
+            ).values_list('pk', flat=True))
+            raise
+        self.stdout.write(self.style.SUCCESS(
+            f'Похожие рецепты рассчитаны, записей: {written}'
+        ))
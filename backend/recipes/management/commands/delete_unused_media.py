@@ -0,0 +1,50 @@
+import posixpath
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from foodgram.storage import flat_variant_names
+
+
+def walk(storage, directory=''):
+    """Имена всех файлов хранилища в каталоге и подкаталогах."""
+    directories, files = storage.listdir(directory)
+    for name in files:
+        yield posixpath.join(directory, name)
+    for subdirectory in directories:
+        yield from walk(storage, posixpath.join(directory, subdirectory))
+
+
+class Command(BaseCommand):
+    """Команда для удаления файлов, на которые не ссылается ни одна строка."""
+
+    help = 'Удаляет неиспользуемые изображения и их уменьшенные копии'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество неиспользуемых файлов',
+        )
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        referenced = storage.referenced_names()
+        variants = {
+            name
+            for original in referenced
+            for name in flat_variant_names(original)
+        }
+        unused = [
+            name for name in walk(storage)
+            if name not in referenced and name not in variants
+            and not storage.is_recent(name)
+        ]
+        if not options['dry_run']:
+            # Варианты неиспользуемых файлов сами входят в unused.
+            for name in unused:
+                storage.delete_file(name)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Неиспользуемых файлов: {len(unused)}'
+        ))
@@ -0,0 +1,57 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+def create_variants(args):
+    """Создаём варианты одного изображения в отдельном процессе."""
+    name, force = args
+    return name, default_storage.create_variants(name, force=force)
+
+
+class Command(BaseCommand):
+    """Команда для создания уменьшенных копий загруженных изображений."""
+
+    help = 'Создаёт уменьшенные копии изображений рецептов и аватаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=os.cpu_count(),
+            help='Количество процессов',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Пересоздать уже существующие копии',
+        )
+
+    def handle(self, *args, **options):
+        names = set(
+            Recipe.objects.exclude(image='').values_list('image', flat=True)
+        ) | set(
+            User.objects.exclude(avatar__isnull=True).exclude(
+                avatar=''
+            ).values_list('avatar', flat=True)
+        )
+        tasks = [(name, options['force']) for name in sorted(names)]
+        failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            for name, created in executor.map(
+                create_variants, tasks, chunksize=16
+            ):
+                if not created:
+                    failed += 1
+                    self.stderr.write(f'Не удалось обработать {name}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Обработано изображений: {len(tasks) - failed} из {len(tasks)}'
+        ))
@@ -1,23 +1,205 @@
 import csv
+import itertools
+import json
 from pathlib import Path
 
-from django.core.management.base import BaseCommand
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
 
-from recipes.models import Ingredient
+from api.constants import INGREDIENTS_VERSION, RECIPES_VERSION, TAGS_VERSION
+from api.versions import bump_versions
+from recipes.constants import IMPORT_BATCH_SIZE
+from recipes.management.commands._bulk import batched, copy_rows
+from recipes.models import Ingredient, Tag
+
+DEFAULT_PATH = Path('/app/data') / 'ingredients.csv'
+
+# Модель, загружаемые поля, поле для ON CONFLICT, обновляемые поля и версии
+CATALOGS = {
+    'ingredients': (
+        Ingredient, ('name', 'measurement_unit'), 'name',
+        ('measurement_unit',), (INGREDIENTS_VERSION, RECIPES_VERSION),
+    ),
+    'tags': (
+        Tag, ('name', 'slug'), None, (), (TAGS_VERSION, RECIPES_VERSION),
+    ),
+}
 
 
 class Command(BaseCommand):
-    """Команда для импорта ингредиентов в БД."""
+    """Команда для импорта ингредиентов и тегов в БД."""
+
+    help = (
+        'Загружает ингредиенты или теги из CSV, JSON или JSON Lines. '
+        'Повторный запуск не создаёт дубликатов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default=DEFAULT_PATH,
+            type=Path,
+            help='Путь к файлу (по умолчанию /app/data/ingredients.csv)',
+        )
+        parser.add_argument(
+            '--model',
+            choices=CATALOGS,
+            default='ingredients',
+            help='Что загружать: ingredients или tags',
+        )
+        parser.add_argument(
+            '--format',
+            choices=('csv', 'json'),
+            help='Формат файла (по умолчанию по расширению)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=IMPORT_BATCH_SIZE,
+            help='Размер пакета для вставки',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Проверить файл и откатить изменения',
+        )
+
+    def read_rows(self, file, file_format, fields):
+        """Построчно читаем записи из файла."""
+        if file_format == 'csv':
+            for row in csv.reader(file):
+                if row:
+                    yield row
+            return
+        first = file.read(1)
+        while first and first.isspace():
+            first = file.read(1)
+        if first == '[':
+            # Обычный JSON читается целиком: справочники небольшие.
+            items = json.loads(first + file.read())
+        else:
+            items = (
+                json.loads(line)
+                for line in itertools.chain([first + file.readline()], file)
+                if line.strip()
+            )
+        for item in items:
+            yield [item.get(field) for field in fields]
 
-    help = 'Загружает ингредиенты в базу данных'
+    def clean_rows(self, model, fields, rows):
+        """Проверяем записи по правилам модели и отбрасываем ошибочные."""
+        for line, row in enumerate(rows, start=1):
+            if len(row) != len(fields):
+                self.stderr.write(f'Строка {line}: неверное число полей')
+                continue
+            missing = [
+                field for field, value in zip(fields, row) if value is None
+            ]
+            if missing:
+                self.stderr.write(
+                    f'Строка {line}: не заполнены поля {", ".join(missing)}'
+                )
+                continue
+            values = dict(zip(fields, (str(value).strip() for value in row)))
+            try:
+                model(**values).clean_fields()
+            except ValidationError as error:
+                self.stderr.write(f'Строка {line}: {error.messages}')
+                continue
+            yield values
+
+    def insert_postgresql(self, model, fields, conflict_field,
+                          update_fields, batches):
+        """COPY во временную таблицу и INSERT ... ON CONFLICT."""
+        table = model._meta.db_table
+        columns = ', '.join(fields)
+        staging = f'{table}_import'
+        if conflict_field:
+            conflict = (
+                f'ON CONFLICT ({conflict_field}) DO UPDATE SET '
+                + ', '.join(f'{field} = EXCLUDED.{field}'
+                            for field in update_fields)
+                + ' WHERE ' + ' OR '.join(
+                    f'{table}.{field} IS DISTINCT FROM EXCLUDED.{field}'
+                    for field in update_fields
+                )
+            )
+            distinct = f'DISTINCT ON ({conflict_field})'
+        else:
+            conflict = 'ON CONFLICT DO NOTHING'
+            distinct = 'DISTINCT'
+        processed = 0
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {staging} '
+                f'(LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP'
+            )
+            cursor.execute(
+                f'ALTER TABLE {staging} DROP COLUMN {model._meta.pk.column}'
+            )
+            for batch in batches:
+                copy_rows(cursor, staging, fields, (
+                    [values[field] for field in fields] for values in batch
+                ))
+                processed += len(batch)
+                self.stdout.write(f'Прочитано строк: {processed}')
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) '
+                f'SELECT {distinct} {columns} FROM {staging} {conflict}'
+            )
+            return processed, cursor.rowcount
+
+    def insert_generic(self, model, fields, batches):
+        """Пакетный bulk_create с пропуском существующих записей."""
+        processed = 0
+        before = model.objects.count()
+        for batch in batches:
+            model.objects.bulk_create(
+                [model(**values) for values in batch],
+                batch_size=len(batch),
+                ignore_conflicts=True
+            )
+            processed += len(batch)
+            self.stdout.write(f'Обработано строк: {processed}')
+        return processed, model.objects.count() - before
 
     def handle(self, *args, **options):
-        file_path = Path('/app/data') / 'ingredients.csv'
-        with open(file_path, encoding='utf-8') as file:
-            reader = csv.reader(file)
-            for name, unit in reader:
-                Ingredient.objects.get_or_create(
-                    name=name,
-                    measurement_unit=unit)
-
-        self.stdout.write(self.style.SUCCESS('Данные загружены успешно!'))
+        path = options['path']
+        if not path.exists():
+            raise CommandError(f'Файл {path} не найден')
+        file_format = options['format'] or (
+            'json' if path.suffix in ('.json', '.jsonl') else 'csv'
+        )
+        model, fields, conflict_field, update_fields, versions = (
+            CATALOGS[options['model']]
+        )
+
+        with open(path, encoding='utf-8') as file, transaction.atomic():
+            rows = self.read_rows(file, file_format, fields)
+            batches = batched(
+                self.clean_rows(model, fields, rows), options['batch_size']
+            )
+            if connection.vendor == 'postgresql':
+                processed, changed = self.insert_postgresql(
+                    model, fields, conflict_field, update_fields, batches
+                )
+            else:
+                processed, changed = self.insert_generic(
+                    model, fields, batches
+                )
+            if model is Tag:
+                # bulk_create не отправляет pre_save, биты выдаём здесь.
+                Tag.objects.assign_bits()
+            if options['dry_run']:
+                transaction.set_rollback(True)
+            elif changed:
+                bump_versions(*versions)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Данные загружены успешно! корректных строк: {processed}, '
+            f'добавлено или обновлено: {changed}'
+            + (' (пробный запуск, изменения отменены)'
+               if options['dry_run'] else '')
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.models import FeedEntry
+
+
+class Command(BaseCommand):
+    """Команда для перестроения лент подписок."""
+
+    help = (
+        'Перестраивает ленты подписок всех пользователей, например после '
+        'пакетной загрузки подписок или рецептов в обход сигналов'
+    )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            FeedEntry.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты перестроены, записей: {FeedEntry.objects.count()}'
+        ))
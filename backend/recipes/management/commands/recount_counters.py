@@ -0,0 +1,83 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from api.constants import RECIPE_COUNTERS_VERSION, USER_COUNTERS_VERSION
+from api.versions import bump_versions
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription
+
+User = get_user_model()
+
+COUNTERS = [
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Subscription, 'author'),
+    (User, 'following_count', Subscription, 'user'),
+]
+
+
+def count_subquery(related_model, lookup):
+    """Подзапрос с количеством связанных объектов."""
+    return Coalesce(
+        Subquery(
+            related_model.objects.filter(**{lookup: OuterRef('pk')})
+            .order_by().values(lookup)
+            .annotate(total=Count('pk')).values('total')
+        ),
+        0
+    )
+
+
+class Command(BaseCommand):
+    """Команда для пересчёта денормализованных счётчиков."""
+
+    help = 'Пересчитывает счётчики рецептов, избранного и подписок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать количество расхождений',
+        )
+
+    def handle(self, *args, **options):
+        changed = 0
+        with transaction.atomic():
+            for model, field, related_model, lookup in COUNTERS:
+                actual = count_subquery(related_model, lookup)
+                drifted = model.objects.filter(~Q(**{field: actual}))
+                if options['dry_run']:
+                    fixed = drifted.count()
+                else:
+                    fixed = drifted.update(**{field: actual})
+                changed += fixed
+                self.stdout.write(
+                    f'{model._meta.model_name}.{field}: {fixed}'
+                )
+            popularity = F('favorites_count') + F('shopping_carts_count')
+            # trending пересчитывается до popularity: после исправления
+            # расхождение уже не найти.
+            for field, drifted, fix in (
+                ('trending', Recipe.objects.filter(
+                    ~Q(popularity=popularity)
+                    | Q(popularity__gt=0, trending=0)
+                    | (Q(popularity=0) & ~Q(trending=0))
+                ), lambda drifted: drifted.fill_trending()),
+                ('popularity', Recipe.objects.filter(
+                    ~Q(popularity=popularity)
+                ), lambda drifted: drifted.update(popularity=popularity)),
+            ):
+                if options['dry_run']:
+                    fixed = drifted.count()
+                else:
+                    fixed = fix(drifted)
+                changed += fixed
+                self.stdout.write(f'recipe.{field}: {fixed}')
+            if changed and not options['dry_run']:
+                bump_versions(RECIPE_COUNTERS_VERSION, USER_COUNTERS_VERSION)
+
+        self.stdout.write(self.style.SUCCESS('Счётчики проверены!'))
@@ -0,0 +1,280 @@
+import math
+import random
+from datetime import datetime, timedelta, timezone
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+
+from api.constants import (INGREDIENTS_VERSION, RECIPE_COUNTERS_VERSION,
+                           RECIPES_VERSION, TAGS_VERSION,
+                           USER_COUNTERS_VERSION, USERS_VERSION)
+from api.versions import bump_versions
+from recipes.constants import SEARCH_FTS_TABLE, SEED_BATCH_SIZE
+from recipes.management.commands._bulk import bulk_load
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+SEED_EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+SEED_PERIOD = int(timedelta(days=365).total_seconds())
+PERMUTATION_STEP = 2654435761
+DEFAULT_TAGS = (
+    ('Завтрак', 'breakfast'),
+    ('Обед', 'lunch'),
+    ('Ужин', 'dinner'),
+    ('Выпечка', 'bakery'),
+    ('Десерт', 'dessert'),
+    ('Суп', 'soup'),
+    ('Салат', 'salad'),
+    ('Постное', 'lenten'),
+)
+FIRST_NAMES = (
+    'Анна', 'Иван', 'Мария', 'Пётр', 'Ольга', 'Алексей', 'Елена', 'Дмитрий',
+)
+LAST_NAMES = (
+    'Иванова', 'Петров', 'Смирнова', 'Кузнецов', 'Попова', 'Соколов',
+)
+WORDS = (
+    'нарезать', 'обжарить', 'добавить', 'перемешать', 'варить', 'запекать',
+    'минут', 'до', 'готовности', 'на', 'среднем', 'огне', 'соль', 'перец',
+    'масло', 'лук', 'чеснок', 'сковороду', 'духовку', 'подавать', 'горячим',
+    'с', 'зеленью', 'тесто', 'начинку', 'крышкой', 'остудить', 'мелко',
+)
+DISHES = (
+    'Суп', 'Пирог', 'Салат', 'Рагу', 'Каша', 'Запеканка', 'Омлет', 'Паста',
+)
+
+
+class SkewedChoice:
+    """
+    Выбор id с распределением по степенному закону.
+
+    Ранг берётся как int(n * u ** skew) для равномерного u, поэтому
+    небольшая доля объектов получает большую часть выборок. Ранги
+    переставляются умножением по модулю n, чтобы популярными оказывались
+    не только объекты с наименьшими id.
+    """
+
+    def __init__(self, ids, skew, rng):
+        self.ids = ids
+        self.size = len(ids)
+        self.skew = skew
+        self.rng = rng
+        step = PERMUTATION_STEP
+        while math.gcd(step, self.size) != 1:
+            step += 1
+        self.step = step
+
+    def __call__(self):
+        rank = int(self.size * self.rng.random() ** self.skew)
+        return self.ids[rank * self.step % self.size]
+
+
+class Command(BaseCommand):
+    """Команда для наполнения БД синтетическими данными."""
+
+    help = (
+        'Создаёт пользователей, рецепты, избранное, списки покупок и '
+        'подписки с неравномерным распределением для нагрузочных проверок. '
+        'Например: --users 1000000 --recipes 5000000 --favorites 50000000. '
+        'Результат зависит только от --seed и объёмов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=20000)
+        parser.add_argument('--subscriptions', type=int, default=20000)
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=3.0,
+            help='Степень неравномерности: 1 - равномерно, больше - сильнее',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--batch-size', type=int, default=SEED_BATCH_SIZE
+        )
+        parser.add_argument(
+            '--password',
+            default='load-test-password',
+            help='Пароль всех создаваемых пользователей',
+        )
+        parser.add_argument(
+            '--image',
+            default='',
+            help='Путь к изображению рецептов в хранилище',
+        )
+
+    def random(self, name):
+        """Отдельный генератор для каждой таблицы."""
+        return random.Random(f'{self.seed}:{name}')
+
+    def timestamp(self, rng):
+        return SEED_EPOCH + timedelta(seconds=rng.randrange(SEED_PERIOD))
+
+    def load(self, label, model, rows, ignore_conflicts=False):
+        """Загружаем строки в отдельной транзакции и печатаем прогресс."""
+        def progress(processed):
+            self.stdout.write(f'{label}: обработано {processed}')
+
+        with transaction.atomic():
+            inserted = bulk_load(
+                model, rows, self.batch_size, ignore_conflicts, progress
+            )
+        self.stdout.write(self.style.SUCCESS(f'{label}: добавлено {inserted}'))
+        return inserted
+
+    def get_tag_ids(self):
+        if not Tag.objects.exists():
+            Tag.objects.bulk_create(
+                [Tag(name=name, slug=slug) for name, slug in DEFAULT_TAGS]
+            )
+            Tag.objects.assign_bits()
+        return list(Tag.objects.order_by('id').values_list('id', flat=True))
+
+    def users(self, ids):
+        rng = self.random('users')
+        password = make_password(self.password)
+        for pk in ids:
+            yield {
+                'id': pk,
+                'username': f'load_{pk}',
+                'email': f'load_{pk}@example.com',
+                'first_name': rng.choice(FIRST_NAMES),
+                'last_name': rng.choice(LAST_NAMES),
+                'password': password,
+                'date_joined': self.timestamp(rng),
+            }
+
+    def recipes(self, ids, user_ids):
+        rng = self.random('recipes')
+        authors = SkewedChoice(user_ids, self.skew, rng)
+        for pk in ids:
+            yield {
+                'id': pk,
+                'author_id': authors(),
+                'name': f'{rng.choice(DISHES)} №{pk}',
+                'text': ' '.join(rng.choices(WORDS, k=rng.randint(20, 80))),
+                'image': self.image,
+                'cooking_time': rng.randint(5, 180),
+                'pub_date': self.timestamp(rng),
+            }
+
+    def distinct_picks(self, choice, count):
+        picks = set()
+        for _ in range(count * 4):
+            picks.add(choice())
+            if len(picks) == count:
+                break
+        return picks
+
+    def recipe_tags(self, ids, tag_ids):
+        rng = self.random('recipe_tags')
+        tags = SkewedChoice(tag_ids, self.skew, rng)
+        for recipe_id in ids:
+            count = min(rng.randint(1, 3), len(tag_ids))
+            for tag_id in self.distinct_picks(tags, count):
+                yield {'recipe_id': recipe_id, 'tag_id': tag_id}
+
+    def recipe_ingredients(self, ids, ingredient_ids):
+        rng = self.random('recipe_ingredients')
+        ingredients = SkewedChoice(ingredient_ids, self.skew, rng)
+        for recipe_id in ids:
+            count = min(rng.randint(3, 12), len(ingredient_ids))
+            for ingredient_id in self.distinct_picks(ingredients, count):
+                yield {
+                    'recipe_id': recipe_id,
+                    'ingredient_id': ingredient_id,
+                    'amount': rng.randint(1, 500),
+                }
+
+    def user_recipes(self, name, count, user_ids, recipe_ids):
+        rng = self.random(name)
+        users = SkewedChoice(user_ids, self.skew, rng)
+        recipes = SkewedChoice(recipe_ids, self.skew, rng)
+        for _ in range(count):
+            yield {'user_id': users(), 'recipe_id': recipes()}
+
+    def subscriptions(self, count, user_ids):
+        rng = self.random('subscriptions')
+        users = SkewedChoice(user_ids, self.skew, rng)
+        authors = SkewedChoice(user_ids, self.skew, rng)
+        for _ in range(count):
+            user_id, author_id = users(), authors()
+            if user_id != author_id:
+                yield {'user_id': user_id, 'author_id': author_id}
+
+    def handle(self, *args, **options):
+        self.seed = options['seed']
+        self.skew = options['skew']
+        self.batch_size = options['batch_size']
+        self.password = options['password']
+        self.image = options['image']
+        if options['users'] < 1 or options['recipes'] < 1:
+            raise CommandError('Нужен хотя бы один пользователь и рецепт.')
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(
+                'Ингредиентов нет, сначала выполните import_data.'
+            )
+        tag_ids = self.get_tag_ids()
+
+        first_user = (User.objects.aggregate(Max('id'))['id__max'] or 0) + 1
+        user_ids = range(first_user, first_user + options['users'])
+        first_recipe = (
+            Recipe.objects.aggregate(Max('id'))['id__max'] or 0
+        ) + 1
+        recipe_ids = range(first_recipe, first_recipe + options['recipes'])
+
+        self.load('Пользователи', User, self.users(user_ids))
+        self.load('Рецепты', Recipe, self.recipes(recipe_ids, user_ids))
+        self.load(
+            'Теги рецептов', Recipe.tags.through,
+            self.recipe_tags(recipe_ids, tag_ids)
+        )
+        self.load(
+            'Ингредиенты рецептов', RecipeIngredient,
+            self.recipe_ingredients(recipe_ids, ingredient_ids)
+        )
+        self.load('Избранное', Favorite, self.user_recipes(
+            'favorites', options['favorites'], user_ids, recipe_ids
+        ), ignore_conflicts=True)
+        self.load('Списки покупок', ShoppingCart, self.user_recipes(
+            'carts', options['carts'], user_ids, recipe_ids
+        ), ignore_conflicts=True)
+        self.load('Подписки', Subscription, self.subscriptions(
+            options['subscriptions'], user_ids
+        ), ignore_conflicts=True)
+
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [User, Recipe]
+            ):
+                cursor.execute(sql)
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    f'INSERT INTO {SEARCH_FTS_TABLE} (rowid, name, text) '
+                    'SELECT id, name, text FROM recipes_recipe '
+                    'WHERE id >= %s',
+                    [first_recipe]
+                )
+        Recipe.objects.filter(pk__gte=first_recipe).update_tags_mask()
+        call_command('recount_counters', stdout=self.stdout)
+        call_command('rebuild_feeds', stdout=self.stdout)
+        call_command('compute_similar_recipes', stdout=self.stdout)
+        bump_versions(
+            TAGS_VERSION, INGREDIENTS_VERSION, RECIPES_VERSION, USERS_VERSION,
+            RECIPE_COUNTERS_VERSION, USER_COUNTERS_VERSION
+        )
+        self.stdout.write(self.style.SUCCESS('Данные созданы.'))
@@ -0,0 +1,76 @@
+# Generated by Django 3.2 on 2026-10-18 05:05
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+POSTGRESQL_FORWARD = """
+CREATE FUNCTION recipes_recipe_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.name, '')), 'A')
+        || setweight(to_tsvector('russian', coalesce(NEW.text, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER recipes_recipe_search_vector_trigger
+BEFORE INSERT OR UPDATE OF name, text ON recipes_recipe
+FOR EACH ROW EXECUTE FUNCTION recipes_recipe_search_vector_update();
+
+UPDATE recipes_recipe SET name = name;
+
+CREATE INDEX recipes_recipe_search_vector_idx
+ON recipes_recipe USING gin (search_vector);
+"""
+
+POSTGRESQL_BACKWARD = """
+DROP INDEX IF EXISTS recipes_recipe_search_vector_idx;
+DROP TRIGGER IF EXISTS recipes_recipe_search_vector_trigger ON recipes_recipe;
+DROP FUNCTION IF EXISTS recipes_recipe_search_vector_update();
+"""
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE recipes_recipe_fts USING fts5(
+        name, text, tokenize = 'unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    INSERT INTO recipes_recipe_fts (rowid, name, text)
+    SELECT id, name, text FROM recipes_recipe
+    """,
+]
+
+SQLITE_BACKWARD = [
+    'DROP TABLE IF EXISTS recipes_recipe_fts',
+]
+
+
+def run_vendor_sql(postgresql_sql, sqlite_sql):
+    def run(apps, schema_editor):
+        vendor = schema_editor.connection.vendor
+        if vendor == 'postgresql':
+            schema_editor.execute(postgresql_sql)
+        elif vendor == 'sqlite':
+            for statement in sqlite_sql:
+                schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_auto_20250409_1441'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True, verbose_name='Поисковый вектор'),
+        ),
+        migrations.RunPython(
+            run_vendor_sql(POSTGRESQL_FORWARD, SQLITE_FORWARD),
+            run_vendor_sql(POSTGRESQL_BACKWARD, SQLITE_BACKWARD),
+        ),
+    ]
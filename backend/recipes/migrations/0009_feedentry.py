@@ -0,0 +1,68 @@
+# Generated by Django 3.2 on 2026-10-18 05:33
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Порог подписчиков на момент миграции (FEED_FANOUT_LIMIT).
+FEED_FANOUT_LIMIT = 1000
+
+
+def fill_feeds(apps, schema_editor):
+    """Заполняем ленты по существующим подпискам."""
+    FeedEntry = apps.get_model('recipes', 'FeedEntry')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Subscription = apps.get_model('users', 'Subscription')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    schema_editor.execute(
+        f'INSERT INTO {FeedEntry._meta.db_table} '
+        '(user_id, recipe_id, author_id, pub_date) '
+        'SELECT subscription.user_id, recipe.id, recipe.author_id, '
+        'recipe.pub_date '
+        f'FROM {Subscription._meta.db_table} subscription '
+        f'JOIN {User._meta.db_table} author '
+        'ON author.id = subscription.author_id '
+        f'JOIN {Recipe._meta.db_table} recipe '
+        'ON recipe.author_id = subscription.author_id '
+        'WHERE author.followers_count < %s',
+        (FEED_FANOUT_LIMIT,)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0008_recipe_short_link_clicks'),
+        ('users', '0011_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField(verbose_name='Дата публикации')),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL, verbose_name='Автор')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='recipes.recipe', verbose_name='Рецепт')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Запись ленты',
+                'verbose_name_plural': 'Ленты подписок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-recipe'], name='feed_entry_timeline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', 'author'], name='feed_entry_author_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'recipe'), name='feed_entry_unique'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2 on 2026-10-18 05:45
+
+from django.db import migrations, models
+from django.db.models import (ExpressionWrapper, F, OuterRef, Subquery,
+                              Sum, Value)
+from django.db.models.functions import Cast, Coalesce
+
+# Разрядность маски на момент миграции (TAG_MASK_BITS).
+TAG_MASK_BITS = 63
+
+
+def fill_tags_mask(apps, schema_editor):
+    """Выдаём биты существующим тегам и заполняем маски рецептов."""
+    Tag = apps.get_model('recipes', 'Tag')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    tags = list(Tag.objects.order_by('pk'))
+    if len(tags) > TAG_MASK_BITS:
+        raise RuntimeError(
+            f'Тегов больше {TAG_MASK_BITS}, маска их не вместит.'
+        )
+    for bit, tag in enumerate(tags):
+        tag.bit = bit
+    Tag.objects.bulk_update(tags, ['bit'])
+    Recipe.objects.update(tags_mask=Coalesce(
+        Subquery(
+            Recipe.tags.through.objects.filter(
+                recipe=OuterRef('pk')
+            ).values('recipe').annotate(mask=Sum(ExpressionWrapper(
+                Cast(Value(1), models.BigIntegerField())
+                .bitleftshift(F('tag__bit')),
+                output_field=models.BigIntegerField()
+            ))).values('mask'),
+            output_field=models.BigIntegerField()
+        ),
+        0
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_similar_recipes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='tags_mask',
+            field=models.BigIntegerField(default=0, editable=False, verbose_name='Маска тегов'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='bit',
+            field=models.PositiveSmallIntegerField(editable=False, null=True, unique=True, verbose_name='Бит в маске тегов рецепта'),
+        ),
+        migrations.RunPython(fill_tags_mask, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 3.2 on 2026-10-18 05:49
+
+import math
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+from django.db.models import F
+
+# Значения на момент миграции (TRENDING_HALF_LIFE, TRENDING_EPOCH).
+TRENDING_HALF_LIFE = 3 * 24 * 60 * 60
+TRENDING_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+BATCH_SIZE = 1000
+
+
+def fill_rankings(apps, schema_editor):
+    """
+    Заполняем popularity по счётчикам. Время прошлых действий не
+    хранилось, поэтому для trending они считаются совершёнными в день
+    публикации рецепта.
+    """
+    Recipe = apps.get_model('recipes', 'Recipe')
+    Recipe.objects.update(
+        popularity=F('favorites_count') + F('shopping_carts_count')
+    )
+    recipes = []
+    for recipe in Recipe.objects.filter(popularity__gt=0).only(
+        'pk', 'pub_date', 'popularity'
+    ).iterator(chunk_size=BATCH_SIZE):
+        recipe.trending = math.log(recipe.popularity) + (
+            math.log(2) * (recipe.pub_date - TRENDING_EPOCH).total_seconds()
+            / TRENDING_HALF_LIFE
+        )
+        recipes.append(recipe)
+        if len(recipes) == BATCH_SIZE:
+            Recipe.objects.bulk_update(recipes, ['trending'])
+            recipes = []
+    Recipe.objects.bulk_update(recipes, ['trending'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_tags_mask'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='popularity',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном и списках покупок'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='trending',
+            field=models.FloatField(default=0, editable=False, verbose_name='Оценка популярности за последнее время'),
+        ),
+        migrations.RunPython(fill_rankings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-popularity', '-pub_date', '-id'], name='recipe_popular_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-trending', '-pub_date', '-id'], name='recipe_trending_idx'),
+        ),
+    ]
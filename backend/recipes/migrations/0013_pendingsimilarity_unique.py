@@ -0,0 +1,29 @@
+# Generated by Django 3.2 on 2026-10-18 06:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Max
+
+
+def delete_duplicates(apps, schema_editor):
+    """Оставляем одну отметку на рецепт - последнюю."""
+    PendingSimilarity = apps.get_model('recipes', 'PendingSimilarity')
+    PendingSimilarity.objects.exclude(pk__in=PendingSimilarity.objects.values(
+        'recipe'
+    ).annotate(last=Max('pk')).values('last')).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_rankings'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicates, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='pendingsimilarity',
+            name='recipe',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='recipes.recipe', verbose_name='Рецепт'),
+        ),
+    ]
@@ -1,13 +1,67 @@
+import math
+import re
+
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import (Case, Exists, ExpressionWrapper, F, Max,
+                              OuterRef, Prefetch, Q, Subquery, Sum, Value,
+                              When, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import (Abs, Cast, Coalesce, Exp, Greatest,
+                                        Ln, RowNumber)
+from django.utils import timezone
 
 from .constants import (TAG_MAX_LENGTH, INGREDIENT_MAX_LENGTH,
                         UNIT_LENGTH, RECIPE_MAX_LENGTH, MIN_VALUE,
-                        SLUG_REGEX, SLUG_ERROR_MESSAGE)
+                        SLUG_REGEX, SLUG_ERROR_MESSAGE, SEARCH_CONFIG,
+                        SEARCH_FTS_TABLE, SEARCH_NAME_WEIGHT,
+                        SEARCH_TEXT_WEIGHT, FEED_FANOUT_LIMIT,
+                        FEED_BATCH_SIZE, TAG_LIMIT_ERROR_MESSAGE,
+                        TAG_MASK_BITS, TRENDING_EPOCH, TRENDING_HALF_LIFE,
+                        TRENDING_BATCH_SIZE, RECIPE_COUNTER_FIELDS,
+                        PENDING_SIMILARITY_BATCH_SIZE)
+from users.models import CounterFieldsMixin, Subscription
 
 User = get_user_model()
 
+SEARCH_WORD_REGEX = re.compile(r'\w+')
+
+
+def trending_weight(moment):
+    """
+    Логарифм веса действия в момент moment для оценки trending.
+
+    Вес растёт вдвое за каждые TRENDING_HALF_LIFE секунд после
+    TRENDING_EPOCH.
+    """
+    return (
+        math.log(2) * (moment - TRENDING_EPOCH).total_seconds()
+        / TRENDING_HALF_LIFE
+    )
+
+
+class TagQuerySet(models.QuerySet):
+    """Набор запросов для тегов."""
+
+    def free_bits(self):
+        """Номера битов маски, не занятые тегами."""
+        used = set(self.exclude(bit=None).values_list('bit', flat=True))
+        return [bit for bit in range(TAG_MASK_BITS) if bit not in used]
+
+    def assign_bits(self):
+        """Выдаём биты маски тегам без бита, например после bulk_create."""
+        tags = list(self.filter(bit=None).order_by('pk'))
+        free = self.model.objects.free_bits()
+        if len(tags) > len(free):
+            raise ValidationError(TAG_LIMIT_ERROR_MESSAGE)
+        for tag, bit in zip(tags, free):
+            tag.bit = bit
+        self.model.objects.bulk_update(tags, ['bit'])
+
 
 class Tag(models.Model):
     """Модель для тега."""
@@ -26,6 +80,14 @@ class Tag(models.Model):
         ],
         verbose_name='Slug'
     )
+    bit = models.PositiveSmallIntegerField(
+        unique=True,
+        null=True,
+        editable=False,
+        verbose_name='Бит в маске тегов рецепта'
+    )
+
+    objects = TagQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Тег'
@@ -35,6 +97,16 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    def clean(self):
+        """Число тегов ограничено разрядностью маски."""
+        if self.bit is None and not Tag.objects.free_bits():
+            raise ValidationError(TAG_LIMIT_ERROR_MESSAGE)
+
+    @property
+    def mask(self):
+        """Бит тега в маске tags_mask рецепта."""
+        return 1 << self.bit
+
 
 class Ingredient(models.Model):
     """Модель для ингредиента."""
@@ -63,7 +135,195 @@ class Ingredient(models.Model):
         return self.name
 
 
-class Recipe(models.Model):
+class RecipeQuerySet(models.QuerySet):
+    """Набор запросов для рецептов."""
+
+    def with_user_flags(self, user):
+        """Аннотирует рецепты флагами избранного и списка покупок."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, output_field=models.BooleanField()),
+                is_in_shopping_cart=Value(
+                    False, output_field=models.BooleanField()
+                ),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        )
+
+    def for_representation(self, user):
+        """
+        Рецепты со всеми связанными данными для полного представления.
+
+        Количество запросов не зависит от числа рецептов: флаги считаются
+        подзапросами, а теги, ингредиенты и авторы подгружаются
+        отдельными запросами.
+        """
+        return self.with_user_flags(user).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            Prefetch(
+                'author',
+                queryset=User.objects.with_is_subscribed(user)
+            ),
+        )
+
+    def first_per_author(self, limit):
+        """
+        Первые limit рецептов каждого автора.
+
+        Рецепты нумеруются оконной функцией ROW_NUMBER в разрезе автора,
+        поэтому выборка для любого числа авторов делается одним запросом.
+        """
+        ranked = self.annotate(recipe_rank=Window(
+            expression=RowNumber(),
+            partition_by=[F('author')],
+            order_by=[F('pub_date').desc(), F('pk').desc()],
+        )).values('pk', 'recipe_rank')
+        sql, params = ranked.query.sql_with_params()
+        return self.model.objects.filter(pk__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            'WHERE ranked.recipe_rank <= %s',
+            (*params, limit)
+        ))
+
+    def with_tags(self, tags, match_all=False):
+        """
+        Рецепты с любым из тегов или, при match_all, со всеми тегами.
+
+        Условие проверяется по маске tags_mask в строке рецепта, без
+        соединения с таблицей тегов и без дубликатов.
+        """
+        mask = sum(tag.mask for tag in tags)
+        matched = self.alias(tags_matched=F('tags_mask').bitand(mask))
+        if match_all:
+            return matched.filter(tags_matched=mask)
+        return matched.filter(tags_matched__gt=0)
+
+    def record_activity(self, field, delta):
+        """
+        Изменяем счётчик field на delta вместе с оценками popularity и
+        trending одним UPDATE.
+
+        trending - логарифм суммы весов действий, а вес растёт со временем
+        (trending_weight). Поэтому порядок по trending совпадает с
+        порядком по затухающей сумме на любой момент и пересчитывать
+        оценки не нужно. Отмена действия вычитает вес текущего момента,
+        оценка не опускается ниже нуля.
+        """
+        weight = Value(trending_weight(timezone.now()))
+        if delta > 0:
+            trending = Greatest(F('trending'), weight) + Ln(
+                Value(1.0) + Exp(-Abs(F('trending') - weight))
+            )
+        else:
+            trending = Case(
+                When(trending__gt=weight, then=Greatest(
+                    F('trending') + Ln(
+                        Value(1.0) - Exp(weight - F('trending'))
+                    ),
+                    Value(0.0)
+                )),
+                default=Value(0.0),
+                output_field=models.FloatField()
+            )
+        return self.update(**{
+            field: Greatest(F(field) + delta, 0),
+            'popularity': Greatest(F('popularity') + delta, 0),
+            'trending': trending,
+        })
+
+    def fill_trending(self, batch_size=TRENDING_BATCH_SIZE):
+        """
+        Заполняем trending по счётчикам избранного и списков покупок.
+
+        Время прошлых действий не хранится, поэтому они считаются
+        совершёнными в момент публикации рецепта. Возвращаем количество
+        обновлённых рецептов.
+        """
+        recipes = []
+        updated = 0
+        for recipe in self.annotate(
+            actions=F('favorites_count') + F('shopping_carts_count')
+        ).only('pk', 'pub_date').iterator(chunk_size=batch_size):
+            recipe.trending = (
+                math.log(recipe.actions) + trending_weight(recipe.pub_date)
+                if recipe.actions > 0 else 0.0
+            )
+            recipes.append(recipe)
+            if len(recipes) == batch_size:
+                self.model.objects.bulk_update(recipes, ['trending'])
+                updated += len(recipes)
+                recipes = []
+        self.model.objects.bulk_update(recipes, ['trending'])
+        return updated + len(recipes)
+
+    def update_tags_mask(self):
+        """Пересчитываем маски тегов по таблице связей одним UPDATE."""
+        return self.update(tags_mask=Coalesce(
+            Subquery(
+                self.model.tags.through.objects.filter(
+                    recipe=OuterRef('pk')
+                ).values('recipe').annotate(mask=Sum(ExpressionWrapper(
+                    Cast(Value(1), models.BigIntegerField())
+                    .bitleftshift(F('tag__bit')),
+                    output_field=models.BigIntegerField()
+                ))).values('mask'),
+                output_field=models.BigIntegerField()
+            ),
+            0
+        ))
+
+    def search(self, query):
+        """
+        Полнотекстовый поиск по названию и описанию рецепта.
+
+        Каждое слово запроса ищется как префикс, совпадения в названии
+        весят больше, чем в описании. На PostgreSQL используется
+        индексированный tsvector с русской морфологией, на SQLite -
+        таблица FTS5 (без стемминга, только поиск по префиксу).
+        """
+        words = SEARCH_WORD_REGEX.findall(query)
+        if not words:
+            return self
+        vendor = connections[self.db].vendor
+        if vendor == 'postgresql':
+            search_query = SearchQuery(
+                ' & '.join(f'{word}:*' for word in words),
+                search_type='raw',
+                config=SEARCH_CONFIG
+            )
+            return self.filter(search_vector=search_query).annotate(
+                search_rank=SearchRank(F('search_vector'), search_query)
+            ).order_by('-search_rank', '-pub_date')
+        if vendor == 'sqlite':
+            match = ' '.join(f'"{word}"*' for word in words)
+            return self.filter(pk__in=RawSQL(
+                f'SELECT rowid FROM {SEARCH_FTS_TABLE} '
+                f'WHERE {SEARCH_FTS_TABLE} MATCH %s',
+                (match,)
+            )).annotate(search_rank=RawSQL(
+                f'SELECT -bm25({SEARCH_FTS_TABLE}, %s, %s) '
+                f'FROM {SEARCH_FTS_TABLE} '
+                f'WHERE {SEARCH_FTS_TABLE} MATCH %s '
+                f'AND {SEARCH_FTS_TABLE}.rowid = recipes_recipe.id',
+                (SEARCH_NAME_WEIGHT, SEARCH_TEXT_WEIGHT, match)
+            )).order_by('-search_rank', '-pub_date')
+        condition = Q()
+        for word in words:
+            condition &= Q(name__icontains=word) | Q(text__icontains=word)
+        return self.filter(condition)
+
+
+class Recipe(CounterFieldsMixin, models.Model):
     """Модель для рецепта."""
     name = models.CharField(
         max_length=RECIPE_MAX_LENGTH,
@@ -96,12 +356,61 @@ class Recipe(models.Model):
         auto_now_add=True,
         verbose_name='Дата публикации'
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок'
+    )
+    short_link_clicks = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Переходы по короткой ссылке'
+    )
+    tags_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Маска тегов'
+    )
+    popularity = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном и списках покупок'
+    )
+    trending = models.FloatField(
+        default=0,
+        editable=False,
+        verbose_name='Оценка популярности за последнее время'
+    )
+
+    objects = RecipeQuerySet.as_manager()
+
+    counter_fields = RECIPE_COUNTER_FIELDS
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-popularity', '-pub_date', '-id'],
+                name='recipe_popular_idx'
+            ),
+            models.Index(
+                fields=['-trending', '-pub_date', '-id'],
+                name='recipe_trending_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -188,3 +497,260 @@ class ShoppingCart(UserRecipeBaseModel):
                 name='shopping_cart_unique'
             )
         ]
+
+
+class FeedEntryQuerySet(models.QuerySet):
+    """
+    Ленты подписок пользователей.
+
+    Рецепт обычного автора при публикации записывается в ленты всех его
+    подписчиков (fan-out on write). Рецепты авторов, у которых не меньше
+    FEED_FANOUT_LIMIT подписчиков, в ленты не копируются и выбираются
+    при чтении ленты (fan-out on read). Когда подписчиков становится
+    меньше FEED_FANOUT_LIMIT, рецепты автора копируются в ленты
+    (backfill); записи, оставшиеся при обратном переходе, при чтении
+    сливаются с выборкой без дубликатов.
+    """
+
+    def fan_out(self, recipes):
+        """Добавляем новые рецепты в ленты подписчиков их авторов."""
+        authors = {recipe.author_id for recipe in recipes}
+        followers = {}
+        for author_id, user_id in Subscription.objects.filter(
+            author__in=authors,
+            author__followers_count__lt=FEED_FANOUT_LIMIT
+        ).values_list('author_id', 'user_id'):
+            followers.setdefault(author_id, []).append(user_id)
+        self.bulk_create(
+            [
+                FeedEntry(
+                    user_id=user_id,
+                    recipe_id=recipe.pk,
+                    author_id=recipe.author_id,
+                    pub_date=recipe.pub_date
+                )
+                for recipe in recipes
+                for user_id in followers.get(recipe.author_id, ())
+            ],
+            batch_size=FEED_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+    def insert_from_subscriptions(self, condition='', params=()):
+        """
+        Копируем в ленты рецепты авторов из подписок одним INSERT ...
+        SELECT; condition дополнительно ограничивает подписки. Уже
+        существующие записи пропускаются.
+        """
+        feed = self.model._meta.db_table
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {feed} (user_id, recipe_id, author_id, '
+                'pub_date) '
+                'SELECT subscription.user_id, recipe.id, recipe.author_id, '
+                'recipe.pub_date '
+                f'FROM {Subscription._meta.db_table} subscription '
+                f'JOIN {User._meta.db_table} author '
+                'ON author.id = subscription.author_id '
+                f'JOIN {Recipe._meta.db_table} recipe '
+                'ON recipe.author_id = subscription.author_id '
+                f'WHERE author.followers_count < %s {condition} '
+                'ON CONFLICT DO NOTHING',
+                (FEED_FANOUT_LIMIT, *params)
+            )
+
+    def follow(self, user_id, author_id):
+        """Добавляем в ленту рецепты нового автора из подписок."""
+        self.insert_from_subscriptions(
+            'AND subscription.user_id = %s AND subscription.author_id = %s',
+            (user_id, author_id)
+        )
+
+    def backfill(self, author_id):
+        """Добавляем рецепты автора в ленты всех его подписчиков."""
+        self.insert_from_subscriptions(
+            'AND subscription.author_id = %s', (author_id,)
+        )
+
+    def unfollow(self, user_id, author_id):
+        """Убираем из ленты рецепты автора, от которого отписались."""
+        self.filter(user_id=user_id, author_id=author_id).delete()
+
+    def rebuild(self):
+        """Перестраиваем ленты всех пользователей."""
+        self.all().delete()
+        self.insert_from_subscriptions()
+
+    def timeline(self, user, before=None, limit=None):
+        """
+        Пары (дата публикации, id рецепта) ленты пользователя по убыванию.
+
+        before - пара (дата, id), после которой продолжается лента.
+        Записи ленты и рецепты популярных авторов выбираются двумя
+        запросами по индексам и сливаются.
+        """
+        entries = self.filter(user=user)
+        recipes = Recipe.objects.filter(author__in=Subscription.objects.filter(
+            user=user, author__followers_count__gte=FEED_FANOUT_LIMIT
+        ).values('author'))
+        if before is not None:
+            date, pk = before
+            entries = entries.filter(
+                Q(pub_date__lt=date) | Q(pub_date=date, recipe_id__lt=pk)
+            )
+            recipes = recipes.filter(
+                Q(pub_date__lt=date) | Q(pub_date=date, pk__lt=pk)
+            )
+        rows = set(entries.order_by('-pub_date', '-recipe_id').values_list(
+            'pub_date', 'recipe_id'
+        )[:limit])
+        rows.update(recipes.order_by('-pub_date', '-pk').values_list(
+            'pub_date', 'pk'
+        )[:limit])
+        return sorted(rows, reverse=True)[:limit]
+
+
+class FeedEntry(models.Model):
+    """
+    Запись ленты подписок: рецепт автора, на которого подписан
+    пользователь. Дата публикации дублируется из рецепта, чтобы лента
+    читалась по одному индексу.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пользователь'
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    objects = FeedEntryQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Ленты подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='feed_entry_unique'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_entry_timeline_idx'
+            ),
+            models.Index(
+                fields=['user', 'author'],
+                name='feed_entry_author_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class SimilarRecipe(models.Model):
+    """
+    Похожий рецепт с оценкой сходства по ингредиентам и тегам.
+
+    Заполняется командой compute_similar_recipes.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_recipes',
+        verbose_name='Рецепт'
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Похожий рецепт'
+    )
+    score = models.FloatField(verbose_name='Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='similar_recipe_unique'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similar_recipe_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} - {self.similar}'
+
+
+class PendingSimilarityQuerySet(models.QuerySet):
+    """Отметки рецептов для пересчёта похожих."""
+
+    def mark(self, recipe_ids):
+        """
+        Отмечаем рецепты одним INSERT.
+
+        Уже отмеченные рецепты пропускаются, поэтому частые правки
+        одного рецепта не множат отметки.
+        """
+        self.bulk_create(
+            [self.model(recipe_id=recipe_id) for recipe_id in recipe_ids],
+            batch_size=PENDING_SIMILARITY_BATCH_SIZE,
+            ignore_conflicts=True
+        )
+
+    def claim(self):
+        """
+        Забираем отметки для расчёта: удаляем их и возвращаем рецепты.
+
+        Правка рецепта во время расчёта добавит новую отметку, и он
+        будет пересчитан при следующем запуске.
+        """
+        with transaction.atomic():
+            last = self.aggregate(last=Max('pk'))['last'] or 0
+            recipe_ids = set(
+                self.filter(pk__lte=last).values_list('recipe_id', flat=True)
+            )
+            self.filter(pk__lte=last).delete()
+        return recipe_ids
+
+
+class PendingSimilarity(models.Model):
+    """
+    Рецепт, ингредиенты или теги которого изменились после расчёта
+    похожих рецептов.
+
+    На рецепт приходится не больше одной отметки;
+    compute_similar_recipes --incremental забирает их перед расчётом.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Рецепт'
+    )
+
+    objects = PendingSimilarityQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Рецепт для пересчёта похожих'
+        verbose_name_plural = 'Рецепты для пересчёта похожих'
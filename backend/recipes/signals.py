@@ -0,0 +1,252 @@
+import threading
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.core.exceptions import ValidationError
+from django.db.models.signals import (m2m_changed, post_delete, post_init,
+                                      post_save, pre_save)
+from django.dispatch import receiver
+
+from recipes.constants import (FEED_FANOUT_LIMIT, SEARCH_FTS_TABLE,
+                               TAG_LIMIT_ERROR_MESSAGE)
+from recipes.models import (Favorite, FeedEntry, PendingSimilarity, Recipe,
+                            ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+_deleting = threading.local()
+FILE_FIELDS = {Recipe: 'image', User: 'avatar'}
+
+
+def change_counter(model, pk, field, delta):
+    """Атомарно изменяем счётчик, не опускаясь ниже нуля."""
+    model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+
+
+@contextmanager
+def deleting_recipes(pks):
+    """
+    Блок удаления рецептов.
+
+    Счётчики избранного и списков покупок удаляемых рецептов при
+    каскадном удалении не обновляются: строка рецепта всё равно удаляется.
+    """
+    previous = getattr(_deleting, 'pks', frozenset())
+    _deleting.pks = previous | set(pks)
+    try:
+        yield
+    finally:
+        _deleting.pks = previous
+
+
+@receiver(post_save, sender=Recipe)
+def update_recipe_fts(sender, instance, **kwargs):
+    """
+    Обновляем таблицу FTS5 для поиска на SQLite.
+
+    На PostgreSQL поисковый вектор поддерживается триггером в БД.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid = %s',
+            [instance.pk]
+        )
+        cursor.execute(
+            f'INSERT INTO {SEARCH_FTS_TABLE} (rowid, name, text) '
+            'VALUES (%s, %s, %s)',
+            [instance.pk, instance.name, instance.text]
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def delete_recipe_fts(sender, instance, **kwargs):
+    """Удаляем рецепт из таблицы FTS5 на SQLite."""
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {SEARCH_FTS_TABLE} WHERE rowid = %s',
+            [instance.pk]
+        )
+
+
+@receiver(post_save, sender=Recipe)
+def increment_recipes_count(sender, instance, created, **kwargs):
+    """Увеличиваем счётчик рецептов автора."""
+    if created:
+        change_counter(User, instance.author_id, 'recipes_count', 1)
+
+
+@receiver(post_delete, sender=Recipe)
+def decrement_recipes_count(sender, instance, **kwargs):
+    """Уменьшаем счётчик рецептов автора."""
+    change_counter(User, instance.author_id, 'recipes_count', -1)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+def increment_recipe_counter(sender, instance, created, **kwargs):
+    """
+    Увеличиваем счётчик избранного или списков покупок рецепта и его
+    оценки популярности.
+    """
+    if created:
+        field = f'{sender._meta.default_related_name}_count'
+        Recipe.objects.filter(pk=instance.recipe_id).record_activity(
+            field, 1
+        )
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+def decrement_recipe_counter(sender, instance, **kwargs):
+    """
+    Уменьшаем счётчик избранного или списков покупок рецепта и его
+    оценки популярности.
+    """
+    if instance.recipe_id in getattr(_deleting, 'pks', ()):
+        return
+    field = f'{sender._meta.default_related_name}_count'
+    Recipe.objects.filter(pk=instance.recipe_id).record_activity(field, -1)
+
+
+@receiver(post_save, sender=Subscription)
+def increment_subscription_counters(sender, instance, created, **kwargs):
+    """Увеличиваем счётчики подписчиков автора и подписок пользователя."""
+    if created:
+        change_counter(User, instance.author_id, 'followers_count', 1)
+        change_counter(User, instance.user_id, 'following_count', 1)
+
+
+@receiver(post_delete, sender=Subscription)
+def decrement_subscription_counters(sender, instance, **kwargs):
+    """
+    Уменьшаем счётчики подписчиков автора и подписок пользователя.
+
+    Если подписчиков стало меньше FEED_FANOUT_LIMIT, рецепты автора,
+    опубликованные без записей в лентах, копируются в ленты. Переход
+    определяет условный UPDATE, поэтому при параллельных отписках он
+    срабатывает один раз.
+    """
+    crossed = User.objects.filter(
+        pk=instance.author_id, followers_count=FEED_FANOUT_LIMIT
+    ).update(followers_count=FEED_FANOUT_LIMIT - 1)
+    if crossed:
+        FeedEntry.objects.backfill(instance.author_id)
+    else:
+        change_counter(User, instance.author_id, 'followers_count', -1)
+    change_counter(User, instance.user_id, 'following_count', -1)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(sender, instance, created, **kwargs):
+    """Добавляем новый рецепт в ленты подписчиков автора."""
+    if created:
+        FeedEntry.objects.fan_out([instance])
+
+
+@receiver(post_save, sender=Subscription)
+def add_author_to_feed(sender, instance, created, **kwargs):
+    """Добавляем в ленту рецепты автора после подписки."""
+    if created:
+        FeedEntry.objects.follow(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscription)
+def remove_author_from_feed(sender, instance, **kwargs):
+    """Убираем из ленты рецепты автора после отписки."""
+    FeedEntry.objects.unfollow(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Tag)
+def assign_tag_bit(sender, instance, **kwargs):
+    """Новому тегу выдаём свободный бит маски."""
+    if instance.bit is not None:
+        return
+    free = Tag.objects.free_bits()
+    if not free:
+        raise ValidationError(TAG_LIMIT_ERROR_MESSAGE)
+    instance.bit = free[0]
+
+
+@receiver(post_delete, sender=Tag)
+def clear_tag_bit(sender, instance, **kwargs):
+    """Бит удалённого тега снимаем, чтобы его можно было выдать снова."""
+    if instance.bit is None:
+        return
+    Recipe.objects.with_tags([instance]).update(
+        tags_mask=F('tags_mask').bitand(~instance.mask)
+    )
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def update_tags_mask(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Маска тегов рецепта следует за таблицей связей, а рецепты с
+    изменёнными тегами отмечаются для пересчёта похожих. Остальные поля
+    рецепта на сходство не влияют; новый рецепт отмечается при
+    назначении тегов.
+    """
+    if reverse and action == 'pre_clear':
+        PendingSimilarity.objects.mark(sender.objects.filter(
+            tag=instance
+        ).values_list('recipe_id', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        if pk_set or action == 'post_clear':
+            PendingSimilarity.objects.mark([instance.pk])
+        Recipe.objects.filter(pk=instance.pk).update_tags_mask()
+    elif action == 'post_clear':
+        clear_tag_bit(Tag, instance)
+    elif pk_set:
+        PendingSimilarity.objects.mark(pk_set)
+        Recipe.objects.filter(pk__in=pk_set).update_tags_mask()
+
+
+def loaded_file(instance, field):
+    """Имя файла в поле без обращения к отложенным полям."""
+    value = instance.__dict__.get(field)
+    return getattr(value, 'name', value) or None
+
+
+def delete_file_on_commit(sender, name):
+    """Удаляем файл после фиксации транзакции, если он не используется."""
+    if name:
+        storage = sender._meta.get_field(FILE_FIELDS[sender]).storage
+        transaction.on_commit(lambda: storage.delete(name))
+
+
+@receiver(post_init, sender=Recipe)
+@receiver(post_init, sender=User)
+def remember_file(sender, instance, **kwargs):
+    """Запоминаем файл, прочитанный из БД, чтобы удалить его при замене."""
+    instance._loaded_file = loaded_file(instance, FILE_FIELDS[sender])
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=User)
+def delete_replaced_file(sender, instance, created, **kwargs):
+    """Удаляем файл, который заменили или очистили."""
+    field = FILE_FIELDS[sender]
+    if created or field not in instance.__dict__:
+        instance._loaded_file = loaded_file(instance, field)
+        return
+    current = loaded_file(instance, field)
+    if instance._loaded_file != current:
+        delete_file_on_commit(sender, instance._loaded_file)
+    instance._loaded_file = current
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=User)
+def delete_file(sender, instance, **kwargs):
+    """Удаляем файл удалённой строки."""
+    delete_file_on_commit(sender, loaded_file(instance, FILE_FIELDS[sender]))
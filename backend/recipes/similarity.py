@@ -0,0 +1,135 @@
+"""Похожие рецепты по разреженным векторам ингредиентов и тегов."""
+import itertools
+
+import numpy as np
+from scipy import sparse
+
+from recipes.constants import (SIMILAR_BLOCK_SIZE, SIMILAR_MAX_FEATURE_SHARE,
+                               SIMILAR_TAG_WEIGHT, SIMILAR_TOP_K)
+from recipes.models import Recipe, RecipeIngredient
+
+PAIRS_CHUNK_SIZE = 10000
+
+
+def load_pairs(queryset, fields):
+    """Пары значений из БД в массив numpy формы (n, 2)."""
+    rows = queryset.order_by().values_list(*fields).iterator(
+        chunk_size=PAIRS_CHUNK_SIZE
+    )
+    return np.fromiter(
+        itertools.chain.from_iterable(rows), dtype=np.int64
+    ).reshape(-1, 2)
+
+
+def normalize_rows(matrix):
+    """Делим строки на их длину; нулевые строки остаются нулевыми."""
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms) @ matrix
+
+
+class RecipeVectors:
+    """
+    Векторы рецептов в разреженных матрицах CSR.
+
+    Строка - рецепт, столбцы - ингредиенты с весами IDF и теги. Строки
+    нормированы, поэтому скалярное произведение равно косинусной мере.
+    Ингредиенты, которые есть больше чем в доле max_share рецептов
+    (соль, вода), не учитываются: они не говорят о сходстве и делали бы
+    произведение матриц почти плотным.
+
+    Сходство - взвешенная сумма косинусных мер по ингредиентам и тегам.
+    Кандидаты ищутся только среди рецептов с общими ингредиентами.
+    """
+
+    def __init__(self, recipe_ids, ingredient_pairs, tag_pairs,
+                 max_share=SIMILAR_MAX_FEATURE_SHARE,
+                 tag_weight=SIMILAR_TAG_WEIGHT):
+        self.recipe_ids = np.asarray(recipe_ids, dtype=np.int64)
+        self.tag_weight = tag_weight
+        ingredients = self.incidence(ingredient_pairs)
+        frequency = np.bincount(
+            ingredients.indices, minlength=ingredients.shape[1]
+        )
+        total = len(self.recipe_ids)
+        weights = np.log((1 + total) / (1 + frequency)) + 1
+        weights[frequency > max_share * total] = 0
+        ingredients = ingredients @ sparse.diags(weights.astype(np.float32))
+        ingredients.eliminate_zeros()
+        self.ingredients = normalize_rows(ingredients).tocsr()
+        self.ingredients_t = self.ingredients.T.tocsr()
+        self.tags = normalize_rows(self.incidence(tag_pairs)).tocsr()
+
+    @classmethod
+    def load(cls, **kwargs):
+        """Векторы всех рецептов из БД."""
+        recipe_ids = np.fromiter(
+            Recipe.objects.order_by('pk').values_list('pk', flat=True)
+            .iterator(chunk_size=PAIRS_CHUNK_SIZE),
+            dtype=np.int64
+        )
+        return cls(
+            recipe_ids,
+            load_pairs(RecipeIngredient.objects.all(),
+                       ('recipe_id', 'ingredient_id')),
+            load_pairs(Recipe.tags.through.objects.all(),
+                       ('recipe_id', 'tag_id')),
+            **kwargs
+        )
+
+    def incidence(self, pairs):
+        """Матрица рецепт x признак по парам (id рецепта, id признака)."""
+        pairs = pairs[np.isin(pairs[:, 0], self.recipe_ids)]
+        rows = np.searchsorted(self.recipe_ids, pairs[:, 0])
+        _, columns = np.unique(pairs[:, 1], return_inverse=True)
+        return sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, columns.ravel())),
+            shape=(len(self.recipe_ids), columns.max(initial=-1) + 1)
+        )
+
+    def rows(self, recipe_ids):
+        """Номера строк для существующих рецептов из recipe_ids."""
+        recipe_ids = np.asarray(sorted(recipe_ids), dtype=np.int64)
+        return np.searchsorted(
+            self.recipe_ids, recipe_ids[np.isin(recipe_ids, self.recipe_ids)]
+        )
+
+    def block_neighbours(self, rows, top_k):
+        """Лучшие top_k соседей для строк одного блока."""
+        candidates = (self.ingredients[rows] @ self.ingredients_t).tocoo()
+        source = rows[candidates.row]
+        target = candidates.col
+        other = source != target
+        source, target = source[other], target[other]
+        tag_scores = np.asarray(
+            self.tags[source].multiply(self.tags[target]).sum(axis=1)
+        ).ravel()
+        scores = (
+            (1 - self.tag_weight) * candidates.data[other]
+            + self.tag_weight * tag_scores
+        )
+        order = np.lexsort((-scores, source))
+        source, target, scores = source[order], target[order], scores[order]
+        rank = np.arange(len(source)) - np.searchsorted(source, source)
+        best = rank < top_k
+        return source[best], target[best], scores[best]
+
+    def neighbours(self, rows=None, top_k=SIMILAR_TOP_K,
+                   block_size=SIMILAR_BLOCK_SIZE):
+        """
+        Генератор троек (id рецепта, id похожего, сходство).
+
+        Строки обрабатываются блоками по block_size, чтобы произведение
+        матриц помещалось в память.
+        """
+        if rows is None:
+            rows = np.arange(len(self.recipe_ids))
+        for start in range(0, len(rows), block_size):
+            source, target, scores = self.block_neighbours(
+                rows[start:start + block_size], top_k
+            )
+            yield from zip(
+                self.recipe_ids[source].tolist(),
+                self.recipe_ids[target].tolist(),
+                scores.tolist()
+            )
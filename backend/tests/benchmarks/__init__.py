@@ -0,0 +1,18 @@
+"""
+Нагрузочные проверки эндпоинтов API.
+
+Запуск из каталога backend:
+
+    python -m tests.benchmarks
+    python -m tests.benchmarks --target http --url http://localhost:8080
+
+В режиме client запросы идут через тестовый клиент Django во временную
+тестовую БД, которая заполняется командами import_data и seed_load_data.
+В режиме http запросы отправляются на запущенный gunicorn; БД должна
+быть заранее заполнена (например, seed_load_data).
+
+Для каждого сценария считаются пропускная способность и перцентили
+p50/p95/p99. Результат сравнивается с бюджетами из budgets.json и с
+сохранённым базовым замером (--save-baseline), при превышении команда
+завершается с ненулевым кодом.
+"""
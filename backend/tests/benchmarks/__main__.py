@@ -0,0 +1,151 @@
+import argparse
+import io
+import logging
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+from tests.benchmarks.runner import (check_budgets, load_json, run_scenario,
+                                     save_json)
+from tests.benchmarks.scenarios import (build_scenarios, postman_scenarios,
+                                        prepare)
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARKS_DIR.parents[1]
+POSTMAN_COLLECTION = (
+    BACKEND_DIR.parent / 'postman_collection'
+    / 'foodgram.postman_collection.json'
+)
+INGREDIENTS_PATH = BACKEND_DIR.parent / 'data' / 'ingredients.csv'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        prog='python -m tests.benchmarks',
+        description='Нагрузочные проверки эндпоинтов API.'
+    )
+    parser.add_argument('--target', choices=('client', 'http'),
+                        default='client')
+    parser.add_argument('--url', default='http://localhost:8000',
+                        help='Адрес сервера для --target http')
+    parser.add_argument('--iterations', type=int, default=50)
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='Число потоков для --target http')
+    parser.add_argument('--scenarios', nargs='*', default=(),
+                        help='Запускать сценарии, имя которых содержит '
+                             'одну из подстрок')
+    parser.add_argument('--users', type=int, default=200,
+                        help='Пользователей в тестовой БД для client')
+    parser.add_argument('--recipes', type=int, default=1000,
+                        help='Рецептов в тестовой БД для client')
+    parser.add_argument('--cart-size', type=int, default=100,
+                        help='Рецептов в списке покупок пользователя')
+    parser.add_argument('--subscriptions', type=int, default=50)
+    parser.add_argument('--postman', nargs='?', const=POSTMAN_COLLECTION,
+                        type=Path,
+                        help='Добавить сценарии из коллекции Postman')
+    parser.add_argument('--budgets', type=Path,
+                        default=BENCHMARKS_DIR / 'budgets.json')
+    parser.add_argument('--budget-scale', type=float, default=1,
+                        help='Множитель бюджетов p95 для медленных машин')
+    parser.add_argument('--baseline', type=Path,
+                        help='Файл базового замера (по умолчанию '
+                             'baselines/<target>.json)')
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='Сохранить результаты как базовый замер')
+    parser.add_argument('--output', type=Path,
+                        help='Сохранить результаты в JSON')
+    return parser.parse_args()
+
+
+def run(transport, options):
+    context = prepare(transport, options.cart_size, options.subscriptions)
+    scenarios = build_scenarios(context)
+    if options.postman:
+        scenarios += postman_scenarios(options.postman, context)
+    if options.scenarios:
+        scenarios = [
+            scenario for scenario in scenarios
+            if any(part in scenario.name for part in options.scenarios)
+        ]
+    results = {}
+    print(f'{"сценарий":<52}{"rps":>9}{"p50":>9}{"p95":>9}{"p99":>9}'
+          f'{"ошибки":>8}')
+    for scenario in scenarios:
+        result = run_scenario(
+            transport, scenario, context['token'], options.iterations,
+            options.warmup, options.concurrency
+        )
+        results[scenario.name] = result
+        print(f'{scenario.name:<52}{result["throughput_rps"]:>9}'
+              f'{result["p50_ms"]:>9}{result["p95_ms"]:>9}'
+              f'{result["p99_ms"]:>9}{result["errors"]:>8}')
+    return results
+
+
+def run_client(options):
+    """Запуск во временной тестовой БД через тестовый клиент Django."""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram.settings')
+    import django
+
+    django.setup()
+    from django.core.management import call_command
+    from django.db import connection
+    from django.test.utils import (override_settings,
+                                   setup_test_environment,
+                                   teardown_test_environment)
+
+    from tests.benchmarks.transports import ClientTransport
+
+    # Ответы 4xx в сценариях ожидаемы, их предупреждения только мешают.
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        with tempfile.TemporaryDirectory() as media_root, override_settings(
+            MEDIA_ROOT=media_root, ALLOWED_HOSTS=['*']
+        ):
+            call_command('import_data', INGREDIENTS_PATH, verbosity=0,
+                         stdout=io.StringIO())
+            call_command(
+                'seed_load_data', users=options.users,
+                recipes=options.recipes, favorites=options.recipes * 5,
+                carts=options.recipes * 2, subscriptions=options.users * 10,
+                stdout=io.StringIO()
+            )
+            return run(ClientTransport(), options)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def main():
+    options = parse_args()
+    if options.target == 'http':
+        from tests.benchmarks.transports import HttpTransport
+
+        results = run(HttpTransport(options.url), options)
+    else:
+        results = run_client(options)
+    if options.output:
+        save_json(options.output, results)
+    baseline_path = options.baseline or (
+        BENCHMARKS_DIR / 'baselines' / f'{options.target}.json'
+    )
+    if options.save_baseline:
+        save_json(baseline_path, results)
+        print(f'Базовый замер сохранён в {baseline_path}')
+        return 0
+    failures = check_budgets(
+        results, load_json(options.budgets), load_json(baseline_path),
+        options.budget_scale
+    )
+    for failure in failures:
+        print(failure, file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
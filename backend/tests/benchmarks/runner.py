@@ -0,0 +1,134 @@
+"""Выполнение сценариев, перцентили и проверка бюджетов."""
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(values, q):
+    """Перцентиль методом ближайшего ранга."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0
+    rank = max(math.ceil(q / 100 * len(ordered)), 1)
+    return ordered[rank - 1]
+
+
+def capture(response):
+    """Значения из ответа для подстановки в пути следующих шагов."""
+    data = response.json()
+    if isinstance(data, list):
+        return {'ids': [item['id'] for item in data]}
+    return {'id': data['id']}
+
+
+def run_once(transport, scenario, token):
+    """Один проход сценария: длительность и список ошибок."""
+    state = {}
+    errors = []
+    start = time.perf_counter()
+    for step in scenario.steps:
+        path = step.path.format(**state) if state else step.path
+        response = transport.request(
+            step.method, path, token if step.auth else None, step.data
+        )
+        if step.expect:
+            failed = response.status not in step.expect
+        else:
+            failed = response.status >= 500
+        if failed:
+            errors.append(f'{step.method} {path}: {response.status}')
+            break
+        if step.capture:
+            state.update(capture(response))
+    return time.perf_counter() - start, errors
+
+
+def run_scenario(transport, scenario, token, iterations, warmup,
+                 concurrency):
+    """Прогоняем сценарий и считаем статистику."""
+    for _ in range(warmup):
+        run_once(transport, scenario, token)
+    if scenario.serial or not transport.concurrent:
+        concurrency = 1
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as executor:
+            runs = list(executor.map(
+                lambda _: run_once(transport, scenario, token),
+                range(iterations)
+            ))
+    else:
+        runs = [
+            run_once(transport, scenario, token) for _ in range(iterations)
+        ]
+    elapsed = time.perf_counter() - start
+    durations = [duration * 1000 for duration, _ in runs]
+    errors = [error for _, run_errors in runs for error in run_errors]
+    return {
+        'iterations': iterations,
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'first_error': errors[0] if errors else None,
+        'throughput_rps': round(iterations / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(percentile(durations, 50), 2),
+        'p95_ms': round(percentile(durations, 95), 2),
+        'p99_ms': round(percentile(durations, 99), 2),
+    }
+
+
+def scenario_budget(budgets, name):
+    """Бюджет сценария: общие значения, уточнённые для сценария."""
+    budget = dict(budgets.get('default', {}))
+    budget.update(budgets.get('scenarios', {}).get(name, {}))
+    return budget
+
+
+def check_budgets(results, budgets, baseline, scale=1):
+    """
+    Список нарушений бюджетов.
+
+    Сценарий не проходит, если в нём были ошибки, если p95 больше
+    p95_ms * scale или если p95 вырос относительно базового замера
+    больше чем на max_regression (и не меньше чем на min_delta_ms).
+    """
+    failures = []
+    for name, result in results.items():
+        budget = scenario_budget(budgets, name)
+        if result['errors']:
+            failures.append(
+                f'{name}: ошибок {result["errors"]}, '
+                f'например {result["first_error"]}'
+            )
+        limit = budget.get('p95_ms')
+        if limit is not None and result['p95_ms'] > limit * scale:
+            failures.append(
+                f'{name}: p95 {result["p95_ms"]} мс больше бюджета '
+                f'{limit * scale} мс'
+            )
+        previous = baseline.get(name)
+        regression = budget.get('max_regression')
+        if previous is None or regression is None:
+            continue
+        delta = result['p95_ms'] - previous['p95_ms']
+        if (delta > previous['p95_ms'] * regression
+                and delta > budget.get('min_delta_ms', 0)):
+            failures.append(
+                f'{name}: p95 {result["p95_ms"]} мс, в базовом замере '
+                f'{previous["p95_ms"]} мс'
+            )
+    return failures
+
+
+def load_json(path, default=None):
+    if not path.exists():
+        return {} if default is None else default
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2, sort_keys=True)
+        file.write('\n')
@@ -0,0 +1,317 @@
+"""Сценарии нагрузочных проверок и подготовка данных через API."""
+import json
+import re
+from urllib.parse import urlsplit
+
+PNG = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+BENCH_USER = {
+    'email': 'benchmark@example.com',
+    'username': 'benchmark',
+    'first_name': 'Bench',
+    'last_name': 'Mark',
+    'password': 'Bench-Password-2024',
+}
+SHOPPING_CART_FORMATS = ('txt', 'csv', 'json', 'pdf')
+BULK_SIZE = 10
+
+
+class Step:
+    """
+    Один запрос сценария.
+
+    expect - допустимые коды ответа; None означает любой код меньше 500.
+    capture сохраняет id из ответа для следующих шагов: путь шага
+    форматируется значениями {id} и {ids[0]}.
+    """
+
+    def __init__(self, method, path, auth=False, data=None, expect=(200,),
+                 capture=False):
+        self.method = method
+        self.path = path
+        self.auth = auth
+        self.data = data
+        self.expect = expect
+        self.capture = capture
+
+
+class Scenario:
+    """
+    Последовательность запросов, время которой замеряется целиком.
+
+    Сценарии serial изменяют данные и выполняются в одном потоке.
+    """
+
+    def __init__(self, name, steps, serial=False):
+        self.name = name
+        self.steps = steps
+        self.serial = serial
+
+
+def recipe_payload(context, name='Бенчмарк'):
+    return {
+        'ingredients': [
+            {'id': pk, 'amount': 10} for pk in context['ingredient_ids']
+        ],
+        'tags': [context['tag_id']],
+        'image': PNG,
+        'name': name,
+        'text': 'Рецепт для нагрузочной проверки.',
+        'cooking_time': 10,
+    }
+
+
+def prepare(transport, cart_size, subscriptions):
+    """
+    Готовим пользователя для проверок: токен, тяжёлый список покупок,
+    избранное, подписки и собственный рецепт.
+    """
+    def call(method, path, token=None, data=None, expect=(200,)):
+        response = transport.request(method, path, token, data)
+        if expect and response.status not in expect:
+            raise RuntimeError(
+                f'{method} {path}: {response.status} '
+                f'{response.content[:300]!r}'
+            )
+        return response
+
+    call('POST', '/api/users/', data=BENCH_USER, expect=None)
+    token = call('POST', '/api/auth/token/login/', data={
+        'email': BENCH_USER['email'], 'password': BENCH_USER['password']
+    }).json()['auth_token']
+    me = call('GET', '/api/users/me/', token).json()
+    recipes = call(
+        'GET', f'/api/recipes/?limit={cart_size + 20}', token
+    ).json()['results']
+    recipes = [recipe for recipe in recipes
+               if recipe['author']['id'] != me['id']]
+    if len(recipes) < 2:
+        raise RuntimeError('В БД слишком мало рецептов для проверок.')
+    users = call(
+        'GET', f'/api/users/?limit={subscriptions + 20}', token
+    ).json()['results']
+    authors = [user['id'] for user in users if user['id'] != me['id']]
+    tags = call('GET', '/api/tags/').json()
+    ingredients = call('GET', '/api/ingredients/').json()[:5]
+
+    for recipe in recipes[:cart_size]:
+        call('POST', f'/api/recipes/{recipe["id"]}/shopping_cart/', token,
+             expect=None)
+    for recipe in recipes[:10]:
+        call('POST', f'/api/recipes/{recipe["id"]}/favorite/', token,
+             expect=None)
+    for author in authors[:subscriptions]:
+        call('POST', f'/api/users/{author}/subscribe/', token, expect=None)
+
+    context = {
+        'token': token,
+        'me_id': me['id'],
+        'recipe_id': recipes[0]['id'],
+        'free_recipe_id': recipes[-1]['id'],
+        'author_id': authors[0],
+        'free_author_id': authors[-1],
+        'tag_id': tags[0]['id'],
+        'tag_slugs': [tag['slug'] for tag in tags[:3]],
+        'ingredient_ids': [ingredient['id'] for ingredient in ingredients],
+        'ingredient_id': ingredients[0]['id'],
+        'ingredient_prefix': ingredients[0]['name'][:3],
+        'search': recipes[0]['name'].split()[0],
+    }
+    # Свободный рецепт и автор используются в сценариях добавления и
+    # удаления, поэтому заранее убираем их из списков пользователя.
+    for model in ('favorite', 'shopping_cart'):
+        call('DELETE', f'/api/recipes/{context["free_recipe_id"]}/{model}/',
+             token, expect=None)
+    call('DELETE', f'/api/users/{context["free_author_id"]}/subscribe/',
+         token, expect=None)
+    context['own_recipe_id'] = call(
+        'POST', '/api/recipes/', token, recipe_payload(context),
+        expect=(201,)
+    ).json()['id']
+    short_link = call(
+        'GET', f'/api/recipes/{context["recipe_id"]}/get-link/', token
+    ).json()['short-link']
+    context['short_path'] = urlsplit(short_link).path
+    return context
+
+
+def read_scenarios(context):
+    """Запросы на чтение для анонимного и авторизованного пользователя."""
+    tags = '&'.join(f'tags={slug}' for slug in context['tag_slugs'])
+    both = [
+        ('users.list', '/api/users/?limit=6'),
+        ('users.list.large', '/api/users/?limit=100'),
+        ('users.retrieve', f'/api/users/{context["author_id"]}/'),
+        ('tags.list', '/api/tags/'),
+        ('tags.retrieve', f'/api/tags/{context["tag_id"]}/'),
+        ('ingredients.list', '/api/ingredients/'),
+        ('ingredients.search',
+         f'/api/ingredients/?name={context["ingredient_prefix"]}'),
+        ('ingredients.retrieve',
+         f'/api/ingredients/{context["ingredient_id"]}/'),
+        ('recipes.list', '/api/recipes/?limit=6'),
+        ('recipes.list.large', '/api/recipes/?limit=100'),
+        ('recipes.list.cursor', '/api/recipes/?cursor=&limit=100'),
+        ('recipes.list.tags', f'/api/recipes/?{tags}&limit=6'),
+        ('recipes.list.popular', '/api/recipes/?ordering=popular&limit=6'),
+        ('recipes.list.trending', '/api/recipes/?ordering=trending&limit=6'),
+        ('recipes.list.search',
+         f'/api/recipes/?search={context["search"]}&limit=6'),
+        ('recipes.retrieve', f'/api/recipes/{context["recipe_id"]}/'),
+        ('recipes.pantry', '/api/recipes/pantry/?' + '&'.join(
+            f'ingredients={pk}' for pk in context['ingredient_ids']
+        )),
+        ('recipes.similar',
+         f'/api/recipes/{context["recipe_id"]}/similar/'),
+    ]
+    auth_only = [
+        ('users.me', '/api/users/me/'),
+        ('users.subscriptions',
+         '/api/users/subscriptions/?limit=6&recipes_limit=3'),
+        ('users.subscriptions.large', '/api/users/subscriptions/?limit=100'),
+        ('recipes.list.favorited', '/api/recipes/?is_favorited=1&limit=6'),
+        ('recipes.feed', '/api/recipes/feed/?limit=6'),
+        ('recipes.feed.large', '/api/recipes/feed/?limit=100'),
+        ('recipes.list.cart',
+         '/api/recipes/?is_in_shopping_cart=1&limit=100'),
+        ('recipes.get_link',
+         f'/api/recipes/{context["recipe_id"]}/get-link/'),
+    ] + [
+        (f'recipes.download_shopping_cart.{extension}',
+         f'/api/recipes/download_shopping_cart/?format={extension}')
+        for extension in SHOPPING_CART_FORMATS
+    ]
+    scenarios = []
+    for name, path in both:
+        scenarios.append(Scenario(f'{name}.anon', [Step('GET', path)]))
+        scenarios.append(
+            Scenario(f'{name}.auth', [Step('GET', path, auth=True)])
+        )
+    for name, path in auth_only:
+        scenarios.append(Scenario(name, [Step('GET', path, auth=True)]))
+    scenarios.append(Scenario('short_link.anon', [
+        Step('GET', context['short_path'], expect=(302,))
+    ]))
+    return scenarios
+
+
+def write_scenarios(context):
+    """Изменяющие запросы; каждый сценарий возвращает данные назад."""
+    recipe = f'/api/recipes/{context["free_recipe_id"]}'
+    author = f'/api/users/{context["free_author_id"]}'
+    return [
+        Scenario('auth.login', [Step(
+            'POST', '/api/auth/token/login/', data={
+                'email': BENCH_USER['email'],
+                'password': BENCH_USER['password'],
+            }
+        )], serial=True),
+        Scenario('recipes.favorite', [
+            Step('POST', f'{recipe}/favorite/', True, expect=(201,)),
+            Step('DELETE', f'{recipe}/favorite/', True, expect=(204,)),
+        ], serial=True),
+        Scenario('recipes.shopping_cart', [
+            Step('POST', f'{recipe}/shopping_cart/', True, expect=(201,)),
+            Step('DELETE', f'{recipe}/shopping_cart/', True, expect=(204,)),
+        ], serial=True),
+        Scenario('recipes.list.anon_under_favorites', [
+            Step('POST', f'{recipe}/favorite/', True, expect=(201,)),
+            Step('GET', '/api/recipes/?limit=6'),
+            Step('DELETE', f'{recipe}/favorite/', True, expect=(204,)),
+            Step('GET', '/api/recipes/?limit=6'),
+        ], serial=True),
+        Scenario('users.subscribe', [
+            Step('POST', f'{author}/subscribe/', True, expect=(201,)),
+            Step('DELETE', f'{author}/subscribe/', True, expect=(204,)),
+        ], serial=True),
+        Scenario('users.avatar', [
+            Step('PUT', '/api/users/me/avatar/', True, {'avatar': PNG}),
+            Step('DELETE', '/api/users/me/avatar/', True, expect=(204,)),
+        ], serial=True),
+        Scenario('recipes.update', [Step(
+            'PATCH', f'/api/recipes/{context["own_recipe_id"]}/', True,
+            recipe_payload(context, 'Бенчмарк, изменённый')
+        )], serial=True),
+        Scenario('recipes.create_delete', [
+            Step('POST', '/api/recipes/', True, recipe_payload(context),
+                 expect=(201,), capture=True),
+            Step('DELETE', '/api/recipes/{id}/', True, expect=(204,)),
+        ], serial=True),
+        Scenario('recipes.bulk_create_delete', [
+            Step('POST', '/api/recipes/bulk/', True,
+                 [recipe_payload(context)] * BULK_SIZE,
+                 expect=(201,), capture=True),
+        ] + [
+            Step('DELETE', f'/api/recipes/{{ids[{index}]}}/', True,
+                 expect=(204,))
+            for index in range(BULK_SIZE)
+        ], serial=True),
+    ]
+
+
+def build_scenarios(context):
+    return read_scenarios(context) + write_scenarios(context)
+
+
+def postman_scenarios(path, context):
+    """
+    Сценарии из GET-запросов коллекции Postman.
+
+    Каждая папка коллекции становится сценарием. Переменные коллекции
+    подставляются из context; запросы с переменными, которые
+    выставляются только скриптами Postman, пропускаются.
+    """
+    with open(path, encoding='utf-8') as file:
+        collection = json.load(file)
+    variables = {
+        variable['key']: variable['value']
+        for variable in collection.get('variable', ())
+    }
+    variables.update({
+        'baseUrl': '',
+        'userId': context['author_id'],
+        'firstTagId': context['tag_id'],
+        'secondTagSlug': context['tag_slugs'][1 % len(context['tag_slugs'])],
+        'thirdTagSlug': context['tag_slugs'][-1],
+        'firstIndredientId': context['ingredient_id'],
+        'ingredientNameFirstLatter': context['ingredient_prefix'][:1],
+        'firstRecipeId': context['recipe_id'],
+    })
+
+    def substitute(text):
+        return re.sub(
+            r'{{(\w+)}}',
+            lambda match: str(variables.get(match[1], match[0])),
+            text
+        )
+
+    scenarios = []
+
+    def walk(items, names, auth):
+        steps = []
+        for item in items:
+            item_auth = item.get('auth', {}).get('type') or auth
+            if 'item' in item:
+                walk(item['item'], names + [item['name']], item_auth)
+                continue
+            request = item['request']
+            request_auth = request.get('auth', {}).get('type') or item_auth
+            url = request['url']
+            url = substitute(url['raw'] if isinstance(url, dict) else url)
+            if request['method'] != 'GET' or '{{' in url:
+                continue
+            steps.append(Step(
+                'GET', url, auth=request_auth not in (None, 'noauth'),
+                expect=None
+            ))
+        if steps:
+            name = '.'.join(
+                re.sub(r'\W+', '_', part.split('//')[0].strip()).lower()
+                for part in names
+            )
+            scenarios.append(Scenario(f'postman.{name}', steps))
+
+    walk(collection['item'], [], collection.get('auth', {}).get('type'))
+    return scenarios
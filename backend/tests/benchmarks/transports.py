@@ -0,0 +1,98 @@
+"""Способы отправки запросов: тестовый клиент Django и HTTP."""
+import http.client
+import json
+import threading
+from urllib.parse import urlsplit
+
+
+class Response:
+    """Ответ, одинаковый для всех транспортов."""
+
+    def __init__(self, status, content, headers):
+        self.status = status
+        self.content = content
+        self.headers = headers
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class ClientTransport:
+    """Запросы через django.test.Client в текущем процессе."""
+
+    name = 'client'
+    concurrent = False
+
+    def __init__(self):
+        from django.test import Client
+
+        self.client = Client()
+
+    def request(self, method, path, token=None, data=None):
+        extra = {}
+        if token:
+            extra['HTTP_AUTHORIZATION'] = f'Token {token}'
+        if data is not None:
+            extra['data'] = json.dumps(data)
+            extra['content_type'] = 'application/json'
+        response = getattr(self.client, method.lower())(path, **extra)
+        content = (
+            b''.join(response.streaming_content) if response.streaming
+            else response.content
+        )
+        return Response(response.status_code, content, dict(response.items()))
+
+
+class HttpTransport:
+    """
+    Запросы по HTTP к запущенному серверу.
+
+    У каждого потока своё постоянное соединение.
+    """
+
+    name = 'http'
+    concurrent = True
+
+    def __init__(self, url, timeout=30):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.https = parts.scheme == 'https'
+        self.netloc = parts.netloc
+        self.timeout = timeout
+        self.local = threading.local()
+
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            factory = (
+                http.client.HTTPSConnection if self.https
+                else http.client.HTTPConnection
+            )
+            connection = factory(self.host, self.port, timeout=self.timeout)
+            self.local.connection = connection
+        return connection
+
+    def request(self, method, path, token=None, data=None):
+        headers = {'Host': self.netloc, 'Accept': '*/*'}
+        body = None
+        if token:
+            headers['Authorization'] = f'Token {token}'
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            connection = self.connection()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                content = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                connection.close()
+                self.local.connection = None
+                if attempt:
+                    raise
+        return Response(
+            response.status, content, dict(response.getheaders())
+        )
@@ -0,0 +1,80 @@
+"""
+Сохранение объектов целиком не затирает счётчики.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+import io
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.constants import RECIPE_COUNTER_FIELDS
+from recipes.models import Favorite, Recipe
+from users.constants import USER_COUNTER_FIELDS
+from users.models import User
+
+
+class CounterFieldsTestCase(TestCase):
+    """Счётчик, изменённый после чтения объекта, переживает его save()."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='x'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/images/q.png'
+        )
+
+    def test_recipe(self):
+        stale = Recipe.objects.get(pk=self.recipe.pk)
+        Recipe.objects.filter(pk=stale.pk).record_activity(
+            'favorites_count', 1
+        )
+        Recipe.objects.filter(pk=stale.pk).update(short_link_clicks=5)
+        stale.name = 'Новое название'
+        stale.save()
+        recipe = Recipe.objects.get(pk=stale.pk)
+        self.assertEqual(recipe.name, 'Новое название')
+        self.assertEqual(recipe.favorites_count, 1)
+        self.assertEqual(recipe.popularity, 1)
+        self.assertGreater(recipe.trending, 0)
+        self.assertEqual(recipe.short_link_clicks, 5)
+
+    def test_user(self):
+        stale = User.objects.get(pk=self.author.pk)
+        User.objects.filter(pk=stale.pk).update(
+            **{field: 3 for field in USER_COUNTER_FIELDS}
+        )
+        stale.set_password('y')
+        stale.save()
+        user = User.objects.get(pk=stale.pk)
+        self.assertTrue(user.check_password('y'))
+        for field in USER_COUNTER_FIELDS:
+            self.assertEqual(getattr(user, field), 3)
+
+    def test_counter_fields_exist(self):
+        for model, fields in (
+            (Recipe, RECIPE_COUNTER_FIELDS), (User, USER_COUNTER_FIELDS)
+        ):
+            for field in fields:
+                model._meta.get_field(field)
+
+    def test_recount_fills_trending(self):
+        # bulk_create не отправляет сигналы, как загрузка фикстур.
+        Favorite.objects.bulk_create([
+            Favorite(user=self.author, recipe=self.recipe)
+        ])
+        call_command('recount_counters', stdout=io.StringIO())
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.popularity, 1)
+        self.assertGreater(recipe.trending, 0)
+        Favorite.objects.all().delete()
+        call_command('recount_counters', stdout=io.StringIO())
+        recipe = Recipe.objects.get(pk=self.recipe.pk)
+        self.assertEqual(recipe.popularity, 0)
+        self.assertEqual(recipe.trending, 0)
@@ -0,0 +1,61 @@
+"""
+Ленты подписок при переходе автора через FEED_FANOUT_LIMIT.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+from unittest import mock
+
+from django.test import TestCase
+
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscription, User
+
+LIMIT = 2
+
+
+@mock.patch('recipes.signals.FEED_FANOUT_LIMIT', LIMIT)
+@mock.patch('recipes.models.FEED_FANOUT_LIMIT', LIMIT)
+class FeedFanoutLimitTestCase(TestCase):
+
+    def setUp(self):
+        self.author, self.first, self.second = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name=name, password='x'
+            )
+            for name in ('author', 'first', 'second')
+        )
+        for user in (self.first, self.second):
+            Subscription.objects.create(user=user, author=self.author)
+
+    def publish(self):
+        return Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/images/q.png'
+        )
+
+    def timeline(self, user):
+        return [pk for _, pk in FeedEntry.objects.timeline(user)]
+
+    def test_backfill_below_limit(self):
+        recipe = self.publish()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(self.timeline(self.first), [recipe.pk])
+        Subscription.objects.get(user=self.second).delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.followers_count, LIMIT - 1)
+        self.assertEqual(self.timeline(self.first), [recipe.pk])
+        self.assertEqual(self.timeline(self.second), [])
+
+    def test_entries_above_limit_are_merged(self):
+        Subscription.objects.get(user=self.second).delete()
+        recipe = self.publish()
+        Subscription.objects.create(user=self.second, author=self.author)
+        self.assertEqual(self.timeline(self.first), [recipe.pk])
+        Subscription.objects.get(user=self.second).delete()
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('user', 'recipe')),
+            [(self.first.pk, recipe.pk)]
+        )
@@ -0,0 +1,48 @@
+"""
+Импорт справочников командой import_data.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+import io
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes.models import Ingredient
+
+
+class ImportDataTestCase(TestCase):
+
+    def import_lines(self, items):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = Path(directory.name) / 'ingredients.jsonl'
+        path.write_text(
+            '\n'.join(json.dumps(item, ensure_ascii=False) for item in items),
+            encoding='utf-8'
+        )
+        stderr = io.StringIO()
+        call_command(
+            'import_data', path, stdout=io.StringIO(), stderr=stderr
+        )
+        return stderr.getvalue()
+
+    def test_missing_and_null_fields(self):
+        errors = self.import_lines([
+            {'name': 'Соль', 'measurement_unit': 'г'},
+            {'name': 'Перец'},
+            {'name': None, 'measurement_unit': 'г'},
+            {'name': 'Сахар', 'measurement_unit': 'г'},
+        ])
+        self.assertEqual(
+            set(Ingredient.objects.values_list('name', flat=True)),
+            {'Соль', 'Сахар'}
+        )
+        self.assertIn('Строка 2: не заполнены поля measurement_unit', errors)
+        self.assertIn('Строка 3: не заполнены поля name', errors)
+        self.assertFalse(Ingredient.objects.filter(name='None').exists())
@@ -0,0 +1,108 @@
+"""
+Индексы в памяти процесса.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+from unittest import mock
+
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from api.constants import (INGREDIENTS_VERSION, PANTRY_VERSION,
+                           RECIPE_IDS_VERSION)
+from api.indexes import ingredient_index, pantry_index, recipe_ids
+from api.utils import hashids
+from api.versions import write_versions
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from users.models import User
+
+MISSING_ID = 1000
+
+
+@override_settings(SERVER_TIMING=False)
+class RecipeIdSetTestCase(TestCase):
+
+    def setUp(self):
+        recipe_ids.invalidate()
+        self.addCleanup(recipe_ids.invalidate)
+
+    def get(self):
+        return self.client.get(f'/s/{hashids.encode(MISSING_ID)}/')
+
+    def test_missing_id_is_cached(self):
+        # Версия, построение множества и проверка по БД.
+        with self.assertNumQueries(3):
+            self.assertEqual(self.get().status_code, 404)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.get().status_code, 404)
+
+    def test_missing_id_expires(self):
+        with mock.patch('api.indexes.RECIPE_IDS_MISSING_TTL', 0):
+            self.assertEqual(self.get().status_code, 404)
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='x'
+        )
+        # bulk_create не отправляет сигналы, как запись в другом процессе.
+        Recipe.objects.bulk_create([Recipe(
+            pk=MISSING_ID, author=author, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/images/q.png'
+        )])
+        self.assertEqual(self.get().status_code, 302)
+
+
+@mock.patch('api.indexes.INDEX_VERSION_CHECK_INTERVAL', 0)
+class IndexVersionTestCase(TestCase):
+    """Записи другого процесса видны по версии, без ожидания ttl."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='x'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/images/q.png'
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='Мука', measurement_unit='г'
+        )
+
+    def setUp(self):
+        for index in (ingredient_index, recipe_ids, pantry_index):
+            index.invalidate()
+            self.addCleanup(index.invalidate)
+
+    def test_ingredient_index(self):
+        self.assertEqual(ingredient_index.search('сах'), [])
+        # bulk_create не отправляет сигналы, как запись в другом процессе.
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Сахар', measurement_unit='г')
+        ])
+        self.assertEqual(ingredient_index.search('сах'), [])
+        write_versions([INGREDIENTS_VERSION])
+        self.assertEqual(
+            [row['name'] for row in ingredient_index.search('сах')],
+            ['Сахар']
+        )
+
+    def test_recipe_ids(self):
+        self.assertTrue(recipe_ids.exists(self.recipe.pk))
+        # Колбэки on_commit этого процесса в TestCase не выполняются.
+        Recipe.objects.filter(pk=self.recipe.pk).delete()
+        self.assertTrue(recipe_ids.exists(self.recipe.pk))
+        write_versions([RECIPE_IDS_VERSION])
+        self.assertFalse(recipe_ids.exists(self.recipe.pk))
+
+    def test_pantry_index(self):
+        self.assertEqual(pantry_index.match([self.ingredient.pk], 0), [])
+        RecipeIngredient.objects.bulk_create([RecipeIngredient(
+            recipe=self.recipe, ingredient=self.ingredient, amount=10
+        )])
+        write_versions([PANTRY_VERSION])
+        self.assertEqual(
+            pantry_index.match([self.ingredient.pk], 0), [(self.recipe.pk, 0)]
+        )
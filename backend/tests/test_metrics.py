@@ -0,0 +1,51 @@
+"""
+Метрики запросов: заголовок Server-Timing и /metrics.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+import re
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import User
+
+
+@override_settings(SERVER_TIMING=True)
+class RequestMetricsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='x'
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10, image='recipes/images/q.png'
+            )
+            for index in range(20)
+        )
+
+    def test_server_timing_stages(self):
+        response = APIClient().get('/api/recipes/?limit=20')
+        timings = dict(re.findall(
+            r'(\w+);dur=([\d.]+)', response['Server-Timing']
+        ))
+        self.assertEqual(
+            set(timings), {'db', 'app', 'serialize', 'render', 'total'}
+        )
+        self.assertGreater(float(timings['serialize']), 0)
+        self.assertGreater(float(timings['render']), 0)
+
+    def test_metrics(self):
+        response = self.client.get('/metrics', HTTP_HOST='backend')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(
+            b'foodgram_request_serialize_duration_seconds', response.content
+        )
@@ -0,0 +1,113 @@
+"""
+Курсорная пагинация рецептов по оценкам популярности и порядок подписок.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+import base64
+
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipes.models import Recipe
+from users.models import Subscription, User
+
+# Больше offset_cutoff курсорной пагинации DRF.
+RECIPES = 1300
+PAGE = 100
+
+
+@override_settings(SERVER_TIMING=False)
+class RankingCursorTestCase(TestCase):
+    """Листание ?ordering=popular|trending при одинаковых оценках."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='x'
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10, image='recipes/images/q.png',
+                trending=float(index % 2)
+            )
+            for index in range(RECIPES)
+        )
+        # Одинаковые даты публикации, порядок решает id.
+        Recipe.objects.update(pub_date=timezone.now())
+
+    def walk(self, ordering):
+        client = APIClient()
+        url = f'/api/recipes/?ordering={ordering}&cursor=&limit={PAGE}'
+        ids = []
+        for _ in range(RECIPES):
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe['id'] for recipe in response.data['results']]
+            url = response.data['next']
+            if url is None:
+                return ids
+        self.fail(f'{ordering}: ссылка next не заканчивается')
+
+    def test_walk(self):
+        for ordering, fields in (
+            ('popular', ('-popularity', '-pub_date', '-id')),
+            ('trending', ('-trending', '-pub_date', '-id')),
+        ):
+            with self.subTest(ordering=ordering):
+                self.assertEqual(self.walk(ordering), list(
+                    Recipe.objects.order_by(*fields)
+                    .values_list('pk', flat=True)
+                ))
+
+    def test_invalid_cursor(self):
+        for position in ('x|y|1', '0|2024-01-01T00:00:00+00:00'):
+            cursor = base64.urlsafe_b64encode(
+                f'p={position}'.encode()
+            ).decode()
+            with self.subTest(position=position):
+                self.assertEqual(APIClient().get(
+                    f'/api/recipes/?ordering=popular&cursor={cursor}'
+                ).status_code, 404)
+
+
+@override_settings(SERVER_TIMING=False)
+class SubscriptionsOrderingTestCase(TestCase):
+    """Подписки упорядочены по id автора, а не по имени."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(
+            username='reader', email='reader@example.com',
+            first_name='Reader', last_name='Reader', password='x'
+        )
+        cls.authors = [
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name=name, password='x'
+            )
+            for name in ('zeta', 'beta', 'alpha')
+        ]
+        for author in cls.authors:
+            Subscription.objects.create(user=cls.reader, author=author)
+
+    def test_order(self):
+        client = APIClient()
+        client.force_authenticate(self.reader)
+        expected = [author.pk for author in self.authors]
+        response = client.get('/api/users/subscriptions/')
+        self.assertEqual(
+            [author['id'] for author in response.data['results']], expected
+        )
+        url = '/api/users/subscriptions/?cursor=&limit=2'
+        ids = []
+        while url:
+            response = client.get(url)
+            ids += [author['id'] for author in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(ids, expected)
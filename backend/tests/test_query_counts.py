@@ -0,0 +1,528 @@
+"""
+Границы числа SQL-запросов для действий API.
+
+Каждое действие выполняется на двух объёмах связанных данных (SIZES):
+рецептов у автора, ингредиентов и тегов в рецепте, подписок, избранного
+и списка покупок. Граница одна для обоих объёмов, поэтому N+1
+проявляется как превышение на большом объёме. При превышении в
+сообщении выводятся все выполненные запросы.
+
+Кэш ответов и индексы в памяти сбрасываются перед каждым запросом,
+так что считаются запросы холодного пути. Чтобы граница не выполнялась
+за счёт пустого или ошибочного ответа, проверяются и ключи в ответе.
+Загруженные файлы пишутся во временный MEDIA_ROOT.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+import base64
+import io
+import json
+import shutil
+import tempfile
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.constants import PANTRY_VERSION, RECIPE_IDS_VERSION
+from api.indexes import ingredient_index, pantry_index, recipe_ids
+from api.versions import bump_versions
+from recipes.models import (Favorite, FeedEntry, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart, Tag)
+from users.models import Subscription, User
+
+SIZES = (1, 50)
+PASSWORD = 'Query-Count-Password-1'
+IMAGE = (
+    'data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA'
+    'DUlEQVR42mNk+M9QDwADhgGAWjR9awAAAABJRU5ErkJggg=='
+)
+TAG_KEYS = {'id', 'name', 'slug'}
+INGREDIENT_KEYS = {'id', 'name', 'measurement_unit'}
+USER_KEYS = {
+    'email', 'id', 'username', 'first_name', 'last_name', 'is_subscribed',
+    'avatar'
+}
+SUBSCRIPTION_KEYS = USER_KEYS | {'recipes', 'recipes_count'}
+SHORT_RECIPE_KEYS = {'id', 'name', 'image', 'cooking_time'}
+RECIPE_KEYS = SHORT_RECIPE_KEYS | {
+    'tags', 'author', 'ingredients', 'is_favorited', 'is_in_shopping_cart',
+    'text'
+}
+
+
+class Fixture:
+    """Данные одного объёма: читатель, автор и их связи."""
+
+    def __init__(self, size, tags, ingredients):
+        self.size = size
+        self.tags = tags[:size]
+        self.ingredients = ingredients[:size]
+        self.reader = User.objects.create_user(
+            username=f'reader{size}', email=f'reader{size}@example.com',
+            first_name='Reader', last_name=str(size), password=PASSWORD
+        )
+        self.author = User.objects.create_user(
+            username=f'author{size}', email=f'author{size}@example.com',
+            first_name='Author', last_name=str(size), password=PASSWORD
+        )
+        self.token = Token.objects.create(user=self.reader).key
+        self.author_token = Token.objects.create(user=self.author).key
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=self.author, name=f'Рецепт {size}-{index}',
+                text='Текст', cooking_time=10, image='recipes/images/q.png'
+            )
+            for index in range(size)
+        )
+        # SQLite не возвращает id из bulk_create.
+        self.recipes = list(
+            Recipe.objects.filter(author=self.author).order_by('pk')
+        )
+        self.recipe = self.recipes[0]
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=ingredient, amount=5)
+            for recipe in self.recipes
+            for ingredient in self.ingredients
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tag)
+            for recipe in self.recipes
+            for tag in self.tags
+        )
+        Recipe.objects.filter(author=self.author).update_tags_mask()
+        Favorite.objects.bulk_create(
+            Favorite(user=self.reader, recipe=recipe)
+            for recipe in self.recipes
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=self.reader, recipe=recipe)
+            for recipe in self.recipes
+        )
+        others = [
+            User.objects.create_user(
+                username=f'follow{size}-{index}',
+                email=f'follow{size}-{index}@example.com',
+                first_name='Follow', last_name=str(index), password=PASSWORD
+            )
+            for index in range(size - 1)
+        ]
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=other, name=f'Рецепт {other.username}', text='Текст',
+                cooking_time=10, image='recipes/images/q.png'
+            )
+            for other in others
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=self.reader, author=author)
+            for author in [self.author] + others
+        )
+        # Автор, на которого читатель ещё не подписан.
+        self.stranger = User.objects.create_user(
+            username=f'stranger{size}', email=f'stranger{size}@example.com',
+            first_name='Stranger', last_name=str(size), password=PASSWORD
+        )
+        self.free_recipe = Recipe.objects.create(
+            author=self.stranger, name=f'Свободный рецепт {size}',
+            text='Текст', cooking_time=10, image='recipes/images/q.png'
+        )
+        # Общий редкий ингредиент делает рецепты похожими.
+        rare = Ingredient.objects.create(
+            name=f'Редкий ингредиент {size}', measurement_unit='г'
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(recipe=recipe, ingredient=rare, amount=1)
+            for recipe in (self.recipe, self.free_recipe)
+        )
+
+    def multipart_payload(self, name='Рецепт из формы',
+                          ingredients_json=False):
+        """Рецепт в multipart-форме с изображением файлом."""
+        payload = {
+            'tags': [tag.id for tag in self.tags],
+            'image': SimpleUploadedFile(
+                'q.png', base64.b64decode(IMAGE.split(',')[1]),
+                content_type='image/png'
+            ),
+            'name': name,
+            'text': 'Текст',
+            'cooking_time': 5,
+        }
+        if ingredients_json:
+            payload['ingredients'] = json.dumps([
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients
+            ])
+        else:
+            for index, ingredient in enumerate(self.ingredients):
+                payload[f'ingredients[{index}]id'] = ingredient.id
+                payload[f'ingredients[{index}]amount'] = 10
+        return payload
+
+    def recipe_payload(self, name='Новый рецепт'):
+        return {
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients
+            ],
+            'tags': [tag.id for tag in self.tags],
+            'image': IMAGE,
+            'name': name,
+            'text': 'Текст',
+            'cooking_time': 5,
+        }
+
+
+@override_settings(SERVER_TIMING=False)
+class QueryCountTestCase(TestCase):
+    """Проверки числа запросов для действий вьюсетов API."""
+
+    @classmethod
+    def setUpClass(cls):
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        largest = max(SIZES)
+        Tag.objects.bulk_create(
+            Tag(name=f'Тег {index}', slug=f'tag{index}')
+            for index in range(largest)
+        )
+        Tag.objects.assign_bits()
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'Ингредиент {index:03}', measurement_unit='г')
+            for index in range(largest)
+        )
+        tags = list(Tag.objects.order_by('pk'))
+        ingredients = list(Ingredient.objects.order_by('pk'))
+        # Строки версий создаются колбэками on_commit, как в бою.
+        with cls.captureOnCommitCallbacks(execute=True):
+            cls.fixtures = [
+                Fixture(size, tags, ingredients) for size in SIZES
+            ]
+            FeedEntry.objects.rebuild()
+            call_command('compute_similar_recipes', stdout=io.StringIO())
+            bump_versions(PANTRY_VERSION, RECIPE_IDS_VERSION)
+
+    def request(self, method, path, token=None, data=None, format='json'):
+        client = APIClient()
+        if token:
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+        response = getattr(client, method)(path, data, format=format)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        return response
+
+    def assertShape(self, response, keys, description):
+        """В каждом объекте ответа есть ключи keys."""
+        data = response.data
+        if isinstance(data, dict) and 'results' in data:
+            data = data['results']
+        items = data if isinstance(data, list) else [data]
+        self.assertTrue(items, f'{description}: пустой ответ')
+        for item in items:
+            self.assertLessEqual(keys, set(item), description)
+
+    def assertMaxQueries(self, bound, method, path, token=None, data=None,
+                         status=200, format='json', keys=None):
+        """
+        Запрос выполняется без ошибок не более чем за bound запросов,
+        а в объектах ответа есть ключи keys.
+        """
+        cache.clear()
+        ingredient_index.invalidate()
+        recipe_ids.invalidate()
+        pantry_index.invalidate()
+        # Колбэки on_commit (версии, индексы) выполняются и в бою.
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.request(method, path, token, data, format)
+        content = b'' if response.streaming else response.content[:500]
+        self.assertEqual(
+            response.status_code, status,
+            f'{method.upper()} {path}: {content!r}'
+        )
+        if len(context) > bound:
+            queries = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(context.captured_queries, 1)
+            )
+            self.fail(
+                f'{method.upper()} {path}: {len(context)} запросов при '
+                f'границе {bound}\n{queries}'
+            )
+        if keys is not None:
+            self.assertShape(response, keys, f'{method.upper()} {path}')
+        return response
+
+    def check(self, bound, make_request, keys=None):
+        """Проверяем границу и ключи ответа на всех объёмах данных."""
+        responses = []
+        for fixture in self.fixtures:
+            with self.subTest(size=fixture.size):
+                responses.append(self.assertMaxQueries(
+                    bound, *make_request(fixture), keys=keys
+                ))
+        return responses
+
+    def test_tags(self):
+        for response in self.check(
+            2, lambda f: ('get', '/api/tags/'), TAG_KEYS
+        ):
+            # Служебный бит маски тегов в API не выдаётся.
+            self.assertEqual(set(response.data[0]), TAG_KEYS)
+        self.check(
+            2, lambda f: ('get', f'/api/tags/{f.tags[0].id}/'), TAG_KEYS
+        )
+
+    def test_ingredients(self):
+        self.check(2, lambda f: ('get', '/api/ingredients/'), INGREDIENT_KEYS)
+        self.check(
+            2, lambda f: ('get', '/api/ingredients/?name=Ингр'),
+            INGREDIENT_KEYS
+        )
+        self.check(
+            2, lambda f: ('get', f'/api/ingredients/{f.ingredients[0].id}/'),
+            INGREDIENT_KEYS
+        )
+
+    def test_users_list(self):
+        self.check(
+            3, lambda f: ('get', f'/api/users/?limit={f.size}'), USER_KEYS
+        )
+        self.check(
+            4, lambda f: ('get', f'/api/users/?limit={f.size}', f.token),
+            USER_KEYS
+        )
+
+    def test_users_retrieve(self):
+        self.check(
+            2, lambda f: ('get', f'/api/users/{f.author.id}/'), USER_KEYS
+        )
+        self.check(
+            3, lambda f: ('get', f'/api/users/{f.author.id}/', f.token),
+            USER_KEYS
+        )
+
+    def test_users_create(self):
+        self.check(6, lambda f: ('post', '/api/users/', None, {
+            'email': f'new{f.size}@example.com',
+            'username': f'new{f.size}',
+            'first_name': 'New',
+            'last_name': 'User',
+            'password': PASSWORD,
+        }, 201), {'email', 'id', 'username', 'first_name', 'last_name'})
+
+    def test_users_me(self):
+        self.check(3, lambda f: ('get', '/api/users/me/', f.token), USER_KEYS)
+
+    def test_users_set_password(self):
+        self.check(3, lambda f: ('post', '/api/users/set_password/', f.token, {
+            'current_password': PASSWORD, 'new_password': PASSWORD + 'x'
+        }, 204))
+        for fixture in self.fixtures:
+            self.assertTrue(
+                self.client.login(
+                    email=fixture.reader.email, password=PASSWORD + 'x'
+                )
+            )
+
+    def test_users_avatar(self):
+        # Читатель без рецептов: число рецептов перечитывается, чтобы не
+        # сбрасывать кэш рецептов.
+        for response in self.check(4, lambda f: (
+            'put', '/api/users/me/avatar/', f.token, {'avatar': IMAGE}
+        ), {'avatar'}):
+            self.assertTrue(response.data['avatar'])
+        self.check(4, lambda f: (
+            'delete', '/api/users/me/avatar/', f.token, None, 204
+        ))
+        for fixture in self.fixtures:
+            fixture.reader.refresh_from_db()
+            self.assertFalse(fixture.reader.avatar)
+        for image in ('data:image;base64,AAAA', 'data:image/;base64,AAAA'):
+            self.check(2, lambda f: (
+                'put', '/api/users/me/avatar/', f.token, {'avatar': image},
+                400
+            ), {'avatar'})
+
+    def test_users_subscriptions(self):
+        self.check(4, lambda f: (
+            'get', f'/api/users/subscriptions/?limit={f.size}', f.token
+        ), SUBSCRIPTION_KEYS)
+        for response in self.check(4, lambda f: (
+            'get', f'/api/users/subscriptions/?limit={f.size}'
+            '&recipes_limit=3', f.token
+        ), SUBSCRIPTION_KEYS):
+            for author in response.data['results']:
+                self.assertLessEqual(len(author['recipes']), 3)
+
+    def test_users_subscribe(self):
+        self.check(16, lambda f: (
+            'post', f'/api/users/{f.stranger.id}/subscribe/', f.token,
+            None, 201
+        ), SUBSCRIPTION_KEYS)
+        # Условный UPDATE проверяет переход автора через FEED_FANOUT_LIMIT.
+        self.check(11, lambda f: (
+            'delete', f'/api/users/{f.stranger.id}/subscribe/', f.token,
+            None, 204
+        ))
+
+    def test_recipes_list(self):
+        self.check(7, lambda f: (
+            'get', f'/api/recipes/?author={f.author.id}&limit={f.size}'
+        ), RECIPE_KEYS)
+        for flag in ('is_favorited', 'is_in_shopping_cart'):
+            for response in self.check(8, lambda f: (
+                'get', f'/api/recipes/?{flag}=1&limit={f.size}', f.token
+            ), RECIPE_KEYS):
+                for recipe in response.data['results']:
+                    self.assertIs(recipe[flag], True)
+
+    def test_recipes_list_ordering(self):
+        for ordering in ('popular', 'trending'):
+            self.check(7, lambda f: (
+                'get', f'/api/recipes/?ordering={ordering}&limit={f.size}'
+            ), RECIPE_KEYS)
+            self.check(7, lambda f: (
+                'get',
+                f'/api/recipes/?ordering={ordering}&cursor=&limit={f.size}'
+            ), RECIPE_KEYS)
+
+    def test_recipes_list_tags(self):
+        self.check(7, lambda f: (
+            'get', '/api/recipes/?' + '&'.join(
+                f'tags={tag.slug}' for tag in f.tags
+            ) + f'&limit={f.size}'
+        ), RECIPE_KEYS)
+        self.check(7, lambda f: (
+            'get', '/api/recipes/?' + '&'.join(
+                f'tags_all={tag.slug}' for tag in f.tags
+            ) + f'&limit={f.size}'
+        ), RECIPE_KEYS)
+
+    def test_recipes_retrieve(self):
+        for response in self.check(
+            6, lambda f: ('get', f'/api/recipes/{f.recipe.id}/'), RECIPE_KEYS
+        ):
+            self.assertEqual(set(response.data['tags'][0]), TAG_KEYS)
+        self.check(
+            7, lambda f: ('get', f'/api/recipes/{f.recipe.id}/', f.token),
+            RECIPE_KEYS
+        )
+
+    def test_recipes_similar(self):
+        self.check(6, lambda f: (
+            'get', f'/api/recipes/{f.recipe.id}/similar/'
+        ), RECIPE_KEYS)
+
+    def test_recipes_pantry(self):
+        # Построение индекса читает его версию.
+        self.check(7, lambda f: (
+            'get', '/api/recipes/pantry/?' + '&'.join(
+                f'ingredients={ingredient.id}'
+                for ingredient in f.ingredients
+            ) + f'&limit={f.size}'
+        ), RECIPE_KEYS)
+
+    def test_recipes_feed(self):
+        self.check(8, lambda f: (
+            'get', f'/api/recipes/feed/?limit={f.size}', f.token
+        ), RECIPE_KEYS)
+
+    def test_recipes_create(self):
+        # Версия индекса подбора по продуктам увеличивается отдельно.
+        for response in self.check(23, lambda f: (
+            'post', '/api/recipes/', f.token, f.recipe_payload(), 201
+        ), RECIPE_KEYS):
+            self.assertEqual(response.data['name'], 'Новый рецепт')
+
+    def test_recipes_create_multipart(self):
+        for ingredients_json in (False, True):
+            self.check(23, lambda f: (
+                'post', '/api/recipes/', f.token,
+                f.multipart_payload(ingredients_json=ingredients_json), 201,
+                'multipart'
+            ), RECIPE_KEYS)
+
+    @skipUnlessDBFeature('can_return_rows_from_bulk_insert')
+    def test_recipes_bulk_create(self):
+        # Без RETURNING рецепты сохраняются по одному,
+        # см. RecipeListSerializer.create.
+        for response, fixture in zip(self.check(14, lambda f: (
+            'post', '/api/recipes/bulk/', f.author_token,
+            [f.recipe_payload(f'Пакет {index}') for index in range(f.size)],
+            201
+        ), SHORT_RECIPE_KEYS), self.fixtures):
+            self.assertEqual(len(response.data), fixture.size)
+
+    def test_recipes_update(self):
+        # Редкий ингредиент не входит в данные и удаляется из рецепта,
+        # поэтому увеличивается и версия индекса подбора по продуктам.
+        for response in self.check(26, lambda f: (
+            'patch', f'/api/recipes/{f.recipe.id}/', f.author_token,
+            f.recipe_payload('Изменённый рецепт')
+        ), RECIPE_KEYS):
+            self.assertEqual(response.data['name'], 'Изменённый рецепт')
+
+    def test_recipes_destroy(self):
+        self.check(25, lambda f: (
+            'delete', f'/api/recipes/{f.recipe.id}/', f.author_token,
+            None, 204
+        ))
+        for fixture in self.fixtures:
+            self.assertFalse(
+                Recipe.objects.filter(pk=fixture.recipe.pk).exists()
+            )
+
+    def test_recipes_favorite(self):
+        self.check(11, lambda f: (
+            'post', f'/api/recipes/{f.free_recipe.id}/favorite/', f.token,
+            None, 201
+        ), SHORT_RECIPE_KEYS)
+        self.check(8, lambda f: (
+            'delete', f'/api/recipes/{f.recipe.id}/favorite/', f.token,
+            None, 204
+        ))
+
+    def test_recipes_shopping_cart(self):
+        self.check(11, lambda f: (
+            'post', f'/api/recipes/{f.free_recipe.id}/shopping_cart/',
+            f.token, None, 201
+        ), SHORT_RECIPE_KEYS)
+        self.check(8, lambda f: (
+            'delete', f'/api/recipes/{f.recipe.id}/shopping_cart/', f.token,
+            None, 204
+        ))
+
+    def test_recipes_download_shopping_cart(self):
+        for extension in ('txt', 'csv', 'json', 'pdf'):
+            for response in self.check(2, lambda f: (
+                'get',
+                f'/api/recipes/download_shopping_cart/?format={extension}',
+                f.token
+            )):
+                self.assertIn(
+                    f'.{extension}', response['Content-Disposition']
+                )
+
+    def test_recipes_get_link(self):
+        # Построение множества id читает его версию.
+        self.check(
+            3, lambda f: ('get', f'/api/recipes/{f.recipe.id}/get-link/',
+                          f.token),
+            {'short-link'}
+        )
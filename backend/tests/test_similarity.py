@@ -0,0 +1,110 @@
+"""
+Отметки рецептов для пересчёта похожих.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+import io
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from api.constants import RECIPES_VERSION, SIMILAR_VERSION
+from api.versions import get_versions
+from recipes.models import (Ingredient, PendingSimilarity, Recipe,
+                            RecipeIngredient, SimilarRecipe, Tag)
+from recipes.similarity import RecipeVectors
+from users.models import User
+
+RECIPES = 10
+
+
+class PendingSimilarityTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            first_name='Author', last_name='Author', password='x'
+        )
+        cls.tags = [
+            Tag.objects.create(name=f'Тег {index}', slug=f'tag{index}')
+            for index in range(2)
+        ]
+        # Ингредиент есть в паре рецептов: в доле не больше
+        # SIMILAR_MAX_FEATURE_SHARE он учитывается при сравнении.
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {index}', measurement_unit='г'
+            )
+            for index in range(RECIPES // 2)
+        ]
+        cls.recipes = []
+        for index in range(RECIPES):
+            recipe = Recipe.objects.create(
+                author=cls.author, name=f'Рецепт {index}', text='Текст',
+                cooking_time=10, image='recipes/images/q.png'
+            )
+            recipe.tags.set(cls.tags[:1])
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredients[index // 2], amount=10
+            )
+            cls.recipes.append(recipe)
+
+    def pending(self):
+        return set(
+            PendingSimilarity.objects.values_list('recipe_id', flat=True)
+        )
+
+    def test_marks(self):
+        first, second = self.recipes[:2]
+        self.assertEqual(
+            self.pending(), {recipe.pk for recipe in self.recipes}
+        )
+        PendingSimilarity.objects.all().delete()
+        first.name = 'Новое название'
+        first.save()
+        first.tags.set(self.tags[:1])
+        self.assertEqual(self.pending(), set())
+        first.tags.add(self.tags[1])
+        first.tags.add(self.tags[1])
+        second.tags.clear()
+        self.assertEqual(self.pending(), {first.pk, second.pk})
+        self.assertEqual(PendingSimilarity.objects.count(), 2)
+
+    def test_incremental(self):
+        keys = (RECIPES_VERSION, SIMILAR_VERSION)
+        before = get_versions(keys)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command(
+                'compute_similar_recipes', incremental=True,
+                stdout=io.StringIO()
+            )
+        after = get_versions(keys)
+        # Кэш рецептов не сбрасывается, меняются только похожие.
+        self.assertEqual(after[RECIPES_VERSION], before[RECIPES_VERSION])
+        self.assertEqual(
+            after[SIMILAR_VERSION][0], before[SIMILAR_VERSION][0] + 1
+        )
+        self.assertEqual(self.pending(), set())
+        first, second = self.recipes[:2]
+        self.assertEqual(
+            list(SimilarRecipe.objects.filter(recipe=first).values_list(
+                'similar', flat=True
+            )),
+            [second.pk]
+        )
+
+    def test_failed_run_keeps_marks(self):
+        with mock.patch.object(
+            RecipeVectors, 'load', side_effect=RuntimeError
+        ), self.assertRaises(RuntimeError):
+            call_command(
+                'compute_similar_recipes', incremental=True,
+                stdout=io.StringIO()
+            )
+        self.assertEqual(
+            self.pending(), {recipe.pk for recipe in self.recipes}
+        )
@@ -0,0 +1,93 @@
+"""
+Удаление неиспользуемых файлов из хранилища по хешу содержимого.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+import io
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase
+from django.test.utils import override_settings
+from PIL import Image
+
+from foodgram.storage import ContentAddressedStorage, flat_variant_names
+from users.models import User
+
+
+def png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 32), color).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue(), name='avatar.png')
+
+
+@mock.patch.object(ContentAddressedStorage, 'delete_grace_period', 0)
+class StorageDeleteTestCase(TestCase):
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.first, self.second = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name=name, password='x'
+            )
+            for name in ('first', 'second')
+        )
+
+    def exists(self, name):
+        return [default_storage.exists(name)] + [
+            default_storage.exists(variant)
+            for variant in flat_variant_names(name)
+        ]
+
+    def test_delete_when_unused(self):
+        for user in (self.first, self.second):
+            user.avatar = png('red')
+            user.save()
+        name = self.first.avatar.name
+        self.assertEqual(self.second.avatar.name, name)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.avatar.delete(save=True)
+        self.assertTrue(all(self.exists(name)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.delete()
+        self.assertFalse(any(self.exists(name)))
+
+    def test_delete_replaced(self):
+        self.first.avatar = png('red')
+        self.first.save()
+        user = User.objects.get(pk=self.first.pk)
+        name = user.avatar.name
+        user.avatar = png('blue')
+        with self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertFalse(any(self.exists(name)))
+        self.assertTrue(all(self.exists(user.avatar.name)))
+
+    def test_recent_file_is_kept(self):
+        self.first.avatar = png('red')
+        self.first.save()
+        name = self.first.avatar.name
+        with mock.patch.object(
+            ContentAddressedStorage, 'delete_grace_period', 60
+        ), self.captureOnCommitCallbacks(execute=True):
+            self.first.avatar.delete(save=True)
+        self.assertTrue(all(self.exists(name)))
+
+    def test_delete_unused_media(self):
+        self.first.avatar = png('red')
+        self.first.save()
+        orphan = default_storage.save('users/orphan.png', png('blue'))
+        call_command('delete_unused_media', stdout=io.StringIO())
+        self.assertFalse(any(self.exists(orphan)))
+        self.assertTrue(all(self.exists(self.first.avatar.name)))
@@ -0,0 +1,168 @@
+"""
+Какие версии наборов данных меняются при записи.
+
+Запуск из каталога backend:
+
+    python manage.py test tests
+"""
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.test import APIClient
+
+from api.constants import (RECIPE_COUNTERS_VERSION, RECIPES_VERSION,
+                           USER_COUNTERS_VERSION, USERS_VERSION)
+from api.models import DataVersion
+from api.versions import get_versions, user_state_key
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+KEYS = (
+    RECIPES_VERSION, USERS_VERSION,
+    RECIPE_COUNTERS_VERSION, USER_COUNTERS_VERSION
+)
+
+
+@override_settings(SERVER_TIMING=False)
+class VersionsTestCase(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author, cls.reader = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                first_name=name, last_name=name, password='x'
+            )
+            for name in ('author', 'reader')
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Рецепт', text='Текст',
+            cooking_time=10, image='recipes/images/q.png'
+        )
+
+    def changed(self, action):
+        """
+        Версии, изменённые действием. Внутри транзакции строки версий
+        не пишутся: их увеличивают колбэки после фиксации.
+        """
+        keys = KEYS + (user_state_key(self.reader.id),)
+        before = get_versions(keys)
+        with CaptureQueriesContext(connection) as context:
+            with self.captureOnCommitCallbacks() as callbacks:
+                action()
+        self.assertFalse([
+            query['sql'] for query in context.captured_queries
+            if DataVersion._meta.db_table in query['sql']
+        ])
+        for callback in callbacks:
+            callback()
+        after = get_versions(keys)
+        return {key for key in keys if before[key][0] != after[key][0]}
+
+    def test_user_actions(self):
+        state = user_state_key(self.reader.id)
+        for model in (Favorite, ShoppingCart):
+            self.assertEqual(
+                self.changed(lambda: model.objects.create(
+                    user=self.reader, recipe=self.recipe
+                )),
+                {RECIPE_COUNTERS_VERSION, state}
+            )
+        self.assertEqual(
+            self.changed(lambda: Subscription.objects.create(
+                user=self.reader, author=self.author
+            )),
+            {USER_COUNTERS_VERSION, state}
+        )
+
+    def test_recipe_changes(self):
+        def rename():
+            self.recipe.name = 'Новое название'
+            self.recipe.save()
+        self.assertEqual(self.changed(rename), {RECIPES_VERSION})
+        self.assertEqual(
+            self.changed(self.recipe.delete),
+            {RECIPES_VERSION, USER_COUNTERS_VERSION}
+        )
+
+    def test_signup(self):
+        self.assertEqual(
+            self.changed(lambda: APIClient().post('/api/users/', {
+                'email': 'new@example.com', 'username': 'new',
+                'first_name': 'New', 'last_name': 'New',
+                'password': 'Secret-password-123',
+            })),
+            {USERS_VERSION}
+        )
+
+    def test_user_changes(self):
+        def rename(user):
+            def action():
+                user = User.objects.get(pk=user_id)
+                user.first_name = 'Новое имя'
+                user.save()
+            user_id = user.pk
+            return action
+
+        def set_password():
+            author = User.objects.get(pk=self.author.pk)
+            author.set_password('y')
+            author.save()
+        self.assertEqual(self.changed(rename(self.reader)), {USERS_VERSION})
+        self.assertEqual(
+            self.changed(rename(self.author)),
+            {USERS_VERSION, RECIPES_VERSION}
+        )
+        self.assertEqual(self.changed(set_password), {USERS_VERSION})
+        self.assertEqual(
+            self.changed(lambda: User.objects.filter(
+                pk=self.author.pk
+            ).first().save(update_fields=['first_name'])),
+            {USERS_VERSION}
+        )
+
+    def test_ingredient_search_without_etag(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        client = APIClient()
+        self.assertIn('ETag', client.get('/api/ingredients/'))
+        self.assertNotIn('ETag', client.get('/api/ingredients/?name=Со'))
+
+    def test_etag_depends_on_object(self):
+        other = Recipe.objects.create(
+            author=self.author, name='Другой рецепт', text='Текст',
+            cooking_time=10, image='recipes/images/q.png'
+        )
+        client = APIClient()
+        etag = client.get(f'/api/recipes/{self.recipe.pk}/')['ETag']
+        self.assertNotEqual(
+            client.get(f'/api/recipes/{other.pk}/')['ETag'], etag
+        )
+        self.assertNotEqual(
+            client.get('/api/recipes/?limit=1')['ETag'],
+            client.get('/api/recipes/?limit=2')['ETag']
+        )
+        self.assertEqual(client.get(
+            '/api/recipes/999999/', HTTP_IF_NONE_MATCH=etag
+        ).status_code, 404)
+        self.assertEqual(client.get(
+            f'/api/recipes/{self.recipe.pk}/', HTTP_IF_NONE_MATCH=etag
+        ).status_code, 304)
+
+    def test_anonymous_cache_refreshes_counters(self):
+        cache.clear()
+        client = APIClient()
+        url = '/api/recipes/?limit=6'
+        self.assertEqual(
+            client.get(url).data['results'][0]['favorites_count'], 0
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.reader, recipe=self.recipe)
+            Subscription.objects.create(user=self.reader, author=self.author)
+        # Версии, счётчики рецептов и счётчики авторов.
+        with self.assertNumQueries(3):
+            recipe = client.get(url).data['results'][0]
+        self.assertEqual(recipe['favorites_count'], 1)
+        self.assertEqual(recipe['author']['followers_count'], 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(client.get(url).data['results'][0], recipe)
@@ -1,6 +1,5 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from django.db.models import Count
 
 from users.models import User, Subscription
 
@@ -15,8 +14,9 @@ class UserAdmin(BaseUserAdmin):
         'first_name',
         'last_name',
         'avatar',
-        'get_subscribers_count',
-        'get_recipes_count',
+        'followers_count',
+        'following_count',
+        'recipes_count',
     )
     search_fields = ('username', 'email',)
     list_display_links = ('username',)
@@ -41,23 +41,6 @@ class UserAdmin(BaseUserAdmin):
         }),
     )
 
-    def get_queryset(self, request):
-        queryset = super().get_queryset(request)
-        return queryset.annotate(
-            subscribers_count=Count('followers', distinct=True),
-            recipes_count=Count('recipes', distinct=True)
-        )
-
-    @admin.display(description='Кол-во подписчиков')
-    def get_subscribers_count(self, obj):
-        """Количество подписчиков пользователя."""
-        return obj.subscribers_count
-
-    @admin.display(description='Кол-во рецептов')
-    def get_recipes_count(self, obj):
-        """Количество рецептов пользователя."""
-        return obj.recipes_count
-
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
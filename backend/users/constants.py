@@ -1,2 +1,3 @@
 EMAIL_MAX_LENGTH = 254
 NAME_MAX_LENGTH = 150
+USER_COUNTER_FIELDS = ('recipes_count', 'followers_count', 'following_count')
@@ -1,12 +1,58 @@
-from django.contrib.auth.models import AbstractUser
+from django.contrib.auth.models import AbstractUser, UserManager
 from django.db import models
+from django.db.models import Exists, OuterRef, Value
 from django.core.exceptions import ValidationError
 from django.contrib.auth.validators import UnicodeUsernameValidator
 
-from .constants import EMAIL_MAX_LENGTH, NAME_MAX_LENGTH
+from .constants import (EMAIL_MAX_LENGTH, NAME_MAX_LENGTH,
+                        USER_COUNTER_FIELDS)
 
 
-class User(AbstractUser):
+class CounterFieldsMixin:
+    """
+    Не перезаписывает счётчики при сохранении всей строки.
+
+    Счётчики меняются отдельными UPDATE (F-выражениями), поэтому
+    save() существующего объекта пишет все поля, кроме counter_fields:
+    иначе устаревшие значения из памяти затрут чужие изменения.
+    """
+    counter_fields = ()
+
+    def save(self, force_insert=False, force_update=False, using=None,
+             update_fields=None):
+        if (update_fields is None and not force_insert
+                and not self._state.adding):
+            deferred = self.get_deferred_fields()
+            update_fields = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+                and field.attname not in deferred
+            ]
+        super().save(force_insert, force_update, using, update_fields)
+
+
+class UserQuerySet(models.QuerySet):
+    """Набор запросов для пользователей."""
+
+    def with_is_subscribed(self, user):
+        """Аннотирует пользователей флагом подписки текущего пользователя."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_subscribed=Value(False, output_field=models.BooleanField())
+            )
+        return self.annotate(
+            is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('pk')
+            ))
+        )
+
+
+class CustomUserManager(UserManager.from_queryset(UserQuerySet)):
+    """Менеджер пользователей с дополнительными наборами запросов."""
+
+
+class User(CounterFieldsMixin, AbstractUser):
     """Модель для пользователя."""
     email = models.EmailField(
         max_length=EMAIL_MAX_LENGTH,
@@ -40,10 +86,29 @@ class User(AbstractUser):
         upload_to='users/',
         verbose_name='Фото пользователя'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество рецептов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Количество подписок'
+    )
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username', 'first_name', 'last_name']
 
+    objects = CustomUserManager()
+
+    counter_fields = USER_COUNTER_FIELDS
+
     class Meta:
         verbose_name = 'Пользователь'
         verbose_name_plural = 'Пользователи'